@@ -0,0 +1,198 @@
+"""
+Client benchmark suite.
+
+Runs each Client method against the in-process glusterd2 stand-in and
+reports per-call latency, throughput and memory allocations.
+
+Latency percentiles come from a single-threaded pass. Throughput is
+measured with ``--workers`` threads sharing one client. Allocation
+columns (peak KiB allocated during a call and net memory blocks left
+behind) need tracemalloc and are skipped on Python 2.
+
+Usage::
+
+    python bench/client_bench.py [--calls 500] [--peers 3] [--volumes 50]
+                                 [--latency 0] [--workers 8] [--json]
+"""
+import argparse
+import json
+import sys
+import threading
+import timeit
+
+from glusterapi import Client
+from glusterapi.testing import FakeGlusterd2
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+USER = 'glustercli'
+SECRET = 'bench-secret-bench-secret-bench-secret'
+
+
+def setup_cluster(client):
+    """Create the objects the read benchmarks look up."""
+    _, peers = client.peer_status()
+    client.snapshot_create('vol0', 'snap0')
+    client.webhook_add('http://127.0.0.1:9/hook', 'token', 'secret')
+    client.bitrot_enable('vol0')
+    return peers[0]['id']
+
+
+def benchmarks(peer_id, volumes):
+    """Return the (name, callable(client, i)) pairs to run."""
+    def volume(i):
+        return 'vol%d' % (i % volumes)
+
+    def peer_cycle(client, i):
+        _, peer = client.peer_add('bench%d' % i)
+        client.peer_remove(peer['id'])
+
+    def snapshot_cycle(client, i):
+        client.snapshot_activate('snap0')
+        client.snapshot_deactivate('snap0')
+
+    return [
+        ('peer_status', lambda c, i: c.peer_status()),
+        ('volume_list', lambda c, i: c.volume_list()),
+        ('volume_list_one', lambda c, i: c.volume_list(volume(i))),
+        ('volume_info', lambda c, i: c.volume_info(volume(i))),
+        ('volume_status', lambda c, i: c.volume_status(volume(i))),
+        ('iter_volumes', lambda c, i: sum(1 for _ in c.iter_volumes())),
+        ('iter_bricks_status',
+         lambda c, i: sum(1 for _ in c.iter_bricks_status(volume(i)))),
+        ('device_status', lambda c, i: c.device_status(peer_id)),
+        ('devices', lambda c, i: c.devices()),
+        ('webhooks', lambda c, i: c.webhooks()),
+        ('snapshot_info', lambda c, i: c.snapshot_info('snap0')),
+        ('bitrot_scrub_status', lambda c, i: c.bitrot_scrub_status('vol0')),
+        ('volume_set',
+         lambda c, i: c.volume_set(volume(i), {'bench.key': str(i)})),
+        ('peer_add+remove', peer_cycle),
+        ('snapshot_activate+deactivate', snapshot_cycle),
+    ]
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def measure_latency(client, func, calls):
+    samples = []
+    timer = timeit.default_timer
+    for i in range(calls):
+        start = timer()
+        func(client, i)
+        samples.append(timer() - start)
+    return samples
+
+
+def measure_throughput(client, func, calls, workers):
+    counter = iter(range(calls))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            func(client, i)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return calls / (timeit.default_timer() - start)
+
+
+def measure_allocations(client, func, calls):
+    if tracemalloc is None:
+        return None, None
+    calls = min(calls, 100)
+    peaks = []
+    tracemalloc.start()
+    try:
+        blocks = sys.getallocatedblocks()
+        for i in range(calls):
+            current = tracemalloc.get_traced_memory()[0]
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            func(client, i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        blocks = sys.getallocatedblocks() - blocks
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / 1024.0 / calls, blocks / float(calls)
+
+
+def run(args):
+    results = []
+    with FakeGlusterd2(peers=args.peers, volumes=args.volumes, user=USER,
+                       secret=SECRET, latency=args.latency, seed=1) as gd2:
+        with Client(gd2.endpoint, user=USER, secret=SECRET,
+                    pool_maxsize=args.workers) as client:
+            peer_id = setup_cluster(client)
+            for name, func in benchmarks(peer_id, args.volumes):
+                # Warm up connections and token cache
+                measure_latency(client, func, min(10, args.calls))
+                samples = measure_latency(client, func, args.calls)
+                throughput = measure_throughput(client, func, args.calls,
+                                                args.workers)
+                peak_kib, blocks = measure_allocations(client, func,
+                                                       args.calls)
+                results.append({
+                    'name': name,
+                    'mean_ms': 1000 * sum(samples) / len(samples),
+                    'p50_ms': 1000 * percentile(samples, 50),
+                    'p99_ms': 1000 * percentile(samples, 99),
+                    'calls_per_sec': throughput,
+                    'peak_kib_per_call': peak_kib,
+                    'net_blocks_per_call': blocks,
+                })
+    return results
+
+
+def report(results):
+    header = ('%-30s %9s %9s %9s %11s %10s %10s' %
+              ('method', 'mean ms', 'p50 ms', 'p99 ms', 'calls/s',
+               'peak KiB', 'net blks'))
+    print(header)
+    print('-' * len(header))
+    for res in results:
+        peak = res['peak_kib_per_call']
+        blocks = res['net_blocks_per_call']
+        print('%-30s %9.3f %9.3f %9.3f %11.1f %10s %10s' % (
+            res['name'], res['mean_ms'], res['p50_ms'], res['p99_ms'],
+            res['calls_per_sec'],
+            'n/a' if peak is None else '%.1f' % peak,
+            'n/a' if blocks is None else '%.1f' % blocks))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--peers', type=int, default=3)
+    parser.add_argument('--volumes', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds the stand-in adds to each response')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
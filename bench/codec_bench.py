@@ -0,0 +1,119 @@
+"""
+JSON codec benchmark.
+
+Encodes and decodes realistic glusterd2 payloads with every installed
+codec (see glusterapi.codec): a volume_create request for a large
+distributed replicate volume, and the volume list, volume status and
+brick status responses of the in-process stand-in.
+
+Usage::
+
+    python bench/codec_bench.py [--volumes 200] [--bricks 120]
+                                [--repeat 20] [--json]
+"""
+import argparse
+import json
+import timeit
+
+from glusterapi import Client
+from glusterapi.codec import JsonCodec, available_codecs
+from glusterapi.testing import FakeGlusterd2
+
+
+class _CaptureCodec(JsonCodec):
+    """Standard library codec keeping the request bodies it encodes."""
+
+    def __init__(self):
+        self.requests = []
+
+    def dumps(self, obj):
+        self.requests.append(obj)
+        return JsonCodec.dumps(obj)
+
+
+def payloads(volumes, bricks):
+    """
+    Build the benchmark payloads.
+
+    :return: (list) (name, object, encoded bytes) tuples
+    """
+    codec = _CaptureCodec()
+    with FakeGlusterd2(peers=12, volumes=volumes,
+                       bricks_per_volume=bricks) as gd2:
+        with Client(gd2.endpoint, codec=codec) as client:
+            _, peers = client.peer_status()
+            brick_list = ['%s:/bricks/big/b%d' % (peers[i % 12]['id'], i)
+                          for i in range(bricks)]
+            client.volume_create(brick_list, volume_name='big', replica=3)
+            session = client._session
+            result = [('volume_create request', codec.requests[-1],
+                       JsonCodec.dumps(codec.requests[-1]))]
+            for name, path in (
+                    ('volume list response', '/v1/volumes'),
+                    ('volume status response', '/v1/volumes/vol0/status'),
+                    ('bricks status response', '/v1/volumes/vol0/bricks')):
+                content = session.request('GET', gd2.endpoint + path).content
+                result.append((name, JsonCodec.loads(content), content))
+    return result
+
+
+def best(func, repeat):
+    timer = timeit.Timer(func)
+    number = 1
+    # Calibrate to runs of at least 20ms
+    while timer.timeit(number) < 0.02:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(args):
+    results = []
+    for name, obj, data in payloads(args.volumes, args.bricks):
+        for codec in available_codecs():
+            results.append({
+                'payload': name,
+                'codec': codec.name,
+                'kib': len(data) / 1024.0,
+                'dumps_ms': 1000 * best(lambda: codec.dumps(obj),
+                                        args.repeat),
+                'loads_ms': 1000 * best(lambda: codec.loads(data),
+                                        args.repeat),
+            })
+    return results
+
+
+def report(results):
+    header = '%-26s %-8s %9s %10s %10s %9s' % (
+        'payload', 'codec', 'KiB', 'dumps ms', 'loads ms', 'loads x')
+    print(header)
+    print('-' * len(header))
+    baseline = {}
+    for res in results:
+        if res['codec'] == JsonCodec.name:
+            baseline[res['payload']] = res['loads_ms']
+    for res in results:
+        print('%-26s %-8s %9.1f %10.3f %10.3f %8.1fx' % (
+            res['payload'], res['codec'], res['kib'], res['dumps_ms'],
+            res['loads_ms'], baseline[res['payload']] / res['loads_ms']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--volumes', type=int, default=200,
+                        help='volumes in the volume list response')
+    parser.add_argument('--bricks', type=int, default=120,
+                        help='bricks per volume')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Import time benchmark.
+
+Times the imports a program or the command line pays for, each in a
+fresh interpreter, and lists the heavy modules they load. Importing
+``glusterapi`` and ``glusterapi.cli`` must not load requests or jwt, they
+are imported on the first call. The exit status is 1 when one of them
+does, or when an import is slower than ``--max-ms``, so the script can
+guard against import time regressions.
+
+Usage::
+
+    python bench/import_bench.py [--repeat 10] [--max-ms 0] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# (name, statement, modules it must not load)
+IMPORTS = [
+    ('glusterapi', 'import glusterapi', ('requests', 'jwt')),
+    ('glusterapi.cli', 'import glusterapi.cli', ('requests', 'jwt')),
+    ('Client', 'from glusterapi import Client', ('requests', 'jwt')),
+    ('Client+requests',
+     'from glusterapi import Client; import requests, jwt', ()),
+    ('glusterapi.testing', 'import glusterapi.testing', ()),
+]
+
+HEAVY = ('requests', 'urllib3', 'jwt', 'concurrent.futures',
+         'email.utils', 'aiohttp', 'orjson', 'ujson')
+
+PROBE = '''
+import json, sys, timeit
+start = timeit.default_timer()
+%s
+elapsed = timeit.default_timer() - start
+heavy = [m for m in %r if m in sys.modules]
+sys.stdout.write(json.dumps([elapsed, len(sys.modules), heavy]))
+'''
+
+
+def probe(statement):
+    """Run statement in a fresh interpreter, return its import stats."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [p for p in [env.get('PYTHONPATH')] if p])
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE % (statement, HEAVY)], env=env)
+    elapsed, modules, heavy = json.loads(output.decode('ascii'))
+    return elapsed, modules, heavy
+
+
+def run(args):
+    results = []
+    for name, statement, forbidden in IMPORTS:
+        samples = []
+        for _ in range(args.repeat):
+            elapsed, modules, heavy = probe(statement)
+            samples.append(elapsed)
+        samples.sort()
+        results.append({
+            'name': name,
+            'best_ms': 1000 * samples[0],
+            'median_ms': 1000 * samples[len(samples) // 2],
+            'modules': modules,
+            'heavy': heavy,
+            'forbidden': [m for m in heavy if m in forbidden],
+        })
+    return results
+
+
+def report(results):
+    header = '%-20s %9s %10s %8s  %s' % ('import', 'best ms', 'median ms',
+                                         'modules', 'heavy modules')
+    print(header)
+    print('-' * len(header))
+    for res in results:
+        print('%-20s %9.1f %10.1f %8d  %s' % (
+            res['name'], res['best_ms'], res['median_ms'], res['modules'],
+            ', '.join(res['heavy']) or '-'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=0,
+                        help='fail when a median import time is above, '
+                             '0 disables the check')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+    failed = False
+    for res in results:
+        if res['forbidden']:
+            sys.stderr.write('%s loads %s\n' % (res['name'],
+                                                ', '.join(res['forbidden'])))
+            failed = True
+        if args.max_ms and res['median_ms'] > args.max_ms:
+            sys.stderr.write('%s takes %.1f ms\n' % (res['name'],
+                                                     res['median_ms']))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
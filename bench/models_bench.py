@@ -0,0 +1,125 @@
+"""
+Response model memory benchmark.
+
+Decodes the volume and peer lists of a large stand-in cluster as plain
+dicts and as glusterapi.models objects, and reports the memory each form
+keeps alive and the time it takes to build. Typed results are measured
+as returned, with nested subvolumes and bricks still undecoded, and after
+load() decoded them all.
+
+Needs tracemalloc (Python 3).
+
+Usage::
+
+    python bench/models_bench.py [--peers 12] [--volumes 200]
+                                 [--bricks 100] [--json]
+"""
+import argparse
+import gc
+import json
+import sys
+import timeit
+
+from glusterapi import Client
+from glusterapi.codec import JsonCodec
+from glusterapi.models import Peer, Volume, decode
+from glusterapi.testing import FakeGlusterd2
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def fetch(peers, volumes, bricks):
+    """Return the raw volume list and peer list response bodies."""
+    with FakeGlusterd2(peers=peers, volumes=volumes,
+                       bricks_per_volume=bricks) as gd2:
+        with Client(gd2.endpoint) as client:
+            session = client._session
+            return [session.request('GET', gd2.endpoint + path).content
+                    for path in ('/v1/volumes', '/v1/peers')]
+
+
+def forms():
+    """Return the (name, callable(volumes, peers)) pairs to measure."""
+    def as_dicts(volumes, peers):
+        return JsonCodec.loads(volumes), JsonCodec.loads(peers)
+
+    def as_models(volumes, peers):
+        return (decode(Volume, JsonCodec.loads(volumes)),
+                decode(Peer, JsonCodec.loads(peers)))
+
+    def as_loaded_models(volumes, peers):
+        result = as_models(volumes, peers)
+        for volume in result[0]:
+            volume.load()
+        return result
+
+    return [('dict', as_dicts), ('typed', as_models),
+            ('typed+load', as_loaded_models)]
+
+
+def measure(func, volumes, peers):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        start = timeit.default_timer()
+        result = func(volumes, peers)
+        elapsed = timeit.default_timer() - start
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return retained, elapsed
+
+
+def run(args):
+    volumes, peers = fetch(args.peers, args.volumes, args.bricks)
+    results = []
+    for name, func in forms():
+        retained, elapsed = measure(func, volumes, peers)
+        results.append({
+            'form': name,
+            'bricks': args.volumes * args.bricks,
+            'retained_mib': retained / 1024.0 / 1024.0,
+            'decode_ms': 1000 * elapsed,
+        })
+    return results
+
+
+def report(results):
+    header = '%-12s %8s %14s %11s %9s' % ('form', 'bricks', 'retained MiB',
+                                          'decode ms', 'vs dict')
+    print(header)
+    print('-' * len(header))
+    baseline = results[0]['retained_mib']
+    for res in results:
+        print('%-12s %8d %14.2f %11.1f %8.2fx' % (
+            res['form'], res['bricks'], res['retained_mib'],
+            res['decode_ms'], res['retained_mib'] / baseline))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--peers', type=int, default=12)
+    parser.add_argument('--volumes', type=int, default=200)
+    parser.add_argument('--bricks', type=int, default=100,
+                        help='bricks per volume')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+    if tracemalloc is None:
+        sys.exit('tracemalloc is not available, use Python 3')
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
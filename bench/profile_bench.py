@@ -0,0 +1,153 @@
+"""
+Profile analysis benchmark.
+
+Builds two successive volume_profile_info results of ``--bricks`` bricks
+reporting ``--fops`` FOPs each, then times, per step:
+
+- load: ProfileSample.from_info of the second result, the one
+  ProfileSampler.sample reads per poll
+- numpy: delta, latency_percentiles and hot_bricks on the arrays
+- python: the same delta, percentiles and hot bricks computed with
+  loops over both raw results
+
+Usage::
+
+    python bench/profile_bench.py [--bricks 1000] [--fops 40] [--repeat 5]
+                                  [--json]
+"""
+import argparse
+import json
+import random
+import timeit
+
+from glusterapi.profile import ProfileSample, delta
+
+PERCENTILES = (50, 90, 99)
+
+
+def records(bricks, fops, rand, prev=None):
+    """Return profile info records, adding to those of prev."""
+    result = []
+    for i in range(bricks):
+        stats = {}
+        for j in range(fops):
+            fop = 'FOP%02d' % j
+            hits = rand.randint(50, 150) * (5 if i == 7 else 1)
+            avg = rand.uniform(20, 400)
+            if prev is not None:
+                old = prev[i]['cumulative-stats']['stats-info'][fop]
+                old_hits = int(old['hits'])
+                work = float(old['avglatency']) * old_hits + avg * hits
+                avg = work / (old_hits + hits)
+                hits += old_hits
+            stats[fop] = {'hits': str(hits), 'avglatency': '%.2f' % avg,
+                          'minlatency': '1.00', 'maxlatency': '9000.00'}
+        result.append({
+            'brick-name': 'peer%d:/bricks/brick%d' % (i % 16, i),
+            'cumulative-stats': {'duration': '60', 'data-read': '0',
+                                 'data-written': '0', 'stats-info': stats},
+        })
+    return result
+
+
+def python_analysis(prev, cur):
+    """Per-record reference of delta, percentiles and hot bricks."""
+    before = dict((rec['brick-name'], rec['cumulative-stats']['stats-info'])
+                  for rec in prev)
+    per_fop = {}
+    totals = []
+    for rec in cur:
+        old = before.get(rec['brick-name'], {})
+        total = 0
+        for fop, stats in rec['cumulative-stats']['stats-info'].items():
+            hits = int(stats['hits'])
+            work = float(stats['avglatency']) * hits
+            if fop in old:
+                old_hits = int(old[fop]['hits'])
+                hits -= old_hits
+                work -= float(old[fop]['avglatency']) * old_hits
+            if hits > 0:
+                per_fop.setdefault(fop, []).append((work / hits, hits))
+            total += hits
+        totals.append((total, rec['brick-name']))
+
+    percentiles = {}
+    for fop, samples in per_fop.items():
+        samples.sort()
+        weight = sum(hits for _, hits in samples)
+        values = []
+        for pct in PERCENTILES:
+            target, acc = pct / 100.0 * weight, 0
+            for latency, hits in samples:
+                acc += hits
+                if acc >= target:
+                    values.append(latency)
+                    break
+        percentiles[fop] = values
+
+    ordered = sorted(total for total, _ in totals)
+    median = ordered[len(ordered) // 2]
+    deviations = sorted(abs(total - median) for total in ordered)
+    scale = 1.4826 * deviations[len(deviations) // 2] or 1
+    hot = [name for hits, name in totals
+           if (hits - median) / scale > 3.5]
+    return percentiles, hot
+
+
+def numpy_analysis(prev, cur):
+    interval = delta(prev, cur)
+    return interval.latency_percentiles(PERCENTILES), interval.hot_bricks()
+
+
+def best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def run(args):
+    rand = random.Random(1)
+    prev = records(args.bricks, args.fops, rand)
+    cur = records(args.bricks, args.fops, rand, prev)
+    load = best(lambda: ProfileSample.from_info(cur), args.repeat)
+    samples = ProfileSample.from_info(prev), ProfileSample.from_info(cur)
+    numpy_time = best(lambda: numpy_analysis(*samples), args.repeat)
+    python_time = best(lambda: python_analysis(prev, cur), args.repeat)
+    hot = [name for name, _, _ in numpy_analysis(*samples)[1]]
+    assert hot == python_analysis(prev, cur)[1], hot
+    return {
+        'bricks': args.bricks,
+        'fops': args.fops,
+        'load_ms': 1000 * load,
+        'numpy_ms': 1000 * numpy_time,
+        'python_ms': 1000 * python_time,
+        'hot_bricks': hot,
+    }
+
+
+def report(result):
+    print('%d bricks x %d FOPs, hot bricks: %s' % (
+        result['bricks'], result['fops'], ', '.join(result['hot_bricks'])))
+    print('%-28s %10.2f ms' % ('load', result['load_ms']))
+    print('%-28s %10.2f ms' % ('delta+percentiles+hot numpy',
+                               result['numpy_ms']))
+    print('%-28s %10.2f ms' % ('delta+percentiles+hot python',
+                               result['python_ms']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--bricks', type=int, default=1000)
+    parser.add_argument('--fops', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
+
+
+if __name__ == '__main__':
+    main()
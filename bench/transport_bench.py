@@ -0,0 +1,152 @@
+"""
+Transport benchmark.
+
+Sends volume_info calls through one client to the in-process stand-in
+over each transport:
+
+- tcp: the default HTTP/1.1 transport over loopback TCP
+- h2c: the HTTP/2 transport, multiplexing the calls over a single
+  connection, the stand-in serving HTTP/2 over plain TCP
+- unix: the default HTTP/1.1 transport over a Unix domain socket
+
+Reports the latency of sequential calls, then the throughput, latency
+percentiles and number of connections the stand-in accepted with
+``--workers`` concurrent threads. The h2c run needs httpx and h2 and is
+skipped without them, the unix run is skipped without AF_UNIX.
+
+Usage::
+
+    python bench/transport_bench.py [--calls 2000] [--workers 16]
+                                    [--latency 0.005] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import timeit
+
+from glusterapi import Client
+from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.session import H2C, HTTP1, get_transport
+from glusterapi.testing import FakeGlusterd2
+
+USER = 'glustercli'
+SECRET = 'bench-secret-bench-secret-bench-secret'
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+    return samples[idx]
+
+
+def measure(client, calls, workers, volumes):
+    """Run calls volume_info calls on workers threads."""
+    counter = iter(range(calls))
+    lock = threading.Lock()
+    samples = []
+    timer = timeit.default_timer
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = timer()
+            client.volume_info('vol%d' % (i % volumes))
+            elapsed = timer() - start
+            with lock:
+                samples.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    start = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return calls / (timer() - start), samples
+
+
+def setups(tmpdir):
+    """Return the (name, transport, FakeGlusterd2 kwargs) to compare."""
+    result = [('tcp', HTTP1, {})]
+    try:
+        get_transport(H2C)
+        result.append(('h2c', H2C, {'http2': True}))
+    except GlusterApiInvalidInputs as err:
+        print('skipping h2c: %s' % err)
+    if hasattr(socket, 'AF_UNIX'):
+        result.append(('unix', HTTP1,
+                       {'unix_socket': os.path.join(tmpdir, 'gd2.sock')}))
+    return result
+
+
+def run(args):
+    results = []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name, transport, kwargs in setups(tmpdir):
+            with FakeGlusterd2(volumes=args.volumes, user=USER,
+                               secret=SECRET, latency=args.latency,
+                               **kwargs) as gd2:
+                with Client(gd2.endpoint, user=USER, secret=SECRET,
+                            pool_maxsize=args.workers,
+                            transport=transport) as client:
+                    # Warm up connections and token cache
+                    measure(client, args.workers, args.workers,
+                            args.volumes)
+                    _, sequential = measure(client, args.calls // 4, 1,
+                                            args.volumes)
+                    throughput, samples = measure(client, args.calls,
+                                                  args.workers, args.volumes)
+                    connections = gd2.accepted
+            results.append({
+                'transport': name,
+                'sequential_p50_ms': 1000 * percentile(sequential, 50),
+                'calls_per_sec': throughput,
+                'p50_ms': 1000 * percentile(samples, 50),
+                'p99_ms': 1000 * percentile(samples, 99),
+                'connections': connections,
+            })
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def report(results):
+    header = '%-10s %12s %11s %9s %9s %12s' % (
+        'transport', 'seq p50 ms', 'calls/s', 'p50 ms', 'p99 ms',
+        'connections')
+    print(header)
+    print('-' * len(header))
+    for res in results:
+        print('%-10s %12.3f %11.1f %9.3f %9.3f %12d' % (
+            res['transport'], res['sequential_p50_ms'],
+            res['calls_per_sec'], res['p50_ms'], res['p99_ms'],
+            res['connections']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--volumes', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='seconds the stand-in adds to each response')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
-from glusterapi.bitrot import BitrotApis
-from glusterapi.device import DeviceApis
-from glusterapi.events import EventsApis
-from glusterapi.georep import GeorepApis
-from glusterapi.peer import PeerApis
-from glusterapi.snapshot import SnapshotsApis
-from glusterapi.volume import VolumeApis
+import sys
 
+__all__ = ['Client']
 
-class Client(VolumeApis, PeerApis, GeorepApis, BitrotApis, DeviceApis,
-             EventsApis, SnapshotsApis):
-    pass
+if sys.version_info >= (3, 7):
+    # Import the Client on first access, so that tools like the
+    # command line only pay for the modules they use
+    def __getattr__(name):
+        if name == 'Client':
+            from glusterapi.client import Client
+            return Client
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name))
+else:
+    from glusterapi.client import Client  # noqa: F401
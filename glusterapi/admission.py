@@ -0,0 +1,412 @@
+"""
+This module contains the client-side admission control of requests.
+
+An AdmissionController passed to a client with
+``Client(admission=AdmissionController(...))`` makes every attempt take a
+token from a token bucket before it is sent: the read calls (GET) from
+one, the mutating calls from another, so that a burst of mutations, e.g.
+200 snapshot_create, cannot use up the budget of the health-check reads.
+Calls without a token wait in a priority queue per budget and the queue
+admits the highest priority first, the oldest first within a priority.
+Priorities only order the calls waiting for the same budget: a HIGH read
+never waits for a LOW mutation, nor goes ahead of it.
+By default peer_status, volume_status and volume_info are HIGH priority
+and the other calls NORMAL. Bulk work can lower its own calls with::
+
+    with controller.priority(LOW):
+        for name in names:
+            client.snapshot_create('vol1', name)
+
+The priority applies to the calls made by the current thread or, on
+Python 3.7+, the current asyncio task. AsyncClient waits for its tokens
+on the event loop. Responses served from the response cache take no
+token.
+"""
+import contextlib
+import heapq
+import itertools
+import threading
+import timeit
+
+try:
+    import contextvars
+except ImportError:
+    # Python < 3.7, priorities are per thread
+    contextvars = None
+
+from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.exceptions import GlusterApiThrottled
+from glusterapi.metrics import DEFAULT_BUCKETS, Histogram, _bound
+from glusterapi.retry import IDEMPOTENT_METHODS
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+READ = 'read'
+MUTATE = 'mutate'
+
+# Calls health checks depend on, admitted ahead of the others
+DEFAULT_PRIORITIES = {
+    ('GET', '/version'): HIGH,
+    ('GET', '/v1/peers'): HIGH,
+    ('GET', '/v1/volumes/{volname}/status'): HIGH,
+    ('GET', '/v1/volumes/{volname}/bricks'): HIGH,
+}
+
+
+class TokenBucket(object):
+    """
+    ``rate`` tokens per second, accumulating up to ``burst``.
+
+    Not thread-safe, AdmissionController locks around it.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            refill = (now - self.updated) * self.rate
+            self.tokens = min(self.burst, self.tokens + refill)
+            self.updated = now
+
+    def take(self, now):
+        """Take a token, return False if there is none."""
+        self._refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def delay(self, now):
+        """Return the seconds until a token is available."""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _Budget(object):
+
+    __slots__ = ('bucket', 'queue', 'waiters', 'max_depth', 'admitted',
+                 'delayed', 'throttled', 'wait')
+
+    def __init__(self, bucket, buckets):
+        self.bucket = bucket
+        # Heap of the waiting (priority, arrival) entries
+        self.queue = []
+        # The _Waiter of the calls waiting without blocking a thread
+        self.waiters = set()
+        self.max_depth = 0
+        self.admitted = 0
+        self.delayed = 0
+        self.throttled = 0
+        self.wait = Histogram(buckets)
+
+
+class _Waiter(object):
+    """
+    A call queued by AdmissionController.waiter.
+
+    ``wake`` is called, with the controller locked and from any thread,
+    when the call may be admitted. It must not block.
+    """
+
+    __slots__ = ('controller', 'endpoint', 'budget', 'entry', 'start',
+                 'wake')
+
+    def __init__(self, controller, endpoint, budget, entry, start):
+        self.controller = controller
+        self.endpoint = endpoint
+        self.budget = budget
+        self.entry = entry
+        self.start = start
+        self.wake = None
+
+    def poll(self):
+        """
+        Take the token if the call is the head of its queue.
+
+        :return: (tuple) seconds waited, None if not admitted, and seconds
+                 to wait before polling again, None to wait for a wake up
+        :raises: GlusterApiThrottled after waiting max_wait seconds
+        """
+        with self.controller._cond:
+            return self.controller._poll(self.endpoint, self.budget,
+                                         self.entry, self.start)
+
+    def close(self):
+        """Leave the queue, admitted or not."""
+        with self.controller._cond:
+            self.budget.waiters.discard(self)
+            self.controller._dequeue(self.budget, self.entry)
+
+
+class AdmissionController(object):
+    """
+    Token-bucket rate limits with priority queuing for a client.
+
+    :param read_rate: (float) read calls per second, None for no limit
+    :param read_burst: (int) read calls admitted at once after idling,
+                       read_rate by default
+    :param mutate_rate: (float) mutating calls per second, None for no
+                        limit
+    :param mutate_burst: (int) mutating calls admitted at once after
+                         idling, mutate_rate by default
+    :param priorities: (dict) (method, endpoint template) -> priority,
+                       overriding DEFAULT_PRIORITIES
+    :param max_wait: (float) seconds a call may wait before it fails with
+                     GlusterApiThrottled, None to wait for ever
+    :param buckets: (tuple) wait time histogram upper bounds in seconds
+    :param clock: callable returning monotonic seconds
+    """
+
+    def __init__(self, read_rate=None, read_burst=None, mutate_rate=None,
+                 mutate_burst=None, priorities=None, max_wait=None,
+                 buckets=DEFAULT_BUCKETS, clock=timeit.default_timer):
+        self.priorities = dict(DEFAULT_PRIORITIES)
+        if priorities is not None:
+            self.priorities.update(priorities)
+        self.max_wait = max_wait
+        self.buckets = tuple(sorted(buckets))
+        self.clock = clock
+        self._budgets = {}
+        now = clock()
+        for name, rate, burst in ((READ, read_rate, read_burst),
+                                  (MUTATE, mutate_rate, mutate_burst)):
+            bucket = None
+            if rate is not None:
+                if rate <= 0:
+                    raise GlusterApiInvalidInputs(
+                        "Invalid %s rate %r, must be positive" %
+                        (name, rate))
+                bucket = TokenBucket(rate, max(1, burst or rate), now)
+            self._budgets[name] = _Budget(bucket, self.buckets)
+        self._arrivals = itertools.count()
+        if contextvars is not None:
+            self._priority = contextvars.ContextVar(
+                'glusterapi_priority_%x' % id(self), default=None)
+        else:
+            self._local = threading.local()
+        self._cond = threading.Condition(threading.Lock())
+
+    @contextlib.contextmanager
+    def priority(self, priority):
+        """
+        Give the calls made by the current thread or asyncio task in the
+        block a priority.
+
+        :param priority: (int) HIGH, NORMAL or LOW, lower goes first
+        """
+        if contextvars is not None:
+            token = self._priority.set(priority)
+            try:
+                yield
+            finally:
+                self._priority.reset(token)
+            return
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def priority_of(self, endpoint):
+        """
+        Return the priority of a call made by the current thread or task.
+
+        :param endpoint: (tuple) method and endpoint template
+        """
+        if contextvars is not None:
+            priority = self._priority.get()
+        else:
+            priority = getattr(self._local, 'priority', None)
+        if priority is not None:
+            return priority
+        return self.priorities.get(endpoint, NORMAL)
+
+    @staticmethod
+    def budget(endpoint):
+        """Return the budget, READ or MUTATE, of a call."""
+        return READ if endpoint[0] in IDEMPOTENT_METHODS else MUTATE
+
+    def acquire(self, endpoint, priority=None, blocking=True):
+        """
+        Wait for the token of a call.
+
+        :param endpoint: (tuple) method and endpoint template
+        :param priority: (int) priority of the call, priority_of(endpoint)
+                         by default
+        :param blocking: (bool) return None instead of waiting when the
+                         call cannot be admitted at once
+        :return: (float) seconds waited
+        :raises: GlusterApiThrottled after waiting max_wait seconds
+        """
+        if priority is None:
+            priority = self.priority_of(endpoint)
+        budget = self._budgets[self.budget(endpoint)]
+        with self._cond:
+            start = self.clock()
+            if budget.bucket is None or \
+                    (not budget.queue and budget.bucket.take(start)):
+                self._admitted(budget, 0.0)
+                return 0.0
+            if not blocking:
+                return None
+            entry = self._enqueue(budget, priority)
+            try:
+                while True:
+                    waited, timeout = self._poll(endpoint, budget, entry,
+                                                 start)
+                    if waited is not None:
+                        return waited
+                    self._cond.wait(timeout)
+            finally:
+                self._dequeue(budget, entry)
+
+    def waiter(self, endpoint, priority=None):
+        """
+        Queue a call that waits for its token without blocking a thread.
+
+        Used by AsyncClient: the returned _Waiter is polled until
+        admitted, and calls its ``wake`` callback when it may be.
+
+        :param endpoint: (tuple) method and endpoint template
+        :param priority: (int) priority of the call, priority_of(endpoint)
+                         by default
+        :return: _Waiter, to close once done with
+        """
+        if priority is None:
+            priority = self.priority_of(endpoint)
+        budget = self._budgets[self.budget(endpoint)]
+        with self._cond:
+            waiter = _Waiter(self, endpoint, budget,
+                             self._enqueue(budget, priority), self.clock())
+            budget.waiters.add(waiter)
+        return waiter
+
+    def _enqueue(self, budget, priority):
+        entry = (priority, next(self._arrivals))
+        heapq.heappush(budget.queue, entry)
+        budget.max_depth = max(budget.max_depth, len(budget.queue))
+        return entry
+
+    def _poll(self, endpoint, budget, entry, start):
+        """
+        Admit a queued call if it is the head and a token is available.
+
+        :return: (tuple) seconds waited, None if not admitted, and seconds
+                 to wait before polling again, None to wait for a wake up
+        :raises: GlusterApiThrottled after waiting max_wait seconds
+        """
+        now = self.clock()
+        head = budget.queue[0] == entry
+        if head and (budget.bucket is None or budget.bucket.take(now)):
+            heapq.heappop(budget.queue)
+            waited = now - start
+            self._admitted(budget, waited)
+            return waited, None
+        # Only the head waits for the next token, the others until the
+        # head is admitted
+        timeout = budget.bucket.delay(now) if head else None
+        if self.max_wait is not None:
+            left = start + self.max_wait - now
+            if left <= 0:
+                budget.throttled += 1
+                raise GlusterApiThrottled(
+                    '%s %s: not admitted within %ss' %
+                    (endpoint + (self.max_wait,)))
+            timeout = left if timeout is None else min(timeout, left)
+        return None, timeout
+
+    def _dequeue(self, budget, entry):
+        if entry in budget.queue:
+            budget.queue.remove(entry)
+            heapq.heapify(budget.queue)
+        # The next waiter may be the head now
+        self._cond.notify_all()
+        for waiter in sorted(budget.waiters, key=lambda w: w.entry):
+            if waiter.wake is not None:
+                waiter.wake()
+
+    def _admitted(self, budget, waited):
+        budget.admitted += 1
+        if waited > 0:
+            budget.delayed += 1
+        budget.wait.observe(waited)
+
+    def queue_depth(self, budget=None):
+        """
+        Return the number of calls waiting.
+
+        :param budget: READ or MUTATE, both by default
+        """
+        with self._cond:
+            if budget is not None:
+                return len(self._budgets[budget].queue)
+            return sum(len(b.queue) for b in self._budgets.values())
+
+    def snapshot(self):
+        """
+        Current admission metrics.
+
+        :return: (dict) READ and MUTATE -> dict with depth, max_depth,
+                 admitted, delayed (admitted after waiting), throttled,
+                 wait_sum and the wait time buckets
+        """
+        result = {}
+        with self._cond:
+            for name, budget in self._budgets.items():
+                result[name] = {
+                    'depth': len(budget.queue),
+                    'max_depth': budget.max_depth,
+                    'admitted': budget.admitted,
+                    'delayed': budget.delayed,
+                    'throttled': budget.throttled,
+                    'wait_sum': budget.wait.sum,
+                    'buckets': list(zip(self.buckets + (float('inf'),),
+                                        budget.wait.cumulative())),
+                }
+        return result
+
+    def render_prometheus(self, prefix='glusterapi'):
+        """
+        Render the admission metrics in the Prometheus text format.
+
+        :param prefix: (string) metric name prefix
+        :return: (string) exposition text
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def header(name, kind, text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+        header('admission_wait_seconds', 'histogram',
+               'Time calls waited for admission.')
+        for name in sorted(snapshot):
+            data = snapshot[name]
+            for bound, count in data['buckets']:
+                lines.append('%s_admission_wait_seconds_bucket{budget="%s",'
+                             'le="%s"} %d' % (prefix, name, _bound(bound),
+                                              count))
+            lines.append('%s_admission_wait_seconds_sum{budget="%s"} %r' %
+                         (prefix, name, data['wait_sum']))
+            lines.append('%s_admission_wait_seconds_count{budget="%s"} %d' %
+                         (prefix, name, data['admitted']))
+        for metric, field, kind, text in (
+                ('admission_queue_depth', 'depth', 'gauge',
+                 'Calls waiting for admission.'),
+                ('admission_throttled_total', 'throttled', 'counter',
+                 'Calls failed after waiting max_wait.')):
+            header(metric, kind, text)
+            for name in sorted(snapshot):
+                lines.append('%s_%s{budget="%s"} %d' %
+                             (prefix, metric, name, snapshot[name][field]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,509 @@
+"""
+This module contains the asyncio client for glusterd2.
+
+``AsyncClient`` exposes the same methods as ``glusterapi.Client``, built
+from the same API mixins, but every call returns an awaitable and the
+requests are sent over a pooled, non-blocking aiohttp session.
+
+Requires Python 3.5+ and aiohttp.
+"""
+import asyncio
+import json
+import ssl
+import timeit
+
+import aiohttp
+
+from glusterapi.bitrot import BitrotApis
+from glusterapi.common import BaseAPI, response_error, validate_volume_name
+from glusterapi.compat import httplib
+from glusterapi.concurrency import unique
+from glusterapi.device import DeviceApis
+from glusterapi.endpoints import EndpointPool
+from glusterapi.events import EventsApis
+from glusterapi.georep import GeorepApis, _find_session, _session_url
+from glusterapi.peer import PeerApis
+from glusterapi.planner import plan_volume
+from glusterapi.session import HTTP1
+from glusterapi.snapshot import SnapshotsApis
+from glusterapi.streaming import CHUNK_SIZE, JsonArrayDecoder
+from glusterapi.volume import VolumeApis
+
+
+class AsyncResponse(object):
+    """Fully read HTTP response returned by the async session."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def close(self):
+        # The body is already read, there is nothing to release
+        pass
+
+
+class AsyncStreamResponse(object):
+    """HTTP response returned by the async session, its body unread."""
+
+    def __init__(self, resp):
+        self.raw = resp
+        self.status_code = resp.status
+        self.headers = resp.headers
+
+    def read(self):
+        return self.raw.read()
+
+    def iter_chunked(self, chunk_size):
+        return self.raw.content.iter_chunked(chunk_size)
+
+    def close(self):
+        self.raw.release()
+
+
+class AsyncSessionManager(object):
+    """
+    Owner of the ``aiohttp.ClientSession`` shared by an async client.
+
+    The session is created lazily inside the running event loop and takes
+    the same pool, keep-alive and timeout settings as ``SessionManager``.
+    """
+
+    # Exceptions raised by request() when no response was received
+    errors = (aiohttp.ClientError, asyncio.TimeoutError)
+
+    def __init__(self, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, keep_alive=True, connect_timeout=None,
+                 read_timeout=None):
+        """
+        :param pool_connections: (int) number of hosts to pool for
+        :param pool_maxsize: (int) max connections open per host
+        :param pool_block: (bool) unused, aiohttp always waits for a free
+                           connection once the limit is reached
+        :param keep_alive: (bool) reuse connections between requests
+        :param connect_timeout: (float) seconds to wait for a connection
+        :param read_timeout: (float) seconds to wait for a response
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = None
+        self._ssl = {}
+
+    def _ssl_context(self, verify):
+        if verify is False:
+            return False
+        if verify is True:
+            return None
+        # verify is a CA bundle path, as accepted by requests
+        if verify not in self._ssl:
+            self._ssl[verify] = ssl.create_default_context(cafile=verify)
+        return self._ssl[verify]
+
+    def session(self):
+        """Return the shared session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_connections * self.pool_maxsize,
+                limit_per_host=self.pool_maxsize,
+                force_close=not self.keep_alive)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout,
+                                            sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=timeout)
+        return self._session
+
+    def stream(self, method, url, headers=None, verify=True, **kwargs):
+        """
+        Send a request whose body is read by the caller.
+
+        :param method: (string) HTTP method
+        :param url: (string) absolute url
+        :return: async context manager yielding aiohttp.ClientResponse
+        """
+        if headers is not None:
+            headers = dict((k, v.decode('ascii') if isinstance(v, bytes)
+                            else v) for k, v in headers.items())
+        if kwargs.get('params') is None:
+            kwargs.pop('params', None)
+        # Bodies are read by the caller, there is no separate stream mode
+        kwargs.pop('stream', None)
+        return self.session().request(method, url, headers=headers,
+                                      ssl=self._ssl_context(verify),
+                                      **kwargs)
+
+    async def request(self, method, url, headers=None, verify=True,
+                      **kwargs):
+        """
+        Send a request through the pooled session.
+
+        :param method: (string) HTTP method
+        :param url: (string) absolute url
+        :return: AsyncResponse
+        """
+        async with self.stream(method, url, headers=headers, verify=verify,
+                               **kwargs) as resp:
+            content = await resp.read()
+            return AsyncResponse(resp.status, resp.headers, content)
+
+    @staticmethod
+    def is_connect_error(err):
+        """
+        Check whether a request failed before reaching glusterd2.
+
+        :param err: exception raised by request()
+        :return: (bool) True if no connection could be established
+        """
+        return isinstance(err, aiohttp.ClientConnectorError)
+
+    async def close(self):
+        """Close all pooled connections. The session is recreated on reuse."""
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+
+class AsyncBaseAPI(BaseAPI):
+    """
+    BaseAPI variant whose requests are coroutines.
+
+    The API mixins only validate their inputs and build the request, then
+    return whatever ``_handle_request`` returns, so swapping the session
+    and awaiting inside ``_handle_request`` makes every mixin method
+    awaitable without duplicating it.
+    """
+
+    _session_class = AsyncSessionManager
+
+    def __init__(self, endpoint='http://127.0.0.1:24007', *args, **kwargs):
+        """
+        Take the arguments of BaseAPI.
+
+        :raises: ValueError for the HTTP/2 transports, session managers
+                 other than AsyncSessionManager and unix:// endpoints,
+                 which only the blocking client supports
+        """
+        transport = kwargs.pop('transport', None)
+        if transport == HTTP1:
+            transport = None
+        if transport is not None and not _async_transport(transport):
+            raise ValueError("The async client does not support the %s "
+                             "transport" % (transport,))
+        if isinstance(endpoint, EndpointPool):
+            urls = endpoint.urls
+        elif isinstance(endpoint, str):
+            urls = [endpoint]
+        else:
+            urls = list(endpoint)
+        if any(url.startswith(('unix://', 'http+unix://')) for url in urls):
+            raise ValueError("The async client does not support unix:// "
+                             "endpoints")
+        BaseAPI.__init__(self, endpoint, *args, transport=transport,
+                         **kwargs)
+
+    async def close(self):
+        """Release the pooled connections held by this client."""
+        # Do not block the loop joining the health check thread
+        self.endpoints.close(wait=False)
+        await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _iter_request(self, url, param=None, chunk_size=CHUNK_SIZE,
+                            model=None):
+        decoder = JsonArrayDecoder(loads=self.codec.loads)
+        tracker = None
+        if self.metrics is not None:
+            tracker = self.metrics.track('GET', url)
+        received = 0
+
+        async def send(base_url):
+            headers = self._set_token_in_header('GET', url)
+            resp = await self._session.stream('GET', base_url + url,
+                                              headers=headers,
+                                              verify=self.verify,
+                                              params=param)
+            return AsyncStreamResponse(resp)
+
+        try:
+            resp, attempts = await self._attempts(
+                self._endpoint(self._get, url), send)
+        except Exception as err:
+            if tracker is not None:
+                tracker.failed(err)
+            raise
+        try:
+            if resp.status_code != 200:
+                raise response_error(resp.status_code, await resp.read(),
+                                     attempts)
+            async for chunk in resp.iter_chunked(chunk_size):
+                received += len(chunk)
+                for item in decoder.feed(chunk):
+                    yield item if model is None else model.from_dict(item)
+            decoder.close()
+        finally:
+            resp.close()
+            if tracker is not None:
+                tracker.done(resp.status_code, received)
+
+    async def _fan_out(self, func, items, max_workers=None):
+        if max_workers is None:
+            max_workers = self.max_workers
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def call(item):
+            async with semaphore:
+                return await func(item)
+
+        items = unique(items)
+        results = await asyncio.gather(*[call(item) for item in items],
+                                       return_exceptions=True)
+        return dict(zip(items, results))
+
+    async def _send(self, func, args, kwargs):
+        tracker = None
+        if self.metrics is not None:
+            tracker = self._track(func, args, kwargs)
+        try:
+            resp = await func(*args, **kwargs)
+        except Exception as err:
+            if tracker is not None:
+                tracker.failed(err)
+            raise
+        if tracker is not None:
+            tracker.done(resp.status_code, len(resp.content))
+        return resp
+
+    async def _admit(self, endpoint):
+        # Wait on the event loop, woken in priority order
+        priority = self.admission.priority_of(endpoint)
+        if self.admission.acquire(endpoint, priority,
+                                  blocking=False) is not None:
+            return
+        loop = _running_loop()
+        waiter = self.admission.waiter(endpoint, priority)
+        try:
+            while True:
+                waited, timeout = waiter.poll()
+                if waited is not None:
+                    return
+                future = loop.create_future()
+                waiter.wake = lambda: loop.call_soon_threadsafe(_wake,
+                                                                future)
+                timer = None
+                if timeout is not None:
+                    timer = loop.call_later(timeout, _wake, future)
+                try:
+                    await future
+                finally:
+                    waiter.wake = None
+                    if timer is not None:
+                        timer.cancel()
+        finally:
+            waiter.close()
+
+    async def _attempts(self, endpoint, send, invalidate=None, pinned=None):
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.admission is not None:
+                # Before the circuit, a throttled call must not hold its
+                # half-open trial
+                await self._admit(endpoint)
+            base_url = pinned or self._choose_endpoint(endpoint)
+            self._before_attempt(endpoint, attempt, base_url)
+            start = timeit.default_timer()
+            try:
+                resp = await send(base_url)
+            except self._session.errors as err:
+                if invalidate is not None:
+                    self.cache.invalidate(invalidate)
+                delay = self._after_attempt(endpoint, attempt, base_url,
+                                            err=err)
+                if delay is None:
+                    raise self._transport_error(endpoint, attempt, err)
+            except BaseException:
+                # Cancelled, or failed without an outcome for the circuit
+                self._abort_attempt(endpoint, base_url)
+                raise
+            else:
+                delay = self._after_attempt(
+                    endpoint, attempt, base_url, resp=resp,
+                    elapsed=timeit.default_timer() - start)
+                if delay is None:
+                    return resp, attempt
+                resp.close()
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def _handle_request(self, func, expected_status_code, *args,
+                              **kwargs):
+        model = kwargs.pop('model', None)
+        pinned = kwargs.pop('base_url', None)
+        cache = self.cache if pinned is None else None
+        key = generation = None
+        if cache is not None:
+            key, generation, cached = self._cache_lookup(func, args, kwargs,
+                                                         model)
+            if cached is not None:
+                return cached
+
+        async def send(base_url):
+            kwargs['base_url'] = base_url
+            return await self._send(func, args, kwargs)
+
+        # A mutation may be applied all the same when its response is lost
+        invalidate = None
+        if cache is not None and key is None:
+            invalidate = args[0]
+        resp, attempt = await self._attempts(self._endpoint(func, args[0]),
+                                             send, invalidate, pinned)
+
+        if cache is not None:
+            self._cache_update(func, args[0], key, generation, resp,
+                               expected_status_code)
+        return self._handle_response(resp, expected_status_code, attempt,
+                                     model)
+
+
+class AsyncClient(AsyncBaseAPI, VolumeApis, PeerApis, GeorepApis,
+                  BitrotApis, DeviceApis, EventsApis, SnapshotsApis):
+
+    async def volume_restart(self, vol_name, force=False):
+        """
+        Restart Gluster Volume.
+
+        :param vol_name: (string) Volume Name
+        :param force: (bool) Restart the Volume with Force
+        :raises: GlusterAPIError or failure
+        """
+        validate_volume_name(vol_name)
+
+        await self.volume_stop(vol_name)
+        return await self.volume_start(vol_name, force)
+
+    async def volume_plan(self, volume_name, replica=0, arbiter=0,
+                          disperse=0, disperse_redundancy=0, distribute=1,
+                          brick_size=None, brick_root='/bricks',
+                          usage=None):
+        """
+        Plan the bricks of a new volume from the peers and devices.
+
+        :return: glusterapi.planner.VolumePlan
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        validate_volume_name(volume_name)
+        (_, peers), (_, devices) = await asyncio.gather(
+            self._handle_request(self._get, httplib.OK, "/v1/peers"),
+            self._handle_request(self._get, httplib.OK, "/devices"))
+        return plan_volume(peers, devices, volume_name, replica=replica,
+                           arbiter=arbiter, disperse=disperse,
+                           disperse_redundancy=disperse_redundancy,
+                           distribute=distribute, brick_size=brick_size,
+                           brick_root=brick_root, usage=usage)
+
+    async def _georep_request(self, session, func, expected_status_code,
+                              suffix='', data=None, transform=None):
+        _, sessions = await self._handle_request(self._get, httplib.OK,
+                                                 "/v1/geo-replication")
+        found = _find_session(sessions, *session)
+        url = _session_url(found['master-volid'],
+                           found['remote-volid']) + suffix
+        result = await self._handle_request(func, expected_status_code, url,
+                                            data)
+        return result if transform is None else transform(result)
+
+    async def _remote_volume_id(self, remotehost, remotevol, api_user=None,
+                                api_secret=None):
+        base_url, url, headers = self._remote_volume_request(
+            remotehost, remotevol, api_user, api_secret)
+        _, volume = await self._handle_request(self._get, httplib.OK, url,
+                                               base_url=base_url,
+                                               headers=headers)
+        return volume['id']
+
+    async def georep_create(self, mastervol, remotehost, remotevol,
+                            remoteuser="root", remotevolid=None,
+                            force=False, remote_api_user=None,
+                            remote_api_secret=None):
+        """
+        Create Geo-replication Session
+
+        :raises: GlusterAPIError or failure
+        """
+        validate_volume_name(mastervol)
+        validate_volume_name(remotevol)
+
+        _, volume = await self._handle_request(self._get, httplib.OK,
+                                               "/v1/volumes/%s" % mastervol)
+        if remotevolid is None:
+            remotevolid = await self._remote_volume_id(
+                remotehost, remotevol, remote_api_user, remote_api_secret)
+        req = {
+            "mastervol": mastervol,
+            "remoteuser": remoteuser,
+            "remotehosts": [remotehost],
+            "remotevol": remotevol,
+            "force": force,
+        }
+        return await self._handle_request(
+            self._post, httplib.CREATED,
+            _session_url(volume['id'], remotevolid), self.codec.dumps(req))
+
+    async def volume_status_all(self, max_workers=None):
+        """
+        Gluster Volume Status for every volume in the cluster.
+
+        :param max_workers: (int) max number of requests in flight
+        :return: (dict) volume name -> volume_status result, or the
+                 exception raised for that volume
+        :raises: GlusterAPIError if the volume list cannot be fetched
+        """
+        _, volumes = await self.volume_list()
+        return await self.volume_status_many([vol['name'] for vol in volumes],
+                                             max_workers)
+
+    async def device_status_all_peers(self, max_workers=None):
+        """
+        Gluster get devices of every peer concurrently.
+
+        :param max_workers: (int) max number of requests in flight
+        :return: (dict) peer id -> device_status result, or the exception
+                 raised for that peer
+        :raises: GlusterApiError if the peer list cannot be fetched
+        """
+        _, peers = await self._handle_request(self._get, httplib.OK,
+                                              "/v1/peers")
+        return await self._fan_out(self.device_status,
+                                   [peer['id'] for peer in peers],
+                                   max_workers)
+
+
+def _async_transport(transport):
+    """Whether a transport is an AsyncSessionManager class."""
+    return isinstance(transport, type) and \
+        issubclass(transport, AsyncSessionManager)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _running_loop():
+    """Return the loop running the current coroutine."""
+    try:
+        return asyncio.get_running_loop()
+    except AttributeError:
+        # Python < 3.7
+        return asyncio.get_event_loop()
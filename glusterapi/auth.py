@@ -0,0 +1,119 @@
+"""This module contains the glusterd2 JWT signing and token cache."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from glusterapi.exceptions import GlusterApiInvalidInputs
+
+
+def sign_token(user, secret, method, uri, lifetime, now=None):
+    """
+    Sign a glusterd2 JWT for a single method and uri.
+
+    :param user: (string) token issuer
+    :param secret: (string) shared secret
+    :param method: (string) HTTP method
+    :param uri: (string) request path, used for the qsh claim
+    :param lifetime: (int) seconds the token stays valid
+    :return: signed token
+    """
+    if now is None:
+        now = time.time()
+    issued = int(now)
+
+    # URI tampering protection
+    val = b'%s&%s' % (method.encode('utf8'), uri.encode('utf8'))
+    claims = {
+        'iss': user,
+        'iat': issued,
+        'exp': issued + lifetime,
+        'qsh': hashlib.sha256(val).hexdigest(),
+    }
+    # Imported here, only clients with a secret need it
+    import jwt
+    token = jwt.encode(claims, secret, algorithm='HS256')
+    # PyJWT >= 2.0 returns text instead of bytes
+    if not isinstance(token, bytes):
+        token = token.encode('ascii')
+    return token
+
+
+class TokenCache(object):
+    """
+    Bounded LRU cache of signed tokens keyed by (method, uri).
+
+    A cached token is reused until ``refresh_margin`` seconds before it
+    expires, after which a fresh one is signed.
+    """
+
+    def __init__(self, maxsize=256, lifetime=30, refresh_margin=5):
+        """
+        :param maxsize: (int) max number of tokens kept, 0 disables caching
+        :param lifetime: (int) seconds a signed token stays valid
+        :param refresh_margin: (int) seconds before expiry to re-sign
+        """
+        if lifetime <= 0:
+            raise GlusterApiInvalidInputs("Token lifetime must be positive")
+        if not 0 <= refresh_margin < lifetime:
+            raise GlusterApiInvalidInputs(
+                "Token refresh margin must be smaller than its lifetime")
+        self.maxsize = maxsize
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self.hits = 0
+        self.misses = 0
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user, secret, method, uri):
+        """
+        Return a still valid token for (method, uri), signing on a miss.
+
+        :param user: (string) token issuer
+        :param secret: (string) shared secret
+        :param method: (string) HTTP method
+        :param uri: (string) request path
+        :return: signed token
+        """
+        key = (method, uri)
+        now = time.time()
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                # Refresh LRU position
+                del self._tokens[key]
+                self._tokens[key] = entry
+                return entry[0]
+            self.misses += 1
+
+        token = sign_token(user, secret, method, uri, self.lifetime, now)
+        if self.maxsize <= 0:
+            return token
+
+        refresh_at = int(now) + self.lifetime - self.refresh_margin
+        with self._lock:
+            self._tokens.pop(key, None)
+            self._tokens[key] = (token, refresh_at)
+            while len(self._tokens) > self.maxsize:
+                self._tokens.popitem(last=False)
+        return token
+
+    def clear(self):
+        """Drop all cached tokens."""
+        with self._lock:
+            self._tokens.clear()
+
+    def stats(self):
+        """
+        Token cache statistics.
+
+        :return: (dict) hits, misses and current size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._tokens),
+            }
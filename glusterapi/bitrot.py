@@ -1,6 +1,5 @@
-import httplib
-
 from glusterapi.common import BaseAPI, validate_volume_name
+from glusterapi.compat import httplib
 
 
 class BitrotApis(BaseAPI):
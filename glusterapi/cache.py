@@ -0,0 +1,150 @@
+"""This module contains the read-through response cache for GET calls."""
+import threading
+import time
+from collections import OrderedDict
+
+from glusterapi import routes
+
+# Status endpoints change often, keep them for a shorter time
+DEFAULT_TTLS = {
+    '/v1/volumes/{volname}/status': 1,
+    '/v1/volumes/{volname}/bitrot/scrubstatus': 1,
+    # Reading the profile starts a new interval on glusterd2
+    '/v1/volumes/{volname}/profile/{option}': 0,
+}
+
+# Mutations on a collection also make these collections stale
+RELATED = {
+    '/v1/peers': ('/v1/devices', '/devices'),
+    '/v1/devices': ('/devices',),
+}
+
+
+class ResponseCache(object):
+    """
+    Size bounded TTL cache of successful GET responses.
+
+    Entries are keyed by request path and query parameters and hold the
+    raw response body, so each hit decodes a fresh copy the caller is free
+    to modify. A mutating call invalidates the list of its collection and
+    everything below the item it touched, e.g. POST
+    /v1/volumes/vol1/options drops /v1/volumes and /v1/volumes/vol1/*.
+    """
+
+    def __init__(self, maxsize=1024, default_ttl=5, ttls=None):
+        """
+        :param maxsize: (int) max number of cached responses
+        :param default_ttl: (float) seconds a response stays valid
+        :param ttls: (dict) endpoint template -> ttl in seconds, overriding
+                     default_ttl, e.g. {'/v1/peers': 30}. A ttl of 0
+                     disables caching for that endpoint.
+        """
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path, params=None):
+        if not params:
+            return path, ()
+        return path, tuple(sorted(params.items()))
+
+    def ttl(self, path):
+        return self.ttls.get(routes.template(path), self.default_ttl)
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        :param key: cache key from ResponseCache.key
+        :return: (tuple) status code and body, or None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            del self._entries[key]
+            self._entries[key] = entry
+            return entry[1], entry[2]
+
+    def set(self, key, status_code, content, generation=None):
+        """
+        Store a response.
+
+        :param key: cache key from ResponseCache.key
+        :param status_code: (int) response status code
+        :param content: (bytes) raw response body
+        :param generation: (int) cache generation read before the request
+                           was sent, the response is dropped if an
+                           invalidation happened since
+        """
+        ttl = self.ttl(key[0])
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        expires = time.time() + ttl
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, status_code, content)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, path):
+        """
+        Drop the entries made stale by a mutating call on path.
+
+        :param path: (string) path of the mutating request
+        """
+        collection, item = routes.resource(path)
+        related = RELATED.get(collection, ())
+        with self._lock:
+            self.generation += 1
+            stale = []
+            for key in self._entries:
+                cached_collection, cached_item = routes.resource(key[0])
+                if key[0] == collection or cached_collection in related:
+                    stale.append(key)
+                elif item is not None and cached_item == item:
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Response cache statistics.
+
+        :return: (dict) hits, misses, evictions, invalidations and size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
@@ -0,0 +1,249 @@
+"""
+This module contains the ``glusterapi`` command line.
+
+Every public Client method is a subcommand, named with dashes instead of
+underscores, whose arguments follow the method signature: the required
+ones are positional and the others are ``--options``, flags for the
+booleans. Values starting with ``[`` or ``{`` are parsed as JSON lists
+and dicts, the options defaulting to a number are numbers, and the other
+values are taken as strings, so a volume named ``123`` stays a name::
+
+    $ glusterapi --endpoint http://gd2:24007 volume-list
+    $ glusterapi volume-set vol1 --options '{"nfs.disable": "on"}'
+    $ glusterapi volume-start vol1 --force
+
+The response body is printed as JSON, one document per line for the
+iter-* commands. Errors are printed to stderr, the exit status is 1 on
+GlusterApiError and 2 on invalid arguments.
+
+The client modules, and requests, are imported only once the command
+line is parsed, so that ``--help`` and argument errors are immediate.
+"""
+import argparse
+import json
+import os
+import sys
+import types
+
+from glusterapi.exceptions import GlusterApiError, GlusterApiInvalidInputs
+
+DEFAULT_ENDPOINT = 'http://127.0.0.1:24007'
+
+# Client methods that are not glusterd2 calls
+_SKIPPED = frozenset(['check', 'close'])
+
+# Arguments the command line always leaves to their default
+_HIDDEN_ARGS = frozenset(['typed'])
+
+# Integer arguments whose default, None, does not tell their type
+_INT_ARGS = frozenset(['max_workers', 'brick_size'])
+
+
+def _client_class():
+    from glusterapi.client import Client
+    return Client
+
+
+def commands(client_class=None):
+    """
+    Return the Client methods exposed as subcommands.
+
+    :param client_class: class whose methods are listed, glusterapi.Client
+                         by default
+    :return: (dict) command name -> function
+    """
+    if client_class is None:
+        client_class = _client_class()
+    result = {}
+    for name in dir(client_class):
+        if name.startswith('_') or name in _SKIPPED:
+            continue
+        func = getattr(client_class, name)
+        # Unbound methods wrap the function on Python 2
+        func = getattr(func, '__func__', func)
+        if isinstance(func, types.FunctionType):
+            result[name.replace('_', '-')] = func
+    return result
+
+
+def _summary(func):
+    doc = (func.__doc__ or '').strip()
+    return doc.splitlines()[0] if doc else ''
+
+
+def _value(text):
+    """Decode JSON lists and dicts, keep anything else a string."""
+    if text.lstrip()[:1] not in ('[', '{'):
+        return text
+    try:
+        return json.loads(text)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError('invalid JSON %r: %s' % (text, err))
+
+
+def _type(arg, default):
+    """Return the argparse type of an argument."""
+    if arg in _INT_ARGS:
+        return int
+    if isinstance(default, (int, float)) and not isinstance(default, bool):
+        return type(default)
+    return _value
+
+
+def _command_parser(prog, name, func):
+    """Build the argument parser of a subcommand from its signature."""
+    parser = argparse.ArgumentParser(prog='%s %s' % (prog, name),
+                                     description=_summary(func))
+    code = func.__code__
+    args = code.co_varnames[1:code.co_argcount]
+    defaults = func.__defaults__ or ()
+    required = len(args) - len(defaults)
+    for index, arg in enumerate(args):
+        if arg in _HIDDEN_ARGS:
+            continue
+        if index < required:
+            parser.add_argument(arg, type=_value)
+            continue
+        default = defaults[index - required]
+        option = '--' + arg.replace('_', '-')
+        if default is False:
+            parser.add_argument(option, dest=arg, action='store_true')
+        else:
+            parser.add_argument(option, dest=arg,
+                                type=_type(arg, default), default=default,
+                                help='default: %r' % (default,))
+    return parser
+
+
+def _global_parser(prog):
+    parser = argparse.ArgumentParser(
+        prog=prog, add_help=False,
+        description='Call the glusterd2 REST API. Run "%s COMMAND --help" '
+                    'for the arguments of a command.' % prog)
+    parser.add_argument('-h', '--help', action='store_true',
+                        help='show this help message and the commands')
+    parser.add_argument('--endpoint',
+                        default=os.environ.get('GLUSTERAPI_ENDPOINT',
+                                               DEFAULT_ENDPOINT),
+                        help='glusterd2 url, or comma separated urls '
+                             '(env GLUSTERAPI_ENDPOINT)')
+    parser.add_argument('--user', default=os.environ.get('GLUSTERAPI_USER'),
+                        help='REST user (env GLUSTERAPI_USER)')
+    parser.add_argument('--secret',
+                        default=os.environ.get('GLUSTERAPI_SECRET'),
+                        help='REST secret (env GLUSTERAPI_SECRET)')
+    parser.add_argument('--verify', action='store_true',
+                        help='verify the TLS certificate of glusterd2')
+    parser.add_argument('--transport',
+                        default=os.environ.get('GLUSTERAPI_TRANSPORT'),
+                        help='http1 (default), http2 or h2c '
+                             '(env GLUSTERAPI_TRANSPORT)')
+    parser.add_argument('--timeout', type=float,
+                        help='seconds to wait for a response')
+    parser.add_argument('--indent', type=int,
+                        help='indent the JSON output')
+    parser.add_argument('command', nargs='?')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    return parser
+
+
+def _encode(obj):
+    """JSON fallback for the objects some methods return."""
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if hasattr(obj, 'create_args'):
+        return obj.create_args()
+    if isinstance(obj, Exception):
+        return {'error': str(obj)}
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return repr(obj)
+
+
+def _body(result):
+    """Strip the status code off the (status, body) method results."""
+    if isinstance(result, tuple) and len(result) == 2 and \
+            isinstance(result[0], int):
+        return result[1]
+    if isinstance(result, dict):
+        return dict((key, _body(value)) for key, value in result.items())
+    return result
+
+
+def _print(obj, out, indent):
+    out.write(json.dumps(obj, default=_encode, indent=indent,
+                         sort_keys=True))
+    out.write('\n')
+
+
+def _usage(parser, prog, out):
+    parser.print_help(out)
+    out.write('\ncommands:\n')
+    for name, func in sorted(commands().items()):
+        out.write('  %-28s %s\n' % (name, _summary(func)))
+
+
+def main(argv=None, out=None, err=None):
+    """
+    Run the command line.
+
+    :param argv: (list) arguments, sys.argv[1:] by default
+    :param out: file the results are written to, sys.stdout by default
+    :param err: file the errors are written to, sys.stderr by default
+    :return: (int) exit status
+    """
+    out = sys.stdout if out is None else out
+    err = sys.stderr if err is None else err
+    argv = sys.argv[1:] if argv is None else argv
+    prog = 'glusterapi'
+    parser = _global_parser(prog)
+    opts = parser.parse_args(argv)
+    if opts.command is None:
+        _usage(parser, prog, out if opts.help else err)
+        return 0 if opts.help else 2
+
+    client_class = _client_class()
+    func = commands(client_class).get(opts.command)
+    if func is None:
+        err.write('%s: unknown command %s, run "%s --help" for the list\n' %
+                  (prog, opts.command, prog))
+        return 2
+    args = opts.args + (['--help'] if opts.help else [])
+    kwargs = vars(_command_parser(prog, opts.command, func).parse_args(args))
+
+    endpoint = opts.endpoint.split(',')
+    try:
+        client = client_class(endpoint if len(endpoint) > 1 else endpoint[0],
+                              user=opts.user, secret=opts.secret,
+                              verify=opts.verify,
+                              connect_timeout=opts.timeout,
+                              read_timeout=opts.timeout,
+                              transport=opts.transport)
+    except GlusterApiInvalidInputs as error:
+        err.write('%s: %s\n' % (prog, error))
+        return 2
+    with client:
+        try:
+            result = getattr(client, func.__name__)(**kwargs)
+            if isinstance(result, types.GeneratorType) or \
+                    func.__name__.startswith('iter_'):
+                for item in result:
+                    _print(item, out, None)
+            else:
+                _print(_body(result), out, opts.indent)
+        except GlusterApiInvalidInputs as error:
+            err.write('%s: %s\n' % (prog, error))
+            return 2
+        except GlusterApiError as error:
+            message = str(error) or 'request failed'
+            if error.status_code is not None:
+                message = '%s (status %s)' % (message, error.status_code)
+            err.write('%s: %s\n' % (prog, message))
+            if error.body:
+                _print(error.body, err, None)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+This module contains the indexed in-memory model of a cluster.
+
+ClusterState joins the peers, devices, volumes and bricks of a cluster
+once, so that questions like "which volumes have a brick on this peer" or
+"which device backs this brick" are dict lookups instead of calls and
+hand-made joins::
+
+    state = ClusterState(client)
+    state.refresh()
+    state.volumes_on_peer(peer_id)
+    state.device_of_brick(peer_id, '/bricks/b1')
+
+refresh() lists the peers, devices and volumes concurrently, then fetches
+volume_status and the brick status of the new volumes and of those whose
+version, state or metadata changed since the previous refresh only.
+"""
+import threading
+
+from glusterapi.concurrency import fan_out
+from glusterapi.exceptions import GlusterApiError
+
+# Calls made by every refresh
+_LISTS = ('peers', 'devices', 'volumes')
+
+
+def _volume_key(volume):
+    """What makes the status of a volume worth fetching again."""
+    return (volume.get('version'), volume.get('state'),
+            volume.get('metadata') or {})
+
+
+def _brick(status):
+    """Merge the brick info of a brick status with its status fields."""
+    brick = dict(status.get('info') or {})
+    brick.update((k, v) for k, v in status.items() if k != 'info')
+    return brick
+
+
+class ClusterState(object):
+    """
+    Peers, devices, volumes and bricks of a cluster, indexed.
+
+    The lookups take constant time and return None, or an empty list,
+    for unknown names. They are safe to call while another thread
+    refreshes the state. Bricks are dicts of the brick info of the
+    volume with the fields of its brick status, e.g. online, port and
+    device, and are keyed by (peer id, brick path).
+
+    :param client: glusterapi.Client
+    :param max_workers: (int) max number of requests in flight
+    """
+
+    def __init__(self, client, max_workers=None):
+        self.client = client
+        self.max_workers = max_workers
+        # Volumes whose last fetch failed, name -> exception
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._peers = {}
+        self._devices = {}
+        self._devices_by_peer = {}
+        self._volumes = {}
+        self._volume_keys = {}
+        self._status = {}
+        self._bricks = {}
+        self._bricks_by_volume = {}
+        self._bricks_by_peer = {}
+        self._bricks_by_device = {}
+
+    def refresh(self, full=False):
+        """
+        Fetch what changed since the previous refresh.
+
+        Brick processes going down or coming back do not change the
+        version of their volume, use ``full`` to fetch the status of
+        every volume again.
+
+        :param full: (bool) fetch the status of every volume
+        :return: (dict) 'added', 'changed', 'removed' and 'failed' lists
+                 of volume names. The failed ones keep their previous
+                 status, if any, and are fetched again on next refresh.
+        :raises: GlusterApiError if the peers, devices or volumes cannot
+                 be listed
+        """
+        max_workers = self.max_workers or self.client.max_workers
+        results = fan_out(self._fetch, [(kind, None) for kind in _LISTS],
+                          max_workers)
+        for kind in _LISTS:
+            if isinstance(results[(kind, None)], Exception):
+                raise results[(kind, None)]
+        peers = results[('peers', None)][1] or []
+        devices = results[('devices', None)][1] or []
+        volumes = dict((vol['name'], vol)
+                       for vol in results[('volumes', None)][1] or [])
+
+        with self._lock:
+            known = dict(self._volume_keys)
+        stale = [name for name, vol in volumes.items()
+                 if full or known.get(name) != _volume_key(vol)]
+        details = fan_out(self._fetch, [(kind, name) for name in stale
+                                        for kind in ('status', 'bricks')],
+                          max_workers)
+
+        changes = {'added': [], 'changed': [], 'removed': [], 'failed': []}
+        with self._lock:
+            self._index_peers(peers, devices)
+            for name in list(self._volumes):
+                if name not in volumes:
+                    self._drop_volume(name)
+                    changes['removed'].append(name)
+            for name in list(self.errors):
+                if name not in volumes:
+                    del self.errors[name]
+            for name in stale:
+                status = details[('status', name)]
+                bricks = details[('bricks', name)]
+                error = next((r for r in (status, bricks)
+                              if isinstance(r, Exception)), None)
+                if isinstance(error, GlusterApiError) and \
+                        error.status_code == 404:
+                    # Deleted since it was listed
+                    self._drop_volume(name)
+                    if name in known:
+                        changes['removed'].append(name)
+                    continue
+                if error is not None:
+                    self.errors[name] = error
+                    self._volume_keys.pop(name, None)
+                    changes['failed'].append(name)
+                    continue
+                self.errors.pop(name, None)
+                changes['changed' if name in self._volumes
+                        else 'added'].append(name)
+                self._drop_volume(name)
+                self._add_volume(volumes[name], status[1], bricks[1] or [])
+            # Not fetched again, the list still has the latest info
+            for name, volume in volumes.items():
+                if name in self._volumes:
+                    self._volumes[name] = volume
+        return changes
+
+    def _fetch(self, item):
+        kind, name = item
+        if kind == 'peers':
+            return self.client.peer_status()
+        if kind == 'devices':
+            return self.client.devices()
+        if kind == 'volumes':
+            return self.client.volume_list()
+        if kind == 'status':
+            return self.client.volume_status(name)
+        return self.client.volume_info(name)
+
+    def _index_peers(self, peers, devices):
+        self._peers = dict((peer['id'], peer) for peer in peers)
+        self._devices = {}
+        self._devices_by_peer = {}
+        for device in devices:
+            key = (device.get('peer-id'), device.get('device'))
+            self._devices[key] = device
+            self._devices_by_peer.setdefault(key[0], []).append(device)
+
+    def _add_volume(self, volume, status, bricks):
+        name = volume['name']
+        self._volumes[name] = volume
+        self._volume_keys[name] = _volume_key(volume)
+        self._status[name] = status
+        keys = []
+        for brick in (_brick(status) for status in bricks):
+            key = (brick.get('peer-id'), brick.get('path'))
+            keys.append(key)
+            self._bricks[key] = brick
+            self._bricks_by_peer.setdefault(key[0], {})[key] = brick
+            device = (key[0], brick.get('device'))
+            self._bricks_by_device.setdefault(device, {})[key] = brick
+        self._bricks_by_volume[name] = keys
+
+    def _drop_volume(self, name):
+        self._volumes.pop(name, None)
+        self._volume_keys.pop(name, None)
+        self._status.pop(name, None)
+        for key in self._bricks_by_volume.pop(name, ()):
+            brick = self._bricks.pop(key, None)
+            if brick is None:
+                continue
+            _discard(self._bricks_by_peer, key[0], key)
+            _discard(self._bricks_by_device, (key[0], brick.get('device')),
+                     key)
+
+    def peer(self, peer_id):
+        """Return the peer dict of a peer id."""
+        return self._peers.get(peer_id)
+
+    def peers(self):
+        """Return the peer dicts."""
+        with self._lock:
+            return list(self._peers.values())
+
+    def volume(self, name):
+        """Return the volume dict of volume_list for a volume name."""
+        return self._volumes.get(name)
+
+    def volumes(self):
+        """Return the volume dicts."""
+        with self._lock:
+            return list(self._volumes.values())
+
+    def volume_status(self, name):
+        """Return the volume_status body of a volume."""
+        return self._status.get(name)
+
+    def brick(self, peer_id, path):
+        """Return the brick at path on a peer."""
+        return self._bricks.get((peer_id, path))
+
+    def bricks_of_volume(self, name):
+        """Return the bricks of a volume, in volume order."""
+        with self._lock:
+            return [self._bricks[key]
+                    for key in self._bricks_by_volume.get(name, ())]
+
+    def bricks_on_peer(self, peer_id):
+        """Return the bricks hosted by a peer."""
+        with self._lock:
+            return list(self._bricks_by_peer.get(peer_id, {}).values())
+
+    def volumes_on_peer(self, peer_id):
+        """Return the names of the volumes with a brick on a peer."""
+        with self._lock:
+            bricks = self._bricks_by_peer.get(peer_id, {}).values()
+            return sorted(set(brick.get('volume-name') for brick in bricks))
+
+    def devices_of_peer(self, peer_id):
+        """Return the device dicts of a peer."""
+        with self._lock:
+            return list(self._devices_by_peer.get(peer_id, ()))
+
+    def device(self, peer_id, device):
+        """Return the device dict of a device name on a peer."""
+        return self._devices.get((peer_id, device))
+
+    def device_of_brick(self, peer_id, path):
+        """
+        Return the device dict backing a brick.
+
+        :return: the device dict, None if the brick or its device are
+                 unknown
+        """
+        brick = self._bricks.get((peer_id, path))
+        if brick is None:
+            return None
+        return self._devices.get((peer_id, brick.get('device')))
+
+    def bricks_on_device(self, peer_id, device):
+        """Return the bricks backed by a device of a peer."""
+        with self._lock:
+            return list(self._bricks_by_device.get((peer_id, device),
+                                                   {}).values())
+
+
+def _discard(index, group, key):
+    """Remove key from a group of an index, and the group once empty."""
+    members = index.get(group)
+    if members is None:
+        return
+    members.pop(key, None)
+    if not members:
+        del index[group]
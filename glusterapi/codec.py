@@ -0,0 +1,117 @@
+"""
+This module contains the JSON codecs used for request and response bodies.
+
+The fastest installed library is used by default: orjson, then ujson,
+then the standard library. Every codec encodes to and decodes from bytes,
+so response bodies are parsed as received, without a text copy.
+"""
+import json
+import sys
+
+from glusterapi.compat import string_types
+from glusterapi.exceptions import GlusterApiInvalidInputs
+
+# json.loads accepts bytes on Python 2 (str) and since Python 3.6
+_STDLIB_LOADS_BYTES = sys.version_info < (3,) or sys.version_info >= (3, 6)
+
+
+class JsonCodec(object):
+    """Standard library JSON codec, base class of the other codecs."""
+
+    name = 'json'
+
+    @staticmethod
+    def dumps(obj):
+        """
+        Encode a request body.
+
+        :param obj: JSON serializable object
+        :return: (bytes) UTF-8 encoded JSON
+        """
+        data = json.dumps(obj, separators=(',', ':'))
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return data
+
+    @staticmethod
+    def loads(data):
+        """
+        Decode a response body.
+
+        :param data: (bytes) UTF-8 encoded JSON
+        :raises: ValueError on invalid JSON
+        """
+        if not _STDLIB_LOADS_BYTES and isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def __repr__(self):
+        return '<%s codec>' % self.name
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+        self.loads = ujson.loads
+
+    def dumps(self, obj):
+        data = self._ujson.dumps(obj)
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return data
+
+
+CODECS = (OrjsonCodec, UjsonCodec, JsonCodec)
+
+_default = None
+
+
+def available_codecs():
+    """Return the codecs whose library is installed, fastest first."""
+    codecs = []
+    for cls in CODECS:
+        try:
+            codecs.append(cls())
+        except ImportError:
+            pass
+    return codecs
+
+
+def get_codec(codec=None):
+    """
+    Resolve a codec.
+
+    :param codec: None for the fastest installed codec, a codec name
+                  ('orjson', 'ujson' or 'json') or a codec object
+    :return: codec object with dumps and loads
+    :raises: GlusterApiInvalidInputs if the codec is unknown or its
+             library is not installed
+    """
+    global _default
+    if codec is None:
+        if _default is None:
+            _default = available_codecs()[0]
+        return _default
+    if not isinstance(codec, string_types):
+        return codec
+    for cls in CODECS:
+        if cls.name == codec:
+            try:
+                return cls()
+            except ImportError:
+                raise GlusterApiInvalidInputs("JSON codec %s is not "
+                                              "installed" % codec)
+    raise GlusterApiInvalidInputs("Unknown JSON codec %s, use one of %s" %
+                                  (codec, ', '.join(c.name for c in CODECS)))
@@ -1,13 +1,19 @@
-
-import datetime
-import hashlib
+import time
+import timeit
 from uuid import UUID
 
-import jwt
-import requests
-
+from glusterapi import models, routes
+from glusterapi.auth import TokenCache
+from glusterapi.codec import JsonCodec, get_codec
+from glusterapi.compat import httplib
+from glusterapi.concurrency import fan_out
+from glusterapi.endpoints import EndpointPool
+from glusterapi.exceptions import GlusterApiCircuitOpen
 from glusterapi.exceptions import GlusterApiError
 from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.retry import IDEMPOTENT_METHODS
+from glusterapi.session import SessionManager, get_transport
+from glusterapi.streaming import CHUNK_SIZE, iter_json_array
 
 
 def validate_uuid(brick_id, version=4):
@@ -29,13 +35,102 @@ def validate_volume_name(vol_name):
         raise GlusterApiInvalidInputs("Volume name cannot be empty")
 
 
+def response_error(status_code, content, attempts=1):
+    """
+    Build the GlusterApiError of an unexpected glusterd2 response.
+
+    :param status_code: (int) HTTP status of the response
+    :param content: (bytes) response body
+    :param attempts: (int) number of attempts made
+    :return: GlusterApiError
+    """
+    try:
+        body = JsonCodec.loads(content)
+    except ValueError:
+        body = content.decode('utf-8', 'replace')
+
+    messages = []
+    if isinstance(body, dict):
+        messages = [err.get('message') for err in body.get('errors') or []
+                    if isinstance(err, dict) and err.get('message')]
+    if not messages:
+        messages = [httplib.responses.get(status_code, 'Unknown error')]
+    message = 'glusterd2 returned %d: %s' % (status_code, '; '.join(messages))
+    return GlusterApiError(message, status_code=status_code, body=body,
+                           attempts=attempts)
+
+
 class BaseAPI(object):
+    _session_class = SessionManager
+    _HTTP_METHODS = {
+        '_get': 'GET',
+        '_post': 'POST',
+        '_put': 'PUT',
+        '_delete': 'DELETE',
+    }
+
     def __init__(self, endpoint='http://127.0.0.1:24007', user=None,
-                 secret=None, verify=False):
-        self.base_url = endpoint
+                 secret=None, verify=False, pool_connections=10,
+                 pool_maxsize=10, pool_block=False, keep_alive=True,
+                 connect_timeout=None, read_timeout=None,
+                 token_lifetime=30, token_refresh_margin=5,
+                 token_cache_size=256, max_workers=8, cache=None,
+                 metrics=None, retry=None, circuit_breaker=None,
+                 codec=None, transport=None, admission=None):
+        # A url, a list of urls of the same cluster, or an EndpointPool
+        if not isinstance(endpoint, EndpointPool):
+            endpoint = EndpointPool(endpoint)
+        self.endpoints = endpoint
         self.user = user
         self.secret = secret
         self.verify = verify
+        # 'http1', 'http2', 'h2c' or a session manager class
+        self._session = get_transport(transport, self._session_class)(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout)
+        self.token_cache = TokenCache(maxsize=token_cache_size,
+                                      lifetime=token_lifetime,
+                                      refresh_margin=token_refresh_margin)
+        self.max_workers = max_workers
+        # Optional glusterapi.cache.ResponseCache for GET responses
+        self.cache = cache
+        # Optional glusterapi.metrics.Metrics recording every request
+        self.metrics = metrics
+        # Optional glusterapi.retry.RetryPolicy applied to every request
+        self.retry = retry
+        # Optional glusterapi.retry.CircuitBreaker keyed by endpoint
+        self.circuit_breaker = circuit_breaker
+        # Optional glusterapi.admission.AdmissionController rate limiting
+        # every attempt
+        self.admission = admission
+        # JSON codec or codec name, the fastest installed one by default
+        self.codec = get_codec(codec)
+        # glusterapi.wait.Poller shared by wait_for, closed with the client
+        self._poller = None
+        self.endpoints.start(self._set_token_in_header, verify)
+
+    @property
+    def base_url(self):
+        """The endpoint url mutations are sent to."""
+        return self.endpoints.primary()
+
+    def close(self):
+        """Release the pooled connections held by this client."""
+        poller, self._poller = self._poller, None
+        if poller is not None:
+            poller.close()
+        self.endpoints.close()
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _set_token_in_header(self, method, uri, headers=None):
 
@@ -43,53 +138,319 @@ class BaseAPI(object):
             return None
         if headers is None:
             headers = dict()
-        claims = dict()
-        claims['iss'] = self.user
 
-        # Issued at time
-        claims['iat'] = datetime.datetime.utcnow()
-
-        # Expiration time
-        claims['exp'] = datetime.datetime.utcnow() + datetime.timedelta(
-            seconds=1)
-
-        # URI tampering protection
-        val = b'%s&%s' % (method.encode('utf8'), uri.encode('utf8'))
-        claims['qsh'] = hashlib.sha256(val).hexdigest()
-
-        token = jwt.encode(claims, self.secret, algorithm='HS256')
+        token = self.token_cache.get(self.user, self.secret, method, uri)
         headers['Authorization'] = b'bearer ' + token
 
         return headers
 
-    def _get(self, url, param=None):
-        headers = self._set_token_in_header('GET', url)
-        return requests.get(self.base_url + url, headers=headers,
-                            verify=self.verify, params=param)
+    def _get(self, url, param=None, stream=False, base_url=None,
+             headers=None):
+        if headers is None:
+            headers = self._set_token_in_header('GET', url)
+        return self._session.request('GET', (base_url or self.base_url) + url,
+                                     headers=headers, verify=self.verify,
+                                     params=param, stream=stream)
 
-    def _post(self, url, data):
+    def _post(self, url, data, base_url=None):
         headers = self._set_token_in_header('POST', url)
-        return requests.post(self.base_url + url, data=data, headers=headers,
-                             verify=self.verify)
+        return self._session.request('POST',
+                                     (base_url or self.base_url) + url,
+                                     data=data, headers=headers,
+                                     verify=self.verify)
 
-    def _delete(self, url, data):
+    def _delete(self, url, data, base_url=None):
         headers = self._set_token_in_header('DELETE', url)
-        return requests.delete(self.base_url + url, data=data, headers=headers,
-                               verify=self.verify)
+        return self._session.request('DELETE',
+                                     (base_url or self.base_url) + url,
+                                     data=data, headers=headers,
+                                     verify=self.verify)
 
-    def _put(self, url, data):
+    def _put(self, url, data, base_url=None):
         headers = self._set_token_in_header('PUT', url)
-        return requests.put(self.base_url + url, data=data, headers=headers,
-                            verify=self.verify)
+        return self._session.request('PUT',
+                                     (base_url or self.base_url) + url,
+                                     data=data, headers=headers,
+                                     verify=self.verify)
+
+    def _iter_request(self, url, param=None, chunk_size=CHUNK_SIZE,
+                      model=None):
+        """
+        Send a GET and yield the elements of its JSON list response.
+
+        The body is streamed and decoded one element at a time instead of
+        being read into memory as a whole. Elements are converted to model
+        objects when a glusterapi.models class is given.
+        """
+        tracker = None
+        if self.metrics is not None:
+            tracker = self.metrics.track('GET', url)
+        received = [0]
+
+        def chunks():
+            for chunk in resp.iter_content(chunk_size):
+                received[0] += len(chunk)
+                yield chunk
+
+        def send(base_url):
+            return self._get(url, param=param, stream=True,
+                             base_url=base_url)
+
+        try:
+            resp, attempts = self._attempts(self._endpoint(self._get, url),
+                                            send)
+        except Exception as err:
+            if tracker is not None:
+                tracker.failed(err)
+            raise
+        try:
+            if resp.status_code != 200:
+                raise response_error(resp.status_code, resp.content,
+                                     attempts)
+            for item in iter_json_array(chunks(), loads=self.codec.loads):
+                yield item if model is None else model.from_dict(item)
+        finally:
+            resp.close()
+            if tracker is not None:
+                tracker.done(resp.status_code, received[0])
+
+    def _fan_out(self, func, items, max_workers=None):
+        if max_workers is None:
+            max_workers = self.max_workers
+        return fan_out(func, items, max_workers)
+
+    def _cache_lookup(self, func, args, kwargs, model=None):
+        """
+        Look up a GET request in the response cache.
+
+        :return: (tuple) cache key, cache generation and cached result,
+                 all None when the request is not cacheable
+        """
+        if self._HTTP_METHODS.get(func.__name__) != 'GET':
+            return None, None, None
+        param = args[1] if len(args) > 1 else kwargs.get('param')
+        key = self.cache.key(args[0], param)
+        generation = self.cache.generation
+        cached = self.cache.get(key)
+        if cached is not None:
+            status_code, content = cached
+            cached = status_code, self._decode(content, model)
+        return key, generation, cached
+
+    def _cache_update(self, func, url, key, generation, resp,
+                      expected_status_code):
+        if key is None:
+            # Mutating call, whatever its outcome
+            self.cache.invalidate(url)
+        elif resp.status_code == expected_status_code == 200:
+            self.cache.set(key, resp.status_code, resp.content, generation)
+
+    def _track(self, func, args, kwargs):
+        """Start measuring a request with the metrics of the client."""
+        method = self._HTTP_METHODS.get(func.__name__, func.__name__)
+        data = None
+        if method != 'GET':
+            data = args[1] if len(args) > 1 else kwargs.get('data')
+        return self.metrics.track(method, args[0], len(data) if data else 0)
+
+    def _endpoint(self, func, url):
+        """Return the (method, template) a request is accounted under."""
+        method = self._HTTP_METHODS.get(func.__name__, func.__name__)
+        return method, routes.template(url)
+
+    def _choose_endpoint(self, endpoint):
+        """Pick the glusterd2 url of an attempt, mutations use the primary."""
+        return self.endpoints.choose(endpoint[0] in IDEMPOTENT_METHODS)
+
+    def _before_attempt(self, endpoint, attempt, base_url):
+        """Fail fast when the circuit of the endpoint is open."""
+        if self.circuit_breaker is None:
+            return
+        if not self.circuit_breaker.allow((base_url,) + endpoint):
+            raise GlusterApiCircuitOpen(
+                '%s %s: circuit open, glusterd2 at %s is failing' %
+                (endpoint + (base_url,)), attempts=attempt - 1)
+
+    def _abort_attempt(self, endpoint, base_url):
+        """Release the circuit of an attempt that got no outcome."""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.release((base_url,) + endpoint)
+
+    def _after_attempt(self, endpoint, attempt, base_url, resp=None,
+                       err=None, elapsed=0):
+        """
+        Record the outcome of an attempt and decide on a retry.
+
+        A request that got no response fails over to another glusterd2
+        endpoint at once when it is read-only or was never sent. Failing
+        over does not use up the attempts of the retry policy.
+
+        :param endpoint: (tuple) method and template of the request
+        :param attempt: (int) number of the attempt that just finished
+        :param base_url: (string) glusterd2 url the attempt was sent to
+        :param resp: response of the attempt, if any
+        :param err: transport exception of the attempt, if any
+        :param elapsed: (float) seconds the attempt took
+        :return: (float) seconds to wait before retrying, None to stop
+        """
+        if self.circuit_breaker is not None:
+            circuit = (base_url,) + endpoint
+            if err is not None or resp.status_code >= 500:
+                self.circuit_breaker.record_failure(circuit)
+            else:
+                self.circuit_breaker.record_success(circuit)
+
+        policy = self.retry
+        max_attempts = len(self.endpoints) - 1
+        max_attempts += 1 if policy is None else policy.max_attempts
+        if err is None:
+            self.endpoints.record_success(base_url, elapsed)
+        elif len(self.endpoints) > 1:
+            self.endpoints.mark_down(base_url)
+
+        if attempt >= max_attempts:
+            return None
+        if err is not None:
+            connect_error = self._session.is_connect_error(err)
+            read_only = endpoint[0] in IDEMPOTENT_METHODS
+            if read_only or connect_error:
+                if self.endpoints.has_alternative(base_url):
+                    return 0
+            if policy is None:
+                return None
+            if not policy.is_retryable(endpoint[0],
+                                       connect_error=connect_error):
+                return None
+            return policy.delay(attempt)
+        if policy is None:
+            return None
+        if not policy.is_retryable(endpoint[0], resp.status_code):
+            return None
+        return policy.delay(attempt, resp.headers.get('Retry-After'))
+
+    def _transport_error(self, endpoint, attempt, err):
+        """Wrap the exception of an attempt that got no response."""
+        error = GlusterApiError('%s %s failed after %d attempt%s: %s' %
+                                (endpoint + (attempt,
+                                             's' if attempt > 1 else '',
+                                             err)),
+                                attempts=attempt, error=err)
+        error.__cause__ = err
+        return error
+
+    def _send(self, func, args, kwargs):
+        tracker = None
+        if self.metrics is not None:
+            tracker = self._track(func, args, kwargs)
+        try:
+            resp = func(*args, **kwargs)
+        except Exception as err:
+            if tracker is not None:
+                tracker.failed(err)
+            raise
+        if tracker is not None:
+            tracker.done(resp.status_code, len(resp.content))
+        return resp
+
+    def _decode(self, content, model=None):
+        """Decode a response body, to models if a model class is given."""
+        data = self.codec.loads(content)
+        if model is not None:
+            data = models.decode(model, data)
+        return data
+
+    def _attempts(self, endpoint, send, invalidate=None, pinned=None):
+        """
+        Send a request through admission, the circuit breaker and retries.
+
+        :param endpoint: (tuple) method and template of the request
+        :param send: callable(base_url) sending one attempt
+        :param invalidate: (string) url whose cached responses are dropped
+                           when an attempt gets no response
+        :param pinned: (string) glusterd2 url to send every attempt to,
+                       instead of the endpoints of the client
+        :return: (tuple) response of the last attempt and attempts made
+        :raises: GlusterApiError when the last attempt got no response
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.admission is not None:
+                # Before the circuit, a throttled call must not hold its
+                # half-open trial
+                self.admission.acquire(endpoint)
+            base_url = pinned or self._choose_endpoint(endpoint)
+            self._before_attempt(endpoint, attempt, base_url)
+            start = timeit.default_timer()
+            try:
+                resp = send(base_url)
+            except self._session.errors as err:
+                if invalidate is not None:
+                    self.cache.invalidate(invalidate)
+                delay = self._after_attempt(endpoint, attempt, base_url,
+                                            err=err)
+                if delay is None:
+                    raise self._transport_error(endpoint, attempt, err)
+            except BaseException:
+                # Cancelled, or failed without an outcome for the circuit
+                self._abort_attempt(endpoint, base_url)
+                raise
+            else:
+                delay = self._after_attempt(
+                    endpoint, attempt, base_url, resp=resp,
+                    elapsed=timeit.default_timer() - start)
+                if delay is None:
+                    return resp, attempt
+                resp.close()
+            if delay:
+                time.sleep(delay)
+
+    def _handle_request(self, func, expected_status_code, *args, **kwargs):
+        """
+        Send a request and check its response status.
+
+        :param func: request helper, e.g. self._get
+        :param expected_status_code: (int) status of a successful call
+        :param model: glusterapi.models class to decode the response to,
+                      passed as keyword
+        :param base_url: (string) glusterd2 url to send the request to,
+                         e.g. of a remote cluster, passed as keyword. The
+                         response cache is not used then.
+        :return: (tuple) status code and decoded response
+        """
+        model = kwargs.pop('model', None)
+        pinned = kwargs.pop('base_url', None)
+        cache = self.cache if pinned is None else None
+        key = generation = None
+        if cache is not None:
+            key, generation, cached = self._cache_lookup(func, args, kwargs,
+                                                         model)
+            if cached is not None:
+                return cached
+
+        def send(base_url):
+            kwargs['base_url'] = base_url
+            return self._send(func, args, kwargs)
+
+        # A mutation may be applied all the same when its response is lost
+        invalidate = None
+        if cache is not None and key is None:
+            invalidate = args[0]
+        resp, attempt = self._attempts(self._endpoint(func, args[0]), send,
+                                       invalidate, pinned)
+
+        if cache is not None:
+            self._cache_update(func, args[0], key, generation, resp,
+                               expected_status_code)
+        return self._handle_response(resp, expected_status_code, attempt,
+                                     model)
 
-    @staticmethod
-    def _handle_request(func, expected_status_code, *args, **kwargs):
-        resp = func(*args, **kwargs)
+    def _handle_response(self, resp, expected_status_code, attempts=1,
+                         model=None):
         if resp.status_code != expected_status_code:
-            # TODO: Add additional error details
-            raise GlusterApiError()
+            raise response_error(resp.status_code, resp.content, attempts)
 
         if resp.status_code == 204:
             return resp.status_code, {}
 
-        return resp.status_code, resp.json()
+        return resp.status_code, self._decode(resp.content, model)
@@ -0,0 +1,47 @@
+"""Python 2 and 3 compatibility helpers."""
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+try:
+    from urlparse import parse_qs, urlparse
+    from urllib import quote, unquote
+except ImportError:
+    from urllib.parse import parse_qs, quote, unquote, urlparse
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+try:
+    from SocketServer import UnixStreamServer
+except ImportError:
+    try:
+        from socketserver import UnixStreamServer
+    except ImportError:
+        # No AF_UNIX sockets on this platform
+        UnixStreamServer = None
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    from sys import intern
+except ImportError:
+    import __builtin__
+    intern = __builtin__.intern
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+__all__ = ['BaseHTTPRequestHandler', 'HTTPServer', 'ThreadingMixIn',
+           'UnixStreamServer', 'httplib', 'intern', 'parse_qs', 'queue',
+           'quote', 'string_types', 'unquote', 'urlparse']
@@ -0,0 +1,44 @@
+"""This module contains helpers to run glusterd2 calls concurrently."""
+
+
+def unique(items):
+    """Return items without duplicates, keeping their order."""
+    seen = set()
+    result = []
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            result.append(item)
+    return result
+
+
+def fan_out(func, items, max_workers):
+    """
+    Call func(item) for every item on a bounded thread pool.
+
+    A failing call does not abort the others, its exception is stored as
+    the result for that item instead.
+
+    :param func: callable taking a single item
+    :param items: (iterable) hashable items
+    :param max_workers: (int) max number of calls in flight
+    :return: (dict) item -> func(item) return value or raised exception
+    """
+    items = unique(items)
+    results = {}
+    if not items:
+        return results
+
+    # Imported here, it is slow to import and most calls do not fan out
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = dict((pool.submit(func, item), item) for item in items)
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results[item] = future.result()
+            except Exception as err:
+                results[item] = err
+    return results
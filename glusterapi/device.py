@@ -1,8 +1,7 @@
-import httplib
-import json
-
 from glusterapi.common import BaseAPI, validate_peer_id
+from glusterapi.compat import httplib
 from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.models import Device
 
 
 class DeviceApis(BaseAPI):
@@ -22,23 +21,43 @@ class DeviceApis(BaseAPI):
             "device": device
         }
         return self._handle_request(self._post, httplib.CREATED,
-                                    "/v1/devices/%s" % peerid, json.dumps(req))
+                                    "/v1/devices/%s" % peerid,
+                                    self.codec.dumps(req))
 
-    def device_status(self, peerid):
+    def device_status(self, peerid, typed=False):
         """
         Gluster get devices in peer.
 
         :param peerid: (string) peerid returned from peer_add
+        :param typed: (bool) return glusterapi.models objects instead of
+                      dicts
         :raises: GlusterApiError or GlusterApiInvalidInputs on failure
         """
         validate_peer_id(peerid)
         url = "/v1/devices/" + peerid
-        return self._handle_request(self._get, httplib.OK, url)
+        return self._handle_request(self._get, httplib.OK, url,
+                                    model=Device if typed else None)
+
+    def device_status_all_peers(self, max_workers=None):
+        """
+        Gluster get devices of every peer concurrently.
+
+        :param max_workers: (int) max number of requests in flight
+        :return: (dict) peer id -> device_status result, or the exception
+                 raised for that peer
+        :raises: GlusterApiError if the peer list cannot be fetched
+        """
+        _, peers = self._handle_request(self._get, httplib.OK, "/v1/peers")
+        return self._fan_out(self.device_status,
+                             [peer['id'] for peer in peers], max_workers)
 
-    def devices(self):
+    def devices(self, typed=False):
         """
         Gluster list all devices.
 
+        :param typed: (bool) return glusterapi.models objects instead of
+                      dicts
         :raises: GlusterApiError on failure
         """
-        return self._handle_request(self._get, httplib.OK, "/devices")
+        return self._handle_request(self._get, httplib.OK, "/devices",
+                                    model=Device if typed else None)
@@ -0,0 +1,258 @@
+"""This module contains the glusterd2 endpoint pool of a client."""
+import itertools
+import threading
+import time
+import timeit
+
+from glusterapi.compat import quote, string_types
+from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.session import SessionManager
+
+ROUND_ROBIN = 'round-robin'
+LEAST_LATENCY = 'least-latency'
+STRATEGIES = (ROUND_ROBIN, LEAST_LATENCY)
+
+# Weight of the newest sample in the latency moving average
+LATENCY_WEIGHT = 0.3
+
+
+def normalize_url(url):
+    """
+    Return the url requests are sent to for an endpoint.
+
+    A ``unix://<socket path>`` endpoint becomes an ``http+unix`` url whose
+    host is the quoted socket path, see glusterapi.unix.
+    """
+    if url.startswith('unix://'):
+        return 'http+unix://' + quote(url[len('unix://'):], safe='')
+    return url.rstrip('/')
+
+
+class _Node(object):
+
+    __slots__ = ('url', 'healthy', 'down_since', 'latency')
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.down_since = 0
+        self.latency = None
+
+
+class EndpointPool(object):
+    """
+    glusterd2 endpoints of one cluster.
+
+    Every peer of a glusterd2 cluster serves the REST API. Read-only
+    requests are spread across the healthy endpoints, round-robin or to
+    the one with the lowest average latency. Mutations are pinned to a
+    primary endpoint, which only changes when it goes down.
+
+    An endpoint is marked down when a request to it fails without a
+    response. It is tried again after ``down_time`` seconds, or as soon as
+    a background health check succeeds when ``health_interval`` is set.
+    """
+
+    def __init__(self, endpoints, strategy=ROUND_ROBIN, down_time=10.0,
+                 health_interval=None, health_path='/version',
+                 health_timeout=2.0):
+        """
+        :param endpoints: (list) glusterd2 urls, e.g. http://node1:24007
+                          or unix:///var/run/glusterd2.sock. The first
+                          one is the initial primary.
+        :param strategy: (string) 'round-robin' or 'least-latency'
+        :param down_time: (float) seconds before a down endpoint is
+                          retried by requests
+        :param health_interval: (float) seconds between health checks,
+                                None disables them
+        :param health_path: (string) path requested by health checks
+        :param health_timeout: (float) health check timeout in seconds
+        :raises: GlusterApiInvalidInputs on invalid inputs
+        """
+        if isinstance(endpoints, string_types):
+            endpoints = [endpoints]
+        urls = []
+        for url in endpoints:
+            url = normalize_url(url)
+            if url not in urls:
+                urls.append(url)
+        if not urls:
+            raise GlusterApiInvalidInputs("No glusterd2 endpoint specified")
+        if strategy not in STRATEGIES:
+            raise GlusterApiInvalidInputs("Invalid strategy %r, use one of "
+                                          "%s" % (strategy,
+                                                  ', '.join(STRATEGIES)))
+        self.strategy = strategy
+        self.down_time = down_time
+        self.health_interval = health_interval
+        self.health_path = health_path
+        self.health_timeout = health_timeout
+        self._nodes = list(map(_Node, urls))
+        self._by_url = dict((node.url, node) for node in self._nodes)
+        self._primary = self._nodes[0]
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def urls(self):
+        return [node.url for node in self._nodes]
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _available(self, node, now):
+        return node.healthy or now - node.down_since >= self.down_time
+
+    def choose(self, read_only=True):
+        """
+        Pick the endpoint of the next request.
+
+        :param read_only: (bool) False pins the request to the primary
+        :return: (string) endpoint url
+        """
+        if len(self._nodes) == 1:
+            return self._nodes[0].url
+
+        now = time.time()
+        with self._lock:
+            if not read_only:
+                return self._choose_primary(now).url
+            nodes = [n for n in self._nodes if self._available(n, now)]
+            if not nodes:
+                # Everything is down, keep trying the primary
+                return self._primary.url
+            if self.strategy == LEAST_LATENCY:
+                # Unmeasured endpoints first, to get a sample of them
+                return min(nodes, key=lambda n: (n.latency is not None,
+                                                 n.latency)).url
+            return nodes[next(self._counter) % len(nodes)].url
+
+    def _choose_primary(self, now):
+        if self._available(self._primary, now):
+            return self._primary
+        start = self._nodes.index(self._primary)
+        for i in range(1, len(self._nodes)):
+            node = self._nodes[(start + i) % len(self._nodes)]
+            if self._available(node, now):
+                self._primary = node
+                break
+        return self._primary
+
+    def primary(self):
+        """Return the url mutations are currently sent to."""
+        with self._lock:
+            return self._choose_primary(time.time()).url
+
+    def has_alternative(self, url):
+        """Check whether another endpoint than url is available."""
+        if url not in self._by_url:
+            # Pinned to a glusterd2 outside the pool, e.g. a remote one
+            return False
+        now = time.time()
+        with self._lock:
+            return any(n.url != url and self._available(n, now)
+                       for n in self._nodes)
+
+    def record_success(self, url, latency):
+        """
+        Mark an endpoint healthy and update its average latency.
+
+        :param url: (string) endpoint url
+        :param latency: (float) seconds the request took
+        """
+        node = self._by_url.get(url)
+        if node is None:
+            return
+        with self._lock:
+            node.healthy = True
+            if node.latency is None:
+                node.latency = latency
+            else:
+                node.latency += LATENCY_WEIGHT * (latency - node.latency)
+
+    def mark_down(self, url):
+        """Stop sending requests to an endpoint for a while."""
+        node = self._by_url.get(url)
+        if node is None:
+            return
+        with self._lock:
+            node.healthy = False
+            node.down_since = time.time()
+
+    def states(self):
+        """
+        Current state of the endpoints.
+
+        :return: (list) dicts with url, healthy, latency and primary
+        """
+        with self._lock:
+            return [{'url': node.url, 'healthy': node.healthy,
+                     'latency': node.latency,
+                     'primary': node is self._primary}
+                    for node in self._nodes]
+
+    def check(self, session, headers=None, verify=False):
+        """
+        Health check every endpoint once.
+
+        :param session: SessionManager used for the checks
+        :param headers: callable(method, path) returning request headers
+        :param verify: (bool) verify TLS certificates
+        """
+        for url in self.urls:
+            hdrs = headers('GET', self.health_path) if headers else None
+            start = timeit.default_timer()
+            try:
+                resp = session.request('GET', url + self.health_path,
+                                       headers=hdrs, verify=verify)
+                resp.close()
+            except session.errors:
+                self.mark_down(url)
+                continue
+            if resp.status_code >= 500:
+                self.mark_down(url)
+            else:
+                self.record_success(url, timeit.default_timer() - start)
+
+    def start(self, headers=None, verify=False):
+        """
+        Start the background health checks, if health_interval is set.
+
+        :param headers: callable(method, path) returning request headers
+        :param verify: (bool) verify TLS certificates
+        """
+        if self.health_interval is None or len(self._nodes) == 1:
+            return
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        session = SessionManager(pool_connections=len(self._nodes),
+                                 pool_maxsize=1,
+                                 connect_timeout=self.health_timeout,
+                                 read_timeout=self.health_timeout)
+
+        def run():
+            try:
+                while not self._stop.wait(self.health_interval):
+                    self.check(session, headers, verify)
+            finally:
+                session.close()
+
+        self._thread = threading.Thread(target=run,
+                                        name='glusterapi-health')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self, wait=True):
+        """
+        Stop the background health checks.
+
+        :param wait: (bool) wait for the running check to finish
+        """
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if wait and thread is not None and \
+                thread is not threading.current_thread():
+            thread.join(self.health_timeout)
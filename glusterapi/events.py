@@ -1,7 +1,19 @@
-import httplib
-import json
+import hmac
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
 
+from glusterapi.codec import get_codec
 from glusterapi.common import BaseAPI
+from glusterapi.compat import (BaseHTTPRequestHandler, HTTPServer,
+                               ThreadingMixIn, httplib, queue)
+from glusterapi.exceptions import GlusterApiInvalidInputs
+
+LOG = logging.getLogger(__name__)
+
+# Handlers registered under this name receive every event
+ALL_EVENTS = '*'
 
 
 class EventsApis(BaseAPI):
@@ -20,7 +32,8 @@ class EventsApis(BaseAPI):
             "secret": secret
         }
         return self._handle_request(self._post, httplib.OK,
-                                    "/v1/events/webhook", json.dumps(req))
+                                    "/v1/events/webhook",
+                                    self.codec.dumps(req))
 
     def webhook_delete(self, url):
         """
@@ -33,7 +46,8 @@ class EventsApis(BaseAPI):
             "url": url,
         }
         return self._handle_request(self._delete, httplib.NO_CONTENT,
-                                    "/v1/events/webhook", json.dumps(req))
+                                    "/v1/events/webhook",
+                                    self.codec.dumps(req))
 
     def webhooks(self):
         """
@@ -43,3 +57,310 @@ class EventsApis(BaseAPI):
         """
         return self._handle_request(self._get, httplib.OK,
                                     "/v1/events/webhook")
+
+
+class Event(object):
+    """glusterd2 event delivered to a webhook."""
+
+    __slots__ = ('event_id', 'name', 'origin', 'data', 'timestamp',
+                 'received')
+
+    def __init__(self, event_id, name, origin=None, data=None,
+                 timestamp=None, received=None):
+        self.event_id = event_id
+        self.name = name
+        self.origin = origin
+        self.data = data or {}
+        self.timestamp = timestamp
+        self.received = time.time() if received is None else received
+
+    @classmethod
+    def from_dict(cls, payload):
+        """
+        Build an event from its decoded webhook payload.
+
+        :param payload: (dict) with id, name, origin, data and timestamp
+        :raises: ValueError if the payload is not an event
+        """
+        if not isinstance(payload, dict) or not payload.get('name'):
+            raise ValueError("event payload without name")
+        data = payload.get('data')
+        if data is not None and not isinstance(data, dict):
+            raise ValueError("event data is not an object")
+        return cls(payload.get('id'), payload['name'],
+                   origin=payload.get('origin'), data=data,
+                   timestamp=payload.get('timestamp'))
+
+    def __repr__(self):
+        return 'Event(%r, %r)' % (self.name, self.data)
+
+
+class EventReceiver(object):
+    """
+    Embeddable HTTP server receiving glusterd2 webhook events.
+
+    Register its url with ``webhook_add`` using the same token and secret.
+    Requests are authenticated, parsed into Event objects and queued;
+    ``workers`` threads take them off the queue and call the handlers
+    registered for the event name, then those registered for ``'*'``.
+
+    The queue is bounded. When it is full a request waits up to
+    ``put_timeout`` seconds for room and is then answered with 503, so a
+    slow handler pushes back on glusterd2 instead of growing memory.
+    Events are dispatched concurrently and may be handled out of order
+    unless ``workers`` is 1.
+
+    It listens on the loopback interface by default. Listening on other
+    interfaces requires a token or a secret.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, token=None, secret=None,
+                 workers=4, queue_size=1024, put_timeout=0,
+                 max_body=1 << 20, codec=None):
+        """
+        :param host: (string) address to listen on, '0.0.0.0' for every
+                     interface
+        :param port: (int) port to listen on, 0 picks a free one
+        :param token: (string) webhook token, sent as bearer token
+        :param secret: (string) webhook secret, the bearer token is then a
+                       JWT signed with it. Without token and secret every
+                       request is accepted.
+        :param workers: (int) number of dispatch threads
+        :param queue_size: (int) max events waiting for a worker
+        :param put_timeout: (float) seconds to wait for room in the queue
+        :param max_body: (int) largest accepted request body in bytes
+        :param codec: JSON codec or codec name, see glusterapi.codec
+        :raises: GlusterApiInvalidInputs when listening on a non loopback
+                 address without token and secret
+        """
+        if token is None and secret is None and not _is_loopback(host):
+            raise GlusterApiInvalidInputs(
+                "A token or a secret is required to listen on %r" % host)
+        self.host = host
+        self.port = port
+        self.token = token
+        self.secret = secret
+        self.workers = workers
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self.max_body = max_body
+        self.codec = get_codec(codec)
+        self._handlers = defaultdict(list)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._server = None
+        self._threads = []
+        self._stats = Counter()
+        self._events = Counter()
+        self._busy = 0
+        self._high_water = 0
+        self._wait = 0.0
+
+    @property
+    def url(self):
+        host = '127.0.0.1' if self.host in ('', '0.0.0.0') else self.host
+        return 'http://%s:%d/' % (host, self.port)
+
+    def on(self, name, handler=None):
+        """
+        Register a handler for an event name, '*' for every event.
+
+        Can be used as a decorator: ``@receiver.on('volume.start')``.
+
+        :param name: (string) event name, e.g. volume.start
+        :param handler: callable taking an Event
+        """
+        if handler is None:
+            def decorator(func):
+                self.on(name, func)
+                return func
+            return decorator
+        with self._lock:
+            self._handlers[name].append(handler)
+        return handler
+
+    def off(self, name, handler):
+        with self._lock:
+            self._handlers[name].remove(handler)
+
+    def _authenticate(self, auth):
+        if self.token is None and self.secret is None:
+            return True
+        if not auth or not auth.lower().startswith('bearer '):
+            return False
+        bearer = auth[7:].strip()
+        if self.secret is not None:
+            import jwt
+            try:
+                jwt.decode(bearer, self.secret, algorithms=['HS256'])
+            except jwt.InvalidTokenError:
+                return False
+            return True
+        return hmac.compare_digest(bearer.encode('utf-8'),
+                                   self.token.encode('utf-8'))
+
+    def receive(self, headers, body):
+        """
+        Authenticate, parse and queue one webhook request.
+
+        :param headers: mapping of request headers
+        :param body: (bytes) request body
+        :return: (int) HTTP status to answer with
+        """
+        with self._lock:
+            self._stats['received'] += 1
+        if not self._authenticate(headers.get('Authorization')):
+            status, counter = httplib.UNAUTHORIZED, 'rejected'
+        else:
+            try:
+                event = Event.from_dict(self.codec.loads(body))
+            except ValueError:
+                status, counter = httplib.BAD_REQUEST, 'invalid'
+            else:
+                status, counter = self._enqueue(event)
+        with self._lock:
+            self._stats[counter] += 1
+        return status
+
+    def _enqueue(self, event):
+        try:
+            if self.put_timeout:
+                self._queue.put(event, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            return httplib.SERVICE_UNAVAILABLE, 'dropped'
+        depth = self._queue.qsize()
+        with self._lock:
+            self._high_water = max(self._high_water, depth)
+        return httplib.OK, 'queued'
+
+    def _work(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                self._queue.task_done()
+                return
+            with self._lock:
+                self._busy += 1
+                self._wait += time.time() - event.received
+                handlers = list(self._handlers.get(event.name, []))
+                handlers.extend(self._handlers.get(ALL_EVENTS, []))
+            try:
+                for handler in handlers:
+                    try:
+                        handler(event)
+                    except Exception:
+                        LOG.exception("glusterapi event handler %r failed "
+                                      "on %r", handler, event)
+                        with self._lock:
+                            self._stats['handler_errors'] += 1
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._stats['processed'] += 1
+                    self._events[event.name] += 1
+                self._queue.task_done()
+
+    def join(self):
+        """Wait until every queued event has been handled."""
+        self._queue.join()
+
+    def stats(self):
+        """
+        Receiver and back-pressure counters.
+
+        :return: (dict) received, queued, processed, rejected (auth),
+                 invalid, dropped (queue full) and handler_errors counts,
+                 queue_depth, queue_high_water, queue_size, busy_workers,
+                 total queue wait in seconds and per-event counts
+        """
+        with self._lock:
+            result = dict((key, self._stats[key]) for key in (
+                'received', 'queued', 'processed', 'rejected', 'invalid',
+                'dropped', 'handler_errors'))
+            result.update({
+                'queue_depth': self._queue.qsize(),
+                'queue_high_water': self._high_water,
+                'queue_size': self.queue_size,
+                'busy_workers': self._busy,
+                'wait_seconds': self._wait,
+                'events': dict(self._events),
+            })
+        return result
+
+    def start(self):
+        self._server = _ReceiverHTTPServer((self.host, self.port),
+                                           _make_handler(self))
+        self.port = self._server.server_address[1]
+        self._threads = [threading.Thread(target=self._work,
+                                          name='glusterapi-events-%d' % i)
+                         for i in range(max(1, self.workers))]
+        server = threading.Thread(target=self._server.serve_forever,
+                                  args=(0.05,), name='glusterapi-events')
+        for thread in self._threads + [server]:
+            thread.daemon = True
+            thread.start()
+        self._threads.append(server)
+        return self
+
+    def stop(self):
+        """Stop accepting events and let the workers drain the queue."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        for _ in range(len(self._threads) - 1):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class _ReceiverHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _make_handler(receiver):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            length = self.headers.get('Content-Length')
+            if length is None:
+                status = httplib.LENGTH_REQUIRED
+            elif not length.strip().isdigit():
+                status = httplib.BAD_REQUEST
+            elif int(length) > receiver.max_body:
+                status = httplib.REQUEST_ENTITY_TOO_LARGE
+            else:
+                length = int(length)
+                body = self.rfile.read(length) if length else b''
+                status = receiver.receive(self.headers, body)
+            if not isinstance(length, int):
+                # The body was not read, the connection cannot be reused
+                self.close_connection = True
+            self.send_response(status)
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def _is_loopback(host):
+    """Check whether an address to listen on is only reachable locally."""
+    return host == 'localhost' or host == '::1' or host.startswith('127.')
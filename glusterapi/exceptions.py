@@ -3,4 +3,37 @@ class GlusterApiInvalidInputs(Exception):
 
 
 class GlusterApiError(Exception):
+    """
+    glusterd2 request failure.
+
+    :ivar status_code: (int) HTTP status, None if no response was received
+    :ivar body: decoded error response body, or its raw text
+    :ivar attempts: (int) number of attempts made
+    :ivar error: underlying transport exception, if any
+    """
+
+    def __init__(self, message=None, status_code=None, body=None,
+                 attempts=None, error=None):
+        if message is None:
+            super(GlusterApiError, self).__init__()
+        else:
+            super(GlusterApiError, self).__init__(message)
+        self.status_code = status_code
+        self.body = body
+        self.attempts = attempts
+        self.error = error
+
+
+class GlusterApiCircuitOpen(GlusterApiError):
+    """The endpoint circuit is open, the request was not sent."""
+    pass
+
+
+class GlusterApiTimeout(GlusterApiError):
+    """The awaited state was not reached before the deadline."""
+    pass
+
+
+class GlusterApiThrottled(GlusterApiError):
+    """The call waited too long for admission, it was not sent."""
     pass
@@ -1,9 +1,128 @@
-from common import BaseAPI
+import calendar
+import logging
+import threading
+import time
+
+from glusterapi.auth import sign_token
+from glusterapi.common import BaseAPI, validate_volume_name
+from glusterapi.compat import httplib, string_types
+from glusterapi.concurrency import fan_out
+from glusterapi.exceptions import GlusterApiError, GlusterApiInvalidInputs
+
+LOG = logging.getLogger(__name__)
+
+# glusterd2 port of a remote host given without one
+GLUSTERD2_PORT = 24007
+
+
+def _session_url(mastervolid, remotevolid):
+    return "/v1/geo-replication/%s/%s" % (mastervolid, remotevolid)
+
+
+def _remote_url(base_url, remotehost):
+    scheme = base_url.split('://', 1)[0]
+    if ':' not in remotehost.rsplit(']', 1)[-1]:
+        remotehost = '%s:%d' % (remotehost, GLUSTERD2_PORT)
+    return '%s://%s' % (scheme, remotehost)
+
+
+def _find_session(sessions, mastervol, remotehost, remotevol, remoteuser):
+    """
+    Return the session of a session list matching the given names.
+
+    The remote host, volume and user left None match any session.
+
+    :raises: GlusterApiError if no session matches,
+             GlusterApiInvalidInputs if several do
+    """
+    found = []
+    for session in sessions or []:
+        if session.get('master-volume') != mastervol:
+            continue
+        if remotevol is not None and \
+                session.get('remote-volume') != remotevol:
+            continue
+        if remotehost is not None and \
+                remotehost not in (session.get('remote-hosts') or []):
+            continue
+        if remoteuser is not None and \
+                session.get('remote-user') != remoteuser:
+            continue
+        found.append(session)
+    description = '%s to %s::%s' % (mastervol, remotehost or '*',
+                                    remotevol or '*')
+    if not found:
+        raise GlusterApiError("No geo-replication session from %s" %
+                              description, status_code=httplib.NOT_FOUND)
+    if len(found) > 1:
+        raise GlusterApiInvalidInputs(
+            "%d geo-replication sessions from %s, give the remote host "
+            "and volume" % (len(found), description))
+    return found[0]
+
+
+def _option(name):
+    """Return a filter keeping the named option of a session config."""
+    def select(result):
+        status, options = result
+        for opt in options:
+            if opt.get('name') == name:
+                return status, opt
+        raise GlusterApiError("Unknown geo-replication option %s" % name,
+                              status_code=httplib.NOT_FOUND)
+    return select
 
 
 class GeorepApis(BaseAPI):
+    def _georep_request(self, session, func, expected_status_code,
+                        suffix='', data=None, transform=None):
+        """
+        Send a request to the url of a geo-replication session.
+
+        glusterd2 addresses a session by the ids of its master and remote
+        volumes, so the session is looked up by name in the session list
+        first.
+
+        :param session: (tuple) mastervol, remotehost, remotevol and
+                        remoteuser of the session
+        :param transform: callable applied to the (status, body) result
+        """
+        _, sessions = self._handle_request(self._get, httplib.OK,
+                                           "/v1/geo-replication")
+        found = _find_session(sessions, *session)
+        url = _session_url(found['master-volid'],
+                           found['remote-volid']) + suffix
+        result = self._handle_request(func, expected_status_code, url, data)
+        return result if transform is None else transform(result)
+
+    def _remote_volume_request(self, remotehost, remotevol, api_user,
+                               api_secret):
+        """
+        Return the glusterd2 url, path and headers fetching a volume from
+        remotehost, signed with its own credentials when given.
+        """
+        url = "/v1/volumes/%s" % remotevol
+        if api_secret is None:
+            headers = self._set_token_in_header('GET', url)
+        else:
+            token = sign_token(api_user or self.user, api_secret, 'GET', url,
+                               self.token_cache.lifetime)
+            headers = {'Authorization': b'bearer ' + token}
+        return _remote_url(self.base_url, remotehost), url, headers
+
+    def _remote_volume_id(self, remotehost, remotevol, api_user=None,
+                          api_secret=None):
+        """Fetch the id of a volume from the glusterd2 of remotehost."""
+        base_url, url, headers = self._remote_volume_request(
+            remotehost, remotevol, api_user, api_secret)
+        _, volume = self._handle_request(self._get, httplib.OK, url,
+                                         base_url=base_url, headers=headers)
+        return volume['id']
+
     def georep_create(self, mastervol, remotehost,
-                      remotevol, remoteuser="root"):
+                      remotevol, remoteuser="root", remotevolid=None,
+                      force=False, remote_api_user=None,
+                      remote_api_secret=None):
         """
         Create Geo-replication Session
 
@@ -11,40 +130,103 @@ class GeorepApis(BaseAPI):
         :param remotehost: (string) Remote Host
         :param remotevol: (string) Remote Volume
         :param remoteuser: (string) Remote User
+        :param remotevolid: (string) Remote Volume ID, fetched from the
+                            glusterd2 of remotehost when None
+        :param force: (bool) force flag to create the session
+        :param remote_api_user: (string) REST API user of the remote
+                                cluster, the user of this client when None
+        :param remote_api_secret: (string) REST API secret of the remote
+                                  cluster, the credentials of this client
+                                  are used when None
         :raises: GlusterAPIError or failure
         """
-        pass
+        validate_volume_name(mastervol)
+        validate_volume_name(remotevol)
+
+        _, volume = self._handle_request(self._get, httplib.OK,
+                                         "/v1/volumes/%s" % mastervol)
+        if remotevolid is None:
+            remotevolid = self._remote_volume_id(
+                remotehost, remotevol, remote_api_user, remote_api_secret)
+        req = {
+            "mastervol": mastervol,
+            "remoteuser": remoteuser,
+            "remotehosts": [remotehost],
+            "remotevol": remotevol,
+            "force": force,
+        }
+        return self._handle_request(self._post, httplib.CREATED,
+                                    _session_url(volume['id'], remotevolid),
+                                    self.codec.dumps(req))
 
     def georep_start(self, mastervol, remotehost, remotevol,
-                     remoteuser="root"):
+                     remoteuser="root", force=False):
         """
-        Create Geo-replication Session
+        Start Geo-replication Session
 
         :param mastervol: (string) Master Volume Name
         :param remotehost: (string) Remote Host
         :param remotevol: (string) Remote Volume
         :param remoteuser: (string) Remote User
+        :param force: (bool) force flag to start the session
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._post,
+            httplib.OK, "/start", self.codec.dumps({"force": force}))
 
     def georep_stop(self, mastervol, remotehost, remotevol,
-                    remoteuser="root"):
+                    remoteuser="root", force=False):
         """
-        Create Geo-replication Session
+        Stop Geo-replication Session
+
+        :param mastervol: (string) Master Volume Name
+        :param remotehost: (string) Remote Host
+        :param remotevol: (string) Remote Volume
+        :param remoteuser: (string) Remote User
+        :param force: (bool) force flag to stop the session
+        :raises: GlusterAPIError or failure
+        """
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._post,
+            httplib.OK, "/stop", self.codec.dumps({"force": force}))
+
+    def georep_pause(self, mastervol, remotehost, remotevol,
+                     remoteuser="root", force=False):
+        """
+        Pause Geo-replication Session
+
+        :param mastervol: (string) Master Volume Name
+        :param remotehost: (string) Remote Host
+        :param remotevol: (string) Remote Volume
+        :param remoteuser: (string) Remote User
+        :param force: (bool) force flag to pause the session
+        :raises: GlusterAPIError or failure
+        """
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._post,
+            httplib.OK, "/pause", self.codec.dumps({"force": force}))
+
+    def georep_resume(self, mastervol, remotehost, remotevol,
+                      remoteuser="root", force=False):
+        """
+        Resume Geo-replication Session
 
         :param mastervol: (string) Master Volume Name
         :param remotehost: (string) Remote Host
         :param remotevol: (string) Remote Volume
         :param remoteuser: (string) Remote User
+        :param force: (bool) force flag to resume the session
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._post,
+            httplib.OK, "/resume", self.codec.dumps({"force": force}))
 
     def georep_delete(self, mastervol, remotehost,
                       remotevol, remoteuser="root"):
         """
-        Create Geo-replication Session
+        Delete Geo-replication Session
 
         :param mastervol: (string) Master Volume Name
         :param remotehost: (string) Remote Host
@@ -52,7 +234,9 @@ class GeorepApis(BaseAPI):
         :param remoteuser: (string) Remote User
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._delete,
+            httplib.NO_CONTENT)
 
     def georep_set(self, mastervol, remotehost, remotevol,
                    optname, optvalue, remoteuser="root"):
@@ -67,7 +251,9 @@ class GeorepApis(BaseAPI):
         :param optvalue: (string) Option Value
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._post,
+            httplib.OK, "/config", self.codec.dumps({optname: optvalue}))
 
     def georep_get(self, mastervol, remotehost, remotevol,
                    remoteuser="root", optname=None):
@@ -78,10 +264,13 @@ class GeorepApis(BaseAPI):
         :param remotehost: (string) Remote Host
         :param remotevol: (string) Remote Volume
         :param remoteuser: (string) Remote User
-        :param optname: (string) Option name
+        :param optname: (string) Option name, every option when None
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._get,
+            httplib.OK, "/config",
+            transform=None if optname is None else _option(optname))
 
     def georep_reset(self, mastervol, remotehost,
                      remotevol, optname, remoteuser="root"):
@@ -95,7 +284,9 @@ class GeorepApis(BaseAPI):
         :param remoteuser: (string) Remote User
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._delete,
+            httplib.OK, "/config", self.codec.dumps([optname]))
 
     def georep_checkpoint(self, mastervol, remotehost,
                           remotevol, remoteuser="root"):
@@ -116,10 +307,245 @@ class GeorepApis(BaseAPI):
         """
         Geo-replication Session Status
 
+        Without mastervol, list every session, without their workers.
+        The remote host, volume and user are only needed to tell apart
+        the sessions of a master volume.
+
         :param mastervol: (string) Master Volume Name
         :param remotehost: (string) Remote Host
         :param remotevol: (string) Remote Volume
         :param remoteuser: (string) Remote User
+        :raises: GlusterAPIError or failure, GlusterApiInvalidInputs if
+                 several sessions match
+        """
+        if mastervol is None:
+            return self._handle_request(self._get, httplib.OK,
+                                        "/v1/geo-replication")
+        return self._georep_request(
+            (mastervol, remotehost, remotevol, remoteuser), self._get,
+            httplib.OK)
+
+    def georep_session_status(self, mastervolid, remotevolid):
+        """
+        Geo-replication Session Status by volume ids
+
+        :param mastervolid: (string) Master Volume ID
+        :param remotevolid: (string) Remote Volume ID
         :raises: GlusterAPIError or failure
         """
-        pass
+        return self._handle_request(self._get, httplib.OK,
+                                    _session_url(mastervolid, remotevolid))
+
+
+def _timestamp(value):
+    """Seconds since the epoch of a worker time field, None if unset."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, string_types):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%SZ'):
+            try:
+                return calendar.timegm(time.strptime(value, fmt))
+            except ValueError:
+                pass
+    return None
+
+
+class SessionStatus(object):
+    """
+    Summary of a geo-replication session, see GeorepMonitor.
+
+    :ivar state: (string) monitor status of the session
+    :ivar workers: (list) worker dicts of the last status
+    :ivar lag: (float) seconds since the least recent sync of an active
+               worker, None when no active worker reported one
+    :ivar checkpoint_completed: (bool) True when every active worker
+                                completed the checkpoint, None without a
+                                checkpoint
+    :ivar error: exception raised by the last poll, if any
+    """
+
+    __slots__ = ('key', 'master_volume', 'remote_volume', 'remote_hosts',
+                 'state', 'workers', 'lag', 'checkpoint_completed', 'error',
+                 'polled', 'interval')
+
+    def __init__(self, key, session):
+        self.key = key
+        self.master_volume = session.get('master-volume')
+        self.remote_volume = session.get('remote-volume')
+        self.remote_hosts = session.get('remote-hosts') or []
+        self.state = session.get('monitor-status')
+        self.workers = []
+        self.lag = None
+        self.checkpoint_completed = None
+        self.error = None
+        self.polled = None
+        self.interval = None
+
+    def update(self, status, now):
+        self.state = status.get('monitor-status', self.state)
+        self.workers = status.get('workers') or []
+        self.error = None
+        active = [w for w in self.workers if w.get('status') == 'Active']
+        synced = [_timestamp(w.get('last-synced')) for w in active]
+        synced = [t for t in synced if t]
+        self.lag = max(0.0, now - min(synced)) if synced else None
+        checkpoints = [w.get('checkpoint-completed') for w in active
+                       if _timestamp(w.get('checkpoint-time'))]
+        if checkpoints:
+            self.checkpoint_completed = all(c in (True, 'Yes')
+                                            for c in checkpoints)
+        else:
+            self.checkpoint_completed = None
+
+    def worker_states(self):
+        """Return the number of workers per worker status."""
+        states = {}
+        for worker in self.workers:
+            state = worker.get('status')
+            states[state] = states.get(state, 0) + 1
+        return states
+
+    def healthy(self, lag_threshold):
+        """A started session with no faulty worker and a small lag."""
+        if self.error is not None or self.state != 'Started':
+            return False
+        if 'Faulty' in self.worker_states():
+            return False
+        return self.lag is not None and self.lag <= lag_threshold
+
+    def __repr__(self):
+        return '<SessionStatus %s -> %s::%s %s lag=%s>' % (
+            self.master_volume, ','.join(self.remote_hosts),
+            self.remote_volume, self.state, self.lag)
+
+
+class GeorepMonitor(object):
+    """
+    Track the status and lag of every geo-replication session.
+
+    poll() lists the sessions and fetches the status of the due ones
+    concurrently. A session is polled again after ``fast_interval``
+    while it lags, is faulty or not started, and its interval doubles up
+    to ``slow_interval`` while it stays healthy.
+
+    :param client: glusterapi.Client
+    :param lag_threshold: (float) lag in seconds above which a session
+                          is lagging
+    :param fast_interval: (float) seconds between polls of a session
+                          needing attention
+    :param slow_interval: (float) max seconds between polls of a healthy
+                          session
+    :param max_workers: (int) max number of requests in flight
+    :param clock: callable returning the current time in seconds since
+                  the epoch
+    """
+
+    def __init__(self, client, lag_threshold=300.0, fast_interval=10.0,
+                 slow_interval=120.0, max_workers=None, clock=time.time):
+        self.client = client
+        self.lag_threshold = lag_threshold
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.max_workers = max_workers
+        self.clock = clock
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _due(self, status, now):
+        return status.polled is None or now >= status.polled + status.interval
+
+    def poll(self, force=False):
+        """
+        Refresh the due sessions.
+
+        :param force: (bool) poll every session, due or not
+        :return: (dict) (master volume id, remote volume id) ->
+                 SessionStatus of every session
+        :raises: GlusterApiError if the session list cannot be fetched
+        """
+        _, sessions = self.client.georep_status()
+        now = self.clock()
+        with self._lock:
+            current = {}
+            for session in sessions or []:
+                key = (session['master-volid'], session['remote-volid'])
+                status = self.sessions.get(key)
+                if status is None:
+                    status = SessionStatus(key, session)
+                current[key] = status
+            self.sessions = current
+            due = [k for k, s in current.items()
+                   if force or self._due(s, now)]
+
+        max_workers = self.max_workers or self.client.max_workers
+        results = fan_out(lambda key: self.client.georep_session_status(*key),
+                          due, max_workers)
+        now = self.clock()
+        with self._lock:
+            for key, result in results.items():
+                status = current[key]
+                if isinstance(result, Exception):
+                    status.error = result
+                else:
+                    status.update(result[1], now)
+                status.polled = now
+                if status.healthy(self.lag_threshold):
+                    status.interval = min(
+                        self.slow_interval,
+                        2 * (status.interval or self.fast_interval / 2.0))
+                else:
+                    status.interval = self.fast_interval
+        return dict(current)
+
+    def next_poll(self):
+        """Return the time of the next due session poll, or None."""
+        with self._lock:
+            times = [s.polled + s.interval for s in self.sessions.values()
+                     if s.polled is not None]
+        return min(times) if times else None
+
+    def lagging(self):
+        """Return the SessionStatus of the sessions needing attention."""
+        with self._lock:
+            return [s for s in self.sessions.values()
+                    if not s.healthy(self.lag_threshold)]
+
+    def start(self, callback=None):
+        """
+        Poll on a background thread until stop() is called.
+
+        :param callback: callable receiving the poll() result
+        """
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    result = self.poll()
+                    if callback is not None:
+                        callback(result)
+                except Exception:
+                    LOG.exception("Geo-replication status poll failed")
+                upcoming = self.next_poll()
+                wait = self.fast_interval
+                if upcoming is not None:
+                    wait = min(self.slow_interval,
+                               max(0.0, upcoming - self.clock()))
+                self._stop.wait(wait)
+
+        self._thread = threading.Thread(target=run, name='glusterapi-georep')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
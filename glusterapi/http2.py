@@ -0,0 +1,182 @@
+"""
+This module contains the HTTP/2 transport of a client.
+
+HTTP/1.1 allows one outstanding request per connection, so concurrent
+calls, e.g. volume_status_many, open up to ``pool_maxsize`` sockets per
+glusterd2 endpoint. Over HTTP/2 they are multiplexed as streams of a
+single connection per endpoint instead. Select it with
+``Client(endpoint, transport='http2')``, which negotiates HTTP/2 over TLS
+and falls back to HTTP/1.1, or ``transport='h2c'`` to speak HTTP/2 over
+plain TCP to an endpoint known to support it.
+
+The connections are driven by an ``httpx.AsyncClient`` on an event loop
+thread owned by the session manager, the calling threads wait for their
+response there. The connection state is only ever touched by that
+thread, which the threaded HTTP/2 connections of httpx do not ensure:
+concurrent threads may send the headers of their streams out of order.
+
+Requires httpx and h2: ``pip install glusterapi-python[http2]``.
+"""
+import asyncio
+import threading
+
+import h2.connection  # noqa: F401, httpx needs it for HTTP/2
+import httpx
+
+
+class Http2Response(object):
+    """The parts of requests.Response the client uses, over httpx."""
+
+    __slots__ = ('_resp', '_run')
+
+    def __init__(self, resp, run):
+        self._resp = resp
+        # Runs a coroutine on the event loop of the session manager
+        self._run = run
+
+    @property
+    def status_code(self):
+        return self._resp.status_code
+
+    @property
+    def headers(self):
+        return self._resp.headers
+
+    @property
+    def content(self):
+        if not self._resp.is_stream_consumed:
+            return self._run(self._resp.aread())
+        return self._resp.content
+
+    @property
+    def http_version(self):
+        """(string) protocol the response came with, e.g. HTTP/2."""
+        return self._resp.http_version
+
+    def iter_content(self, chunk_size=None):
+        chunks = self._resp.aiter_bytes(chunk_size)
+        while True:
+            try:
+                yield self._run(chunks.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def close(self):
+        self._run(self._resp.aclose())
+
+
+class Http2SessionManager(object):
+    """
+    Thread-safe owner of the ``httpx.AsyncClient`` shared by a client.
+
+    Takes the arguments of SessionManager. Concurrent requests to an
+    endpoint share one connection, ``pool_maxsize`` only bounds the
+    connections kept per endpoint while one is being replaced.
+    """
+
+    # Exceptions raised by request() when no response was received
+    errors = (httpx.TransportError,)
+
+    # Speak HTTP/2 to plain http endpoints, without HTTP/1.1 upgrade
+    prior_knowledge = False
+
+    def __init__(self, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, keep_alive=True, connect_timeout=None,
+                 read_timeout=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # httpx checks certificates per client, keep one per verify value
+        self._clients = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _start_loop(self):
+        loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=loop.run_forever,
+                                        name='glusterapi-http2')
+        self._thread.daemon = True
+        self._thread.start()
+        return loop
+
+    def _run(self, coro):
+        """Run coro on the event loop thread and return its result."""
+        loop = self._loop
+        if loop is None:
+            with self._lock:
+                if self._loop is None:
+                    self._loop = self._start_loop()
+                loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def _create_client(self, verify):
+        limits = httpx.Limits(
+            max_connections=self.pool_connections * self.pool_maxsize,
+            max_keepalive_connections=(self.pool_connections
+                                       if self.keep_alive else 0))
+        timeout = httpx.Timeout(None, connect=self.connect_timeout,
+                                read=self.read_timeout)
+        return httpx.AsyncClient(http1=not self.prior_knowledge, http2=True,
+                                 verify=verify, limits=limits,
+                                 timeout=timeout)
+
+    async def _send(self, method, url, headers, data, params, stream,
+                    verify):
+        # Only the event loop thread reads and creates clients
+        client = self._clients.get(verify)
+        if client is None:
+            client = self._clients[verify] = self._create_client(verify)
+        req = client.build_request(method, url, headers=headers,
+                                   content=data, params=params)
+        return await client.send(req, stream=stream)
+
+    def request(self, method, url, headers=None, data=None, params=None,
+                stream=False, verify=False):
+        """
+        Send a request, as a stream of the connection to its endpoint.
+
+        :param method: (string) HTTP method
+        :param url: (string) absolute url
+        :return: Http2Response
+        """
+        resp = self._run(self._send(method, url, headers, data, params,
+                                    stream, verify))
+        return Http2Response(resp, self._run)
+
+    @staticmethod
+    def is_connect_error(err):
+        """
+        Check whether a request failed before reaching glusterd2.
+
+        :param err: exception raised by request()
+        :return: (bool) True if no connection could be established
+        """
+        return isinstance(err, (httpx.ConnectError, httpx.ConnectTimeout))
+
+    async def _close_clients(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def close(self):
+        """Close all connections. They are reopened on reuse."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_clients(),
+                                         loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+class H2cSessionManager(Http2SessionManager):
+    """Http2SessionManager speaking HTTP/2 over plain TCP."""
+
+    prior_knowledge = True
@@ -0,0 +1,248 @@
+"""This module contains the per-endpoint request metrics of a client."""
+import bisect
+import logging
+import threading
+import timeit
+from collections import defaultdict
+
+from glusterapi import routes
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+# Status label of requests which failed without a response
+ERROR_STATUS = 'error'
+
+
+class RequestRecord(object):
+    """Outcome of one request, passed to the metrics hooks."""
+
+    __slots__ = ('method', 'endpoint', 'path', 'status', 'duration',
+                 'request_bytes', 'response_bytes', 'error')
+
+    def __init__(self, method, endpoint, path, status, duration,
+                 request_bytes, response_bytes, error=None):
+        self.method = method
+        self.endpoint = endpoint
+        self.path = path
+        self.status = status
+        self.duration = duration
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.error = error
+
+
+class Histogram(object):
+    """Cumulative latency histogram, in seconds."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class RequestTracker(object):
+    """Measures a single in-flight request, see Metrics.track."""
+
+    __slots__ = ('metrics', 'key', 'path', 'request_bytes', 'start')
+
+    def __init__(self, metrics, key, path, request_bytes):
+        self.metrics = metrics
+        self.key = key
+        self.path = path
+        self.request_bytes = request_bytes
+        self.start = timeit.default_timer()
+
+    def done(self, status_code, response_bytes):
+        self.metrics._finish(self, status_code, response_bytes, None)
+
+    def failed(self, error):
+        self.metrics._finish(self, ERROR_STATUS, 0, error)
+
+
+class Metrics(object):
+    """
+    Per-endpoint request metrics.
+
+    Requests are grouped by method and endpoint template, such as
+    GET /v1/volumes/{volname}/status, and recorded as latency histograms,
+    status code counts, request and response byte counts and in-flight
+    gauges. Hooks registered with add_hook receive a RequestRecord for
+    every finished request.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: (tuple) histogram upper bounds in seconds
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far, in-flight gauges included."""
+        with self._lock:
+            self._latency = {}
+            self._statuses = defaultdict(int)
+            self._request_bytes = defaultdict(int)
+            self._response_bytes = defaultdict(int)
+            self._in_flight = defaultdict(int)
+
+    def add_hook(self, hook):
+        """
+        Register a callable receiving a RequestRecord per request.
+
+        :param hook: callable taking a RequestRecord
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def track(self, method, path, request_bytes=0):
+        """
+        Start measuring a request.
+
+        :param method: (string) HTTP method
+        :param path: (string) request path
+        :param request_bytes: (int) size of the request body
+        :return: RequestTracker, call done() or failed() on it
+        """
+        key = (method, routes.template(path))
+        with self._lock:
+            self._in_flight[key] += 1
+        return RequestTracker(self, key, path, request_bytes)
+
+    def _finish(self, tracker, status, response_bytes, error):
+        duration = timeit.default_timer() - tracker.start
+        key = tracker.key
+        with self._lock:
+            self._in_flight[key] -= 1
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+            self._statuses[key + (str(status),)] += 1
+            self._request_bytes[key] += tracker.request_bytes
+            self._response_bytes[key] += response_bytes
+
+        if not self._hooks:
+            return
+        record = RequestRecord(key[0], key[1], tracker.path, status, duration,
+                               tracker.request_bytes, response_bytes, error)
+        for hook in list(self._hooks):
+            try:
+                hook(record)
+            except Exception:
+                LOG.exception("glusterapi metrics hook %r failed", hook)
+
+    def snapshot(self):
+        """
+        Current metrics.
+
+        :return: (dict) (method, endpoint) -> dict with count, sum,
+                 buckets, statuses, request_bytes, response_bytes and
+                 in_flight
+        """
+        result = {}
+        with self._lock:
+            keys = set(self._latency) | set(self._in_flight)
+            for key in keys:
+                histogram = self._latency.get(key) or Histogram(self.buckets)
+                result[key] = {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': list(zip(self.buckets + (float('inf'),),
+                                        histogram.cumulative())),
+                    'statuses': {},
+                    'request_bytes': self._request_bytes.get(key, 0),
+                    'response_bytes': self._response_bytes.get(key, 0),
+                    'in_flight': self._in_flight.get(key, 0),
+                }
+            for (method, endpoint, status), count in self._statuses.items():
+                result[(method, endpoint)]['statuses'][status] = count
+        return result
+
+    def render_prometheus(self, prefix='glusterapi'):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        :param prefix: (string) metric name prefix
+        :return: (string) exposition text
+        """
+        snapshot = self.snapshot()
+        keys = sorted(snapshot)
+        lines = []
+
+        def header(name, kind, text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+        header('request_duration_seconds', 'histogram',
+               'glusterd2 request latency.')
+        for key in keys:
+            data = snapshot[key]
+            labels = _labels(key)
+            for bound, count in data['buckets']:
+                lines.append('%s_request_duration_seconds_bucket{%s,le="%s"} '
+                             '%d' % (prefix, labels, _bound(bound), count))
+            lines.append('%s_request_duration_seconds_sum{%s} %r' %
+                         (prefix, labels, data['sum']))
+            lines.append('%s_request_duration_seconds_count{%s} %d' %
+                         (prefix, labels, data['count']))
+
+        header('requests_total', 'counter',
+               'glusterd2 requests by response status.')
+        for key in keys:
+            for status, count in sorted(snapshot[key]['statuses'].items()):
+                lines.append('%s_requests_total{%s,status="%s"} %d' %
+                             (prefix, _labels(key), status, count))
+
+        for name, field, text in (
+                ('request_bytes_total', 'request_bytes',
+                 'Bytes sent in glusterd2 request bodies.'),
+                ('response_bytes_total', 'response_bytes',
+                 'Bytes received in glusterd2 response bodies.')):
+            header(name, 'counter', text)
+            for key in keys:
+                lines.append('%s_%s{%s} %d' % (prefix, name, _labels(key),
+                                               snapshot[key][field]))
+
+        header('requests_in_flight', 'gauge',
+               'glusterd2 requests waiting for a response.')
+        for key in keys:
+            lines.append('%s_requests_in_flight{%s} %d' %
+                         (prefix, _labels(key), snapshot[key]['in_flight']))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def _labels(key):
+    return 'method="%s",endpoint="%s"' % (_escape(key[0]), _escape(key[1]))
+
+
+def _bound(bound):
+    if bound == float('inf'):
+        return '+Inf'
+    return repr(float(bound))
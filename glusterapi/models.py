@@ -0,0 +1,292 @@
+"""
+This module contains compact typed models of glusterd2 responses.
+
+Read methods return plain dicts by default and these models when called
+with ``typed=True``. Models keep their fields in ``__slots__`` instead of
+a per-object dict, intern strings that repeat across objects, such as
+peer ids, hostnames and states, and decode nested lists (subvolumes and
+their bricks) only when first accessed. Keys a model does not know are
+kept in its ``extra`` dict, so ``to_dict()`` loses no received field.
+"""
+from glusterapi.compat import intern
+
+
+def _str(value):
+    """Intern a string shared by many objects."""
+    try:
+        return intern(value)
+    except TypeError:
+        # Python 2 can only intern byte strings
+        return value
+
+
+def _str_list(values):
+    return [_str(value) for value in values]
+
+
+def _lazy(attr, doc):
+    """Property decoding a nested field on first access."""
+    slot = '_' + attr
+    raw_slot = slot + '_raw'
+
+    def get(self):
+        value = getattr(self, slot)
+        if value is None:
+            raw = getattr(self, raw_slot)
+            if raw is None:
+                return None
+            value = self._decode_nested(attr, raw)
+            setattr(self, slot, value)
+            setattr(self, raw_slot, None)
+        return value
+    return property(get, doc=doc)
+
+
+class Model(object):
+    """
+    Base of the response models.
+
+    ``_fields`` lists (attribute, JSON key, converter) of plain fields and
+    ``_nested`` lists (attribute, JSON key, model, many) of lazily decoded
+    ones.
+    """
+
+    __slots__ = ('extra',)
+    _fields = ()
+    _nested = ()
+    _known = {}
+
+    @classmethod
+    def _known_keys(cls):
+        keys = Model._known.get(cls)
+        if keys is None:
+            keys = frozenset(f[1] for f in cls._fields).union(
+                n[1] for n in cls._nested)
+            Model._known[cls] = keys
+        return keys
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a model from a decoded response.
+
+        :param data: (dict) decoded JSON object
+        """
+        obj = cls.__new__(cls)
+        for attr, key, convert in cls._fields:
+            value = data.get(key)
+            if convert is not None and value is not None:
+                value = convert(value)
+            setattr(obj, attr, value)
+        for attr, key, _, _ in cls._nested:
+            setattr(obj, '_' + attr, None)
+            setattr(obj, '_' + attr + '_raw', data.get(key))
+
+        extra = None
+        known = cls._known_keys()
+        for key, value in data.items():
+            if key not in known:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        obj.extra = extra
+        return obj
+
+    def _decode_nested(self, attr, raw):
+        for name, _, model, many in self._nested:
+            if name == attr:
+                if many:
+                    return [model.from_dict(item) for item in raw]
+                return model.from_dict(raw)
+
+    def load(self):
+        """Decode every nested field now, recursively."""
+        for attr, _, _, many in self._nested:
+            value = getattr(self, attr)
+            for item in (value or []) if many else [value]:
+                if item is not None:
+                    item.load()
+        return self
+
+    def to_dict(self):
+        """Return the model as the dict it was decoded from."""
+        data = dict(self.extra or {})
+        for attr, key, _ in self._fields:
+            data[key] = getattr(self, attr)
+        for attr, key, _, many in self._nested:
+            value = getattr(self, '_' + attr)
+            if value is None:
+                value = getattr(self, '_' + attr + '_raw')
+            elif many:
+                value = [item.to_dict() for item in value]
+            else:
+                value = value.to_dict()
+            data[key] = value
+        return data
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        name = getattr(self, 'name', None)
+        if name is None:
+            name = getattr(self, 'id', None)
+        return '<%s %s>' % (type(self).__name__, name)
+
+
+class Brick(Model):
+    __slots__ = ('id', 'path', 'peer_id', 'hostname', 'volume_id',
+                 'volume_name', 'type')
+    _fields = (
+        ('id', 'id', None),
+        ('path', 'path', None),
+        ('peer_id', 'peer-id', _str),
+        ('hostname', 'hostname', _str),
+        ('volume_id', 'volume-id', _str),
+        ('volume_name', 'volume-name', _str),
+        ('type', 'type', _str),
+    )
+
+
+class Subvolume(Model):
+    __slots__ = ('name', 'type', 'replica_count', 'arbiter_count',
+                 'disperse_count', '_bricks', '_bricks_raw')
+    _fields = (
+        ('name', 'name', None),
+        ('type', 'type', _str),
+        ('replica_count', 'replica-count', None),
+        ('arbiter_count', 'arbiter-count', None),
+        ('disperse_count', 'disperse-count', None),
+    )
+    _nested = (('bricks', 'bricks', Brick, True),)
+
+    bricks = _lazy('bricks', "(list) Brick of the subvolume")
+
+
+class Volume(Model):
+    __slots__ = ('id', 'name', 'type', 'transport', 'distribute_count',
+                 'state', 'options', 'metadata', 'version', '_subvols',
+                 '_subvols_raw')
+    _fields = (
+        ('id', 'id', None),
+        ('name', 'name', _str),
+        ('type', 'type', _str),
+        ('transport', 'transport', _str),
+        ('distribute_count', 'distribute-count', None),
+        ('state', 'state', _str),
+        ('options', 'options', None),
+        ('metadata', 'metadata', None),
+        ('version', 'version', None),
+    )
+    _nested = (('subvols', 'subvols', Subvolume, True),)
+
+    subvols = _lazy('subvols', "(list) Subvolume of the volume")
+
+    def bricks(self):
+        """Iterate over the bricks of every subvolume."""
+        for subvol in self.subvols or []:
+            for brick in subvol.bricks or []:
+                yield brick
+
+
+class BrickStatus(Model):
+    __slots__ = ('online', 'pid', 'port', 'fs_type', 'mount_opts',
+                 'device', 'size', '_info', '_info_raw')
+    _fields = (
+        ('online', 'online', None),
+        ('pid', 'pid', None),
+        ('port', 'port', None),
+        ('fs_type', 'fs-type', _str),
+        ('mount_opts', 'mount-opts', _str),
+        ('device', 'device', _str),
+        ('size', 'size', None),
+    )
+    _nested = (('info', 'info', Brick, False),)
+
+    info = _lazy('info', "(Brick) the brick")
+
+    def __repr__(self):
+        info = self.info
+        return '<BrickStatus %s>' % (None if info is None else info.path)
+
+
+class VolumeStatus(Model):
+    __slots__ = ('online', 'size', '_info', '_info_raw')
+    _fields = (
+        ('online', 'online', None),
+        ('size', 'size', None),
+    )
+    _nested = (('info', 'info', Volume, False),)
+
+    info = _lazy('info', "(Volume) the volume")
+
+    def __repr__(self):
+        info = self.info
+        return '<VolumeStatus %s>' % (None if info is None else info.name)
+
+
+class Peer(Model):
+    __slots__ = ('id', 'name', 'peer_addresses', 'client_addresses',
+                 'online', 'pid', 'metadata', 'zone')
+    _fields = (
+        ('id', 'id', _str),
+        ('name', 'name', _str),
+        ('peer_addresses', 'peer-addresses', _str_list),
+        ('client_addresses', 'client-addresses', _str_list),
+        ('online', 'online', None),
+        ('pid', 'pid', None),
+        ('metadata', 'metadata', None),
+        ('zone', 'zone', _str),
+    )
+
+
+class Device(Model):
+    __slots__ = ('device', 'state', 'peer_id', 'avail_size', 'extent_size',
+                 'used')
+    _fields = (
+        ('device', 'device', _str),
+        ('state', 'state', _str),
+        ('peer_id', 'peer-id', _str),
+        ('avail_size', 'avail-size', None),
+        ('extent_size', 'extent-size', None),
+        ('used', 'used', None),
+    )
+
+
+class Snapshot(Model):
+    __slots__ = ('parent_volume', 'description', 'created_at', '_volinfo',
+                 '_volinfo_raw')
+    _fields = (
+        ('parent_volume', 'parent-volume', _str),
+        ('description', 'description', None),
+        ('created_at', 'created-at', None),
+    )
+    _nested = (('volinfo', 'volinfo', Volume, False),)
+
+    volinfo = _lazy('volinfo', "(Volume) the snapshot volume")
+
+    @property
+    def name(self):
+        volinfo = self.volinfo
+        return None if volinfo is None else volinfo.name
+
+
+def decode(model, data):
+    """
+    Convert a decoded response to models.
+
+    :param model: Model subclass
+    :param data: (dict or list) decoded JSON response
+    :return: model object, or list of them for a list response
+    """
+    if isinstance(data, list):
+        return [model.from_dict(item) for item in data]
+    return model.from_dict(data)
@@ -1,8 +1,7 @@
-import httplib
-import json
-
 from glusterapi.common import BaseAPI, validate_peer_id
+from glusterapi.compat import httplib
 from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.models import Peer
 
 
 class PeerApis(BaseAPI):
@@ -25,7 +24,7 @@ class PeerApis(BaseAPI):
         req['metadata'] = metadata
         req['zone'] = zone
         return self._handle_request(self._post, httplib.CREATED, "/v1/peers",
-                                    json.dumps(req))
+                                    self.codec.dumps(req))
 
     def peer_remove(self, peerid):
         """
@@ -38,10 +37,13 @@ class PeerApis(BaseAPI):
         url = "/v1/peers/" + peerid
         return self._handle_request(self._delete, httplib.NO_CONTENT, url, None)
 
-    def peer_status(self):
+    def peer_status(self, typed=False):
         """
         Gluster Peer Status.
 
+        :param typed: (bool) return glusterapi.models objects instead of
+                      dicts
         :raises: GlusterApiError on failure
         """
-        return self._handle_request(self._get, httplib.OK, "/v1/peers")
+        return self._handle_request(self._get, httplib.OK, "/v1/peers",
+                                    model=Peer if typed else None)
@@ -0,0 +1,209 @@
+"""
+This module contains the topology-aware brick placement planner.
+
+``plan_volume`` picks the bricks of a new volume from the peers and
+devices of the cluster. Every replica or disperse set uses distinct
+peers, spreads over as many zones as possible, and bricks go to the
+least loaded peers, then the least loaded of their devices, so no node
+or disk becomes a hotspot.
+"""
+import posixpath
+from collections import Counter, OrderedDict
+
+from glusterapi.exceptions import GlusterApiInvalidInputs
+
+
+def _field(obj, key):
+    """Read a field of a response dict or of a glusterapi.models object."""
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key.replace('-', '_'), None)
+
+
+class Placement(object):
+    """A planned brick."""
+
+    __slots__ = ('peer_id', 'zone', 'device', 'path', 'arbiter')
+
+    def __init__(self, peer_id, zone, device, path, arbiter=False):
+        self.peer_id = peer_id
+        self.zone = zone
+        self.device = device
+        self.path = path
+        self.arbiter = arbiter
+
+    @property
+    def brick(self):
+        """(string) brick in the peerid:path form of volume_create."""
+        return '%s:%s' % (self.peer_id, self.path)
+
+    def __repr__(self):
+        return '<Placement %s zone=%s device=%s%s>' % (
+            self.brick, self.zone, self.device,
+            ' arbiter' if self.arbiter else '')
+
+
+class VolumePlan(object):
+    """Brick layout of a volume, see plan_volume."""
+
+    def __init__(self, volume_name, sets, replica=0, arbiter=0, disperse=0,
+                 disperse_data=0, disperse_redundancy=0):
+        self.volume_name = volume_name
+        self.sets = sets
+        self.replica = replica
+        self.arbiter = arbiter
+        self.disperse = disperse
+        self.disperse_data = disperse_data
+        self.disperse_redundancy = disperse_redundancy
+
+    @property
+    def bricks(self):
+        """(list) bricks in peerid:path form, set after set."""
+        return [p.brick for brick_set in self.sets for p in brick_set]
+
+    def load(self):
+        """
+        Bricks planned per peer and per device.
+
+        :return: (tuple) Counter of peer ids and Counter of
+                 (peer id, device) pairs
+        """
+        peers = Counter()
+        devices = Counter()
+        for brick_set in self.sets:
+            for p in brick_set:
+                peers[p.peer_id] += 1
+                devices[(p.peer_id, p.device)] += 1
+        return peers, devices
+
+    def create_args(self):
+        """Return the keyword arguments of volume_create for this plan."""
+        return {
+            'volume_name': self.volume_name,
+            'bricks': self.bricks,
+            'replica': self.replica,
+            'arbiter': self.arbiter,
+            'disperse': self.disperse,
+            'disperse_data': self.disperse_data,
+            'disperse_redundancy': self.disperse_redundancy,
+        }
+
+
+def _device_map(peers, devices):
+    """Return peer id -> list of usable device dicts, in peer order."""
+    by_peer = OrderedDict()
+    for peer in peers:
+        if _field(peer, 'online') is False:
+            continue
+        by_peer[_field(peer, 'id')] = []
+
+    if isinstance(devices, dict):
+        items = [dev for devs in devices.values() for dev in devs]
+    else:
+        items = list(devices or [])
+    for dev in items:
+        peer_id = _field(dev, 'peer-id')
+        state = _field(dev, 'state')
+        if peer_id in by_peer and state in (None, 'enabled'):
+            by_peer[peer_id].append(dev)
+    return by_peer
+
+
+def plan_volume(peers, devices, volume_name, replica=0, arbiter=0,
+                disperse=0, disperse_redundancy=0, distribute=1,
+                brick_size=None, brick_root='/bricks', usage=None):
+    """
+    Plan the bricks of a replicate, arbiter, disperse or plain volume.
+
+    :param peers: (list) peers as returned by peer_status, with zone
+    :param devices: (list) devices as returned by devices(), or a dict of
+                    peer id -> device_status list
+    :param volume_name: (string) volume name, used in the brick paths
+    :param replica: (int) replica count, including the arbiter brick
+    :param arbiter: (int) 1 to make the last brick of each set an arbiter
+    :param disperse: (int) disperse count
+    :param disperse_redundancy: (int) disperse redundancy count
+    :param distribute: (int) number of replica or disperse sets
+    :param brick_size: (int) bytes needed per brick, checked against the
+                       avail-size of the devices
+    :param brick_root: (string) directory the brick paths start with
+    :param usage: (Counter) bricks already on each (peer id, device),
+                  e.g. load()[1] of earlier plans
+    :return: VolumePlan
+    :raises: GlusterApiInvalidInputs when the cluster cannot hold the
+             volume with one brick per peer in each set
+    """
+    if replica and disperse:
+        raise GlusterApiInvalidInputs("Volume cannot be both replicate and "
+                                      "disperse")
+    if arbiter and replica != 3:
+        raise GlusterApiInvalidInputs("Arbiter volumes need replica 3")
+    if disperse and not 0 < disperse_redundancy < disperse / 2.0:
+        raise GlusterApiInvalidInputs("Disperse redundancy must be between "
+                                      "1 and half the disperse count")
+    if distribute < 1:
+        raise GlusterApiInvalidInputs("Distribute count must be positive")
+
+    set_size = replica or disperse or 1
+    by_peer = _device_map(peers, devices)
+    zones = dict((_field(peer, 'id'), _field(peer, 'zone') or '')
+                 for peer in peers)
+    candidates = [(peer_id, dev) for peer_id, devs in by_peer.items()
+                  for dev in devs]
+    usable_peers = set(peer_id for peer_id, _ in candidates)
+    if len(usable_peers) < set_size:
+        raise GlusterApiInvalidInputs(
+            "Need %d peers with devices for a set of %d bricks, found %d" %
+            (set_size, set_size, len(usable_peers)))
+
+    device_load = Counter(usage or {})
+    peer_load = Counter()
+    for (peer_id, _), count in device_load.items():
+        peer_load[peer_id] += count
+    zone_load = Counter()
+    avail = dict(((peer_id, _field(dev, 'device')),
+                  _field(dev, 'avail-size')) for peer_id, dev in candidates)
+
+    sets = []
+    for set_index in range(distribute):
+        chosen = []
+        set_zones = Counter()
+        for slot in range(set_size):
+            is_arbiter = bool(arbiter) and slot == set_size - 1
+            best = None
+            for order, (peer_id, dev) in enumerate(candidates):
+                if any(p.peer_id == peer_id for p in chosen):
+                    continue
+                key = (peer_id, _field(dev, 'device'))
+                if brick_size is not None and avail[key] is not None:
+                    if avail[key] < brick_size:
+                        continue
+                zone = zones.get(peer_id, '')
+                # Spread over the peers first, a peer with more devices
+                # would otherwise get most of the bricks
+                score = (set_zones[zone], peer_load[peer_id],
+                         device_load[key], zone_load[zone], order)
+                if best is None or score < best[0]:
+                    best = (score, peer_id, zone, key[1])
+            if best is None:
+                raise GlusterApiInvalidInputs(
+                    "Not enough device capacity for set %d of volume %s" %
+                    (set_index, volume_name))
+            _, peer_id, zone, device = best
+            key = (peer_id, device)
+            device_load[key] += 1
+            peer_load[peer_id] += 1
+            zone_load[zone] += 1
+            set_zones[zone] += 1
+            if brick_size is not None and avail[key] is not None:
+                avail[key] -= brick_size
+            path = posixpath.join(brick_root, posixpath.basename(device),
+                                  volume_name, 's%db%d' % (set_index, slot))
+            chosen.append(Placement(peer_id, zone, device, path,
+                                    arbiter=is_arbiter))
+        sets.append(chosen)
+
+    disperse_data = disperse - disperse_redundancy if disperse else 0
+    return VolumePlan(volume_name, sets, replica=replica, arbiter=arbiter,
+                      disperse=disperse, disperse_data=disperse_data,
+                      disperse_redundancy=disperse_redundancy)
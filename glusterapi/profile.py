@@ -0,0 +1,308 @@
+"""
+This module contains the analysis of volume profiles.
+
+volume_profile_info reports, for every brick, the hits and the average,
+min and max latency in microseconds of each FOP. ProfileSample loads
+these records once into NumPy arrays of shape (bricks, FOPs), rows and
+columns sorted by name, so that the cluster-wide latency percentiles,
+the hot bricks and the deltas between two samples are computed by array
+operations rather than loops over the records::
+
+    sampler = ProfileSampler(client, 'vol1')
+    sampler.sample()
+    time.sleep(60)
+    interval = sampler.sample()
+    interval.latency_percentiles((50, 99))
+    interval.hot_bricks()
+
+Requires numpy: ``pip install glusterapi-python[profile]``.
+"""
+import numpy as np
+
+from glusterapi.exceptions import GlusterApiInvalidInputs
+
+STATS = ('cumulative', 'interval')
+
+METRICS = ('hits', 'latency')
+
+
+def _align(names, target):
+    """
+    Map the target names onto the sorted names array.
+
+    :return: (tuple) positions in names and mask of the target names found
+    """
+    if not len(names):
+        return (np.zeros(len(target), dtype=np.intp),
+                np.zeros(len(target), dtype=bool))
+    pos = np.minimum(np.searchsorted(names, target), len(names) - 1)
+    return pos, names[pos] == target
+
+
+def _divide(num, den):
+    """num / den, 0 where den is 0."""
+    return np.divide(num, den, out=np.zeros(np.shape(num)), where=den > 0)
+
+
+def _robust_z(values):
+    """
+    Distance of the values to their median along the first axis, in
+    median absolute deviations, so that a few outliers do not hide each
+    other as they would with the mean and the standard deviation.
+    """
+    if values.size == 0:
+        return np.zeros(values.shape)
+    spread = values - np.median(values, axis=0)
+    deviation = np.abs(spread)
+    # Scaled to match the standard deviation of a normal distribution
+    scale = 1.4826 * np.median(deviation, axis=0)
+    # Fall back to the mean deviation when most values are equal
+    scale = np.where(scale > 0, scale, 1.2533 * deviation.mean(axis=0))
+    return _divide(spread, np.broadcast_to(scale, spread.shape))
+
+
+class ProfileSample(object):
+    """
+    Per-brick FOP stats of a volume as NumPy arrays.
+
+    ``hits``, ``avg_latency``, ``min_latency`` and ``max_latency`` have
+    one row per brick of ``bricks`` and one column per FOP of ``fops``,
+    ``duration``, ``data_read`` and ``data_written`` one value per brick.
+    A FOP a brick did not report has 0 hits.
+    """
+
+    __slots__ = ('bricks', 'fops', 'hits', 'avg_latency', 'min_latency',
+                 'max_latency', 'duration', 'data_read', 'data_written')
+
+    def __init__(self, bricks, fops, hits, avg_latency, min_latency,
+                 max_latency, duration, data_read, data_written):
+        self.bricks = bricks
+        self.fops = fops
+        self.hits = hits
+        self.avg_latency = avg_latency
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.duration = duration
+        self.data_read = data_read
+        self.data_written = data_written
+
+    @classmethod
+    def from_info(cls, info, stats='cumulative'):
+        """
+        Load the response body of volume_profile_info.
+
+        :param info: (list) per-brick profile records
+        :param stats: (string) cumulative or interval, the stats to load.
+                      Bricks without them are left out.
+        :return: ProfileSample
+        :raises: GlusterApiInvalidInputs on an unknown stats
+        """
+        if stats not in STATS:
+            raise GlusterApiInvalidInputs(
+                "Invalid profile stats %s, use one of %s" %
+                (stats, ', '.join(STATS)))
+        key = stats + '-stats'
+        records = dict((rec['brick-name'], rec[key])
+                       for rec in info or [] if rec.get(key))
+        bricks = sorted(records)
+        fops = sorted(set(fop for rec in records.values()
+                          for fop in rec.get('stats-info') or {}))
+        brick_index = dict((name, i) for i, name in enumerate(bricks))
+        fop_index = dict((fop, i) for i, fop in enumerate(fops))
+
+        # One flat row per (brick, FOP), scattered into the matrices
+        rows = np.array(
+            [(brick_index[name], fop_index[fop], values.get('hits') or 0,
+              values.get('avglatency') or 0, values.get('minlatency') or 0,
+              values.get('maxlatency') or 0)
+             for name, rec in records.items()
+             for fop, values in (rec.get('stats-info') or {}).items()],
+            dtype=float).reshape(-1, 6)
+        shape = (len(bricks), len(fops))
+        at = (rows[:, 0].astype(np.intp), rows[:, 1].astype(np.intp))
+        matrices = []
+        for column in range(2, 6):
+            matrix = np.zeros(shape)
+            matrix[at] = rows[:, column]
+            matrices.append(matrix)
+
+        totals = np.array([(records[name].get('duration') or 0,
+                            records[name].get('data-read') or 0,
+                            records[name].get('data-written') or 0)
+                           for name in bricks], dtype=float).reshape(-1, 3)
+        return cls(np.array(bricks, dtype=str), np.array(fops, dtype=str),
+                   *(matrices + [totals[:, 0], totals[:, 1], totals[:, 2]]))
+
+    def mean_latency(self):
+        """
+        Hit-weighted average latency of each brick over all its FOPs.
+
+        :return: (ndarray) one value per brick, 0 for idle bricks
+        """
+        return _divide((self.avg_latency * self.hits).sum(axis=1),
+                       self.hits.sum(axis=1))
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        """
+        Cluster-wide latency percentiles of each FOP.
+
+        The average latency of each brick counts once per hit, so busy
+        bricks weigh more than idle ones.
+
+        :param percentiles: (list) percentiles between 0 and 100
+        :return: (ndarray) one row per FOP of ``fops``, one column per
+                 percentile, NaN for FOPs without hits
+        """
+        pcts = np.asarray(percentiles, dtype=float)
+        if self.hits.size == 0:
+            return np.full((len(self.fops), len(pcts)), np.nan)
+        order = np.argsort(self.avg_latency, axis=0, kind='stable')
+        latency = np.take_along_axis(self.avg_latency, order, axis=0)
+        weights = np.cumsum(np.take_along_axis(self.hits, order, axis=0),
+                            axis=0)
+        total = weights[-1]
+        # First brick, by latency, whose cumulated hits reach the target
+        targets = np.maximum(np.outer(total, pcts / 100.0),
+                             np.finfo(float).tiny)
+        pos = np.argmax(weights[:, :, None] >= targets[None], axis=0)
+        result = latency[pos, np.arange(len(self.fops))[:, None]]
+        result[total == 0] = np.nan
+        return result
+
+    def _metric(self, metric):
+        if metric not in METRICS:
+            raise GlusterApiInvalidInputs(
+                "Invalid profile metric %s, use one of %s" %
+                (metric, ', '.join(METRICS)))
+        return self.hits if metric == 'hits' else self.avg_latency
+
+    def fop_scores(self, metric='hits'):
+        """
+        Robust z-scores of each brick and FOP against the other bricks.
+
+        :param metric: (string) hits, or latency for the average latency
+        :return: (ndarray) one row per brick, one column per FOP
+        :raises: GlusterApiInvalidInputs on an unknown metric
+        """
+        return _robust_z(self._metric(metric))
+
+    def brick_scores(self, metric='hits'):
+        """
+        Robust z-scores of each brick against the other bricks.
+
+        :param metric: (string) hits, of all the FOPs of a brick, or
+                       latency for their hit-weighted average latency
+        :return: (ndarray) one value per brick
+        :raises: GlusterApiInvalidInputs on an unknown metric
+        """
+        values = self._metric(metric)
+        if metric == 'hits':
+            return _robust_z(values.sum(axis=1))
+        return _robust_z(self.mean_latency())
+
+    def hot_bricks(self, threshold=3.5, metric='hits'):
+        """
+        Find the bricks serving far more, or far slower, FOPs than the
+        others.
+
+        :param threshold: (float) min brick score of a hot brick
+        :param metric: (string) hits, or latency for the average latency
+        :return: (list) (brick name, FOP, score) of the hot bricks, hottest
+                 first, with the FOP of the brick scoring highest
+        :raises: GlusterApiInvalidInputs on an unknown metric
+        """
+        scores = self.brick_scores(metric)
+        if not len(self.fops):
+            return []
+        hot = np.flatnonzero(scores > threshold)
+        hot = hot[np.argsort(-scores[hot], kind='stable')]
+        top = np.argmax(self.fop_scores(metric)[hot], axis=1)
+        return [(str(self.bricks[i]), str(self.fops[fop]), float(scores[i]))
+                for i, fop in zip(hot, top)]
+
+    def reindex(self, bricks, fops):
+        """
+        Return this sample with the given rows and columns.
+
+        :param bricks: (ndarray) sorted brick names
+        :param fops: (ndarray) sorted FOP names
+        :return: ProfileSample, zero for the bricks and FOPs not in this one
+        """
+        brick_pos, brick_found = _align(self.bricks, bricks)
+        fop_pos, fop_found = _align(self.fops, fops)
+        rows = np.ix_(brick_found, fop_found)
+        source = np.ix_(brick_pos[brick_found], fop_pos[fop_found])
+        matrices = []
+        for matrix in (self.hits, self.avg_latency, self.min_latency,
+                       self.max_latency):
+            result = np.zeros((len(bricks), len(fops)))
+            result[rows] = matrix[source]
+            matrices.append(result)
+        totals = []
+        for total in (self.duration, self.data_read, self.data_written):
+            result = np.zeros(len(bricks))
+            result[brick_found] = total[brick_pos[brick_found]]
+            totals.append(result)
+        return ProfileSample(bricks, fops, *(matrices + totals))
+
+    def __repr__(self):
+        return '<ProfileSample bricks=%d fops=%d hits=%d>' % (
+            len(self.bricks), len(self.fops), self.hits.sum())
+
+
+def delta(prev, cur):
+    """
+    Interval stats between two cumulative samples of a volume.
+
+    A brick whose counters went backwards, restarted or cleared with
+    info-clear, counts from zero. Min and max latencies cannot be
+    derived for the interval, they are those of ``cur``.
+
+    :param prev: ProfileSample, the earlier one
+    :param cur: ProfileSample, the later one
+    :return: ProfileSample with the bricks and FOPs of cur
+    """
+    prev = prev.reindex(cur.bricks, cur.fops)
+    reset = (cur.duration < prev.duration) | \
+        (cur.hits < prev.hits).any(axis=1)
+    keep = ~reset
+    hits = cur.hits - prev.hits * keep[:, None]
+    work = cur.avg_latency * cur.hits - \
+        prev.avg_latency * prev.hits * keep[:, None]
+    return ProfileSample(cur.bricks, cur.fops, hits, _divide(work, hits),
+                         cur.min_latency, cur.max_latency,
+                         cur.duration - prev.duration * keep,
+                         cur.data_read - prev.data_read * keep,
+                         cur.data_written - prev.data_written * keep)
+
+
+class ProfileSampler(object):
+    """
+    Polls the cumulative profile of a volume and returns the deltas.
+
+    Reads info-cumulative, which unlike info does not start a new
+    interval on glusterd2, so other profile readers are not disturbed.
+    """
+
+    def __init__(self, client, vol_name):
+        """
+        :param client: glusterapi.Client
+        :param vol_name: (string) Volume Name, profiling must be started
+        """
+        self.client = client
+        self.vol_name = vol_name
+        self.last = None
+
+    def sample(self):
+        """
+        Read the profile of the volume.
+
+        :return: ProfileSample of the stats since the previous sample, or
+                 since profiling started on the first one
+        :raises: GlusterApiError on failure
+        """
+        _, info = self.client.volume_profile_info(self.vol_name,
+                                                  'info-cumulative')
+        cur = ProfileSample.from_info(info)
+        prev, self.last = self.last, cur
+        return cur if prev is None else delta(prev, cur)
@@ -0,0 +1,325 @@
+"""
+This module contains the declarative desired-state reconciler.
+
+A desired-state document describes the volumes of a cluster, with their
+options, state and bitrot, and the webhooks to register::
+
+    {
+        'volumes': {
+            'vol1': {
+                'create': {'replica': 3, 'distribute': 2},
+                'options': {'performance.cache-size': '256MB',
+                            'nfs.disable': None},
+                'state': 'Started',
+                'bitrot': True,
+            },
+        },
+        'webhooks': ['http://monitor:9000/events'],
+        'prune': False,
+    }
+
+``create`` holds the volume_create arguments of a volume that may not
+exist yet; without ``bricks`` the layout is planned with volume_plan. An
+option set to None is reset to its default. With ``prune`` the options
+and webhooks the document does not list are reset and deleted too.
+
+Reconciler.plan fetches the current state concurrently and returns only
+the operations needed to reach the document, so options already set to
+the wanted value are not sent again. Reconciler.apply runs them: the
+webhooks first, then every volume in parallel, each one in dependency
+order (create, reset, set, start or stop, bitrot).
+"""
+from collections import Counter
+
+from glusterapi.compat import string_types
+from glusterapi.concurrency import fan_out
+from glusterapi.exceptions import GlusterApiError, GlusterApiInvalidInputs
+
+STARTED = 'Started'
+STOPPED = 'Stopped'
+
+# volume_plan arguments accepted in a create spec without bricks
+_PLAN_ARGS = ('replica', 'arbiter', 'disperse', 'disperse_redundancy',
+              'distribute', 'brick_size', 'brick_root')
+
+
+def _text(value):
+    """Option value as glusterd2 stores it."""
+    if isinstance(value, bool):
+        return 'on' if value else 'off'
+    return str(value)
+
+
+class Operation(object):
+    """A client call of a reconcile plan."""
+
+    __slots__ = ('action', 'target', 'kwargs', 'detail', 'result', 'error',
+                 'done')
+
+    def __init__(self, action, target, kwargs, detail=''):
+        self.action = action
+        self.target = target
+        self.kwargs = kwargs
+        self.detail = detail
+        self.result = None
+        self.error = None
+        self.done = False
+
+    def run(self, client):
+        """Call the client method of the operation."""
+        return getattr(client, self.action)(**self.kwargs)
+
+    def describe(self):
+        line = '%s %s' % (self.action, self.target)
+        if self.detail:
+            line += ' ' + self.detail
+        return line
+
+    def __repr__(self):
+        return '<Operation %s>' % self.describe()
+
+
+class Plan(object):
+    """
+    Operations reconciling a cluster with a desired-state document.
+
+    ``stages`` is a list of stages run one after the other, each a list
+    of groups run in parallel, each group a list of operations run in
+    order.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    @property
+    def operations(self):
+        """(list) every Operation, in execution order."""
+        return [op for stage in self.stages for group in stage
+                for op in group]
+
+    @property
+    def failed(self):
+        """(list) operations that raised an error."""
+        return [op for op in self.operations if op.error is not None]
+
+    @property
+    def skipped(self):
+        """(list) operations not run after an earlier one failed."""
+        return [op for op in self.operations
+                if not op.done and op.error is None]
+
+    def describe(self):
+        """Return the plan as one line per operation."""
+        return [op.describe() for op in self.operations]
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __str__(self):
+        return '\n'.join(self.describe())
+
+
+class Reconciler(object):
+    """
+    Reconcile a cluster with desired-state documents.
+
+    :param client: glusterapi.Client
+    :param max_workers: (int) max number of volumes reconciled, or
+                        requests made, in parallel. Defaults to the
+                        max_workers of the client.
+    """
+
+    def __init__(self, client, max_workers=None):
+        self.client = client
+        self.max_workers = max_workers
+
+    def fetch(self, desired):
+        """
+        Fetch the current state of what desired manages, concurrently.
+
+        :param desired: (dict) desired-state document
+        :return: (dict) 'volumes': name -> volume dict, 'webhooks': list
+                 of urls, 'bitrot': name -> bool for the volumes whose
+                 bitrot is managed
+        :raises: GlusterApiError on failure
+        """
+        volumes = desired.get('volumes') or {}
+        items = [('volumes', None)]
+        if 'webhooks' in desired:
+            items.append(('webhooks', None))
+        items.extend(('bitrot', name) for name, spec in volumes.items()
+                     if spec.get('bitrot') is not None)
+
+        results = fan_out(self._fetch, items,
+                          self.max_workers or self.client.max_workers)
+        for result in results.values():
+            if isinstance(result, Exception):
+                raise result
+
+        current = {'volumes': {}, 'webhooks': [], 'bitrot': {}}
+        for volume in results[('volumes', None)][1]:
+            current['volumes'][volume['name']] = volume
+        if ('webhooks', None) in results:
+            current['webhooks'] = [
+                hook if isinstance(hook, string_types) else hook['url']
+                for hook in results[('webhooks', None)][1] or []]
+        for (kind, name), result in results.items():
+            if kind == 'bitrot':
+                current['bitrot'][name] = result
+        return current
+
+    def _fetch(self, item):
+        kind, name = item
+        if kind == 'volumes':
+            return self.client.volume_list()
+        if kind == 'webhooks':
+            return self.client.webhooks()
+        try:
+            _, status = self.client.bitrot_scrub_status(name)
+        except GlusterApiError as err:
+            if err.status_code == 404:
+                return False
+            raise
+        return status.get('state', 'Inactive') != 'Inactive'
+
+    def plan(self, desired, current=None):
+        """
+        Compute the operations reconciling the cluster with desired.
+
+        :param desired: (dict) desired-state document, see the module
+        :param current: (dict) state returned by fetch, fetched when None
+        :return: Plan
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        if current is None:
+            current = self.fetch(desired)
+        prune = desired.get('prune', False)
+
+        hooks = []
+        wanted_hooks = set()
+        for hook in desired.get('webhooks') or []:
+            if isinstance(hook, string_types):
+                hook = {'url': hook}
+            wanted_hooks.add(hook['url'])
+            if hook['url'] not in current['webhooks']:
+                kwargs = {'url': hook['url'],
+                          'token': hook.get('token', ''),
+                          'secret': hook.get('secret', '')}
+                hooks.append([Operation('webhook_add', hook['url'], kwargs)])
+        if prune and 'webhooks' in desired:
+            for url in current['webhooks']:
+                if url not in wanted_hooks:
+                    hooks.append([Operation('webhook_delete', url,
+                                            {'url': url})])
+
+        volumes = []
+        desired_volumes = desired.get('volumes') or {}
+        # Bricks planned for the volumes created by this plan
+        usage = Counter()
+        for name in sorted(desired_volumes):
+            ops = self._plan_volume(name, desired_volumes[name],
+                                    current['volumes'].get(name),
+                                    current['bitrot'].get(name, False),
+                                    prune, usage)
+            if ops:
+                volumes.append(ops)
+        return Plan([stage for stage in (hooks, volumes) if stage])
+
+    def _plan_volume(self, name, spec, volume, bitrot, prune, usage):
+        options = spec.get('options') or {}
+        wanted = dict((key, _text(value)) for key, value in options.items()
+                      if value is not None)
+        ops = []
+
+        if volume is None:
+            create = spec.get('create')
+            if create is None:
+                raise GlusterApiInvalidInputs(
+                    "Volume %s does not exist and has no create spec" % name)
+            kwargs = self._create_args(name, create, usage)
+            if wanted:
+                kwargs['options'] = dict(kwargs.get('options') or {},
+                                         **wanted)
+            ops.append(Operation('volume_create', name, kwargs,
+                                 '(%d bricks)' % len(kwargs['bricks'])))
+            volume = {'state': 'Created', 'options': kwargs.get('options')}
+
+        have = volume.get('options') or {}
+        reset = sorted(key for key, value in options.items()
+                       if value is None and key in have)
+        if prune and 'options' in spec:
+            reset = sorted(set(reset).union(key for key in have
+                                            if key not in options))
+        if reset:
+            ops.append(Operation('volume_reset', name,
+                                 {'vol_name': name, 'options': reset},
+                                 ' '.join(reset)))
+
+        changed = dict((key, value) for key, value in wanted.items()
+                       if have.get(key) != value)
+        if changed:
+            ops.append(Operation('volume_set', name,
+                                 {'vol_name': name, 'options': changed},
+                                 ' '.join('%s=%s' % item
+                                          for item in sorted(
+                                              changed.items()))))
+
+        state = spec.get('state')
+        if state == STARTED and volume.get('state') != STARTED:
+            ops.append(Operation('volume_start', name, {'vol_name': name}))
+        elif state == STOPPED and volume.get('state') == STARTED:
+            ops.append(Operation('volume_stop', name, {'vol_name': name}))
+        elif state not in (None, STARTED, STOPPED):
+            raise GlusterApiInvalidInputs("Invalid state %s of volume %s" %
+                                          (state, name))
+
+        if spec.get('bitrot') is not None and spec['bitrot'] != bitrot:
+            action = 'bitrot_enable' if spec['bitrot'] else 'bitrot_disable'
+            ops.append(Operation(action, name, {'volume': name}))
+        return ops
+
+    def _create_args(self, name, create, usage):
+        kwargs = dict(create)
+        if kwargs.get('bricks'):
+            kwargs['volume_name'] = name
+            return kwargs
+        plan_args = dict((key, kwargs.pop(key)) for key in _PLAN_ARGS
+                         if key in kwargs)
+        plan = self.client.volume_plan(name, usage=usage, **plan_args)
+        usage.update(plan.load()[1])
+        args = plan.create_args()
+        args.update(kwargs)
+        return args
+
+    def apply(self, desired, dry_run=False, current=None):
+        """
+        Reconcile the cluster with desired.
+
+        A failing operation stops the remaining ones of its volume, the
+        other volumes go on. Check ``plan.failed`` for the errors.
+
+        :param desired: (dict) desired-state document, see the module
+        :param dry_run: (bool) only plan, do not run anything
+        :param current: (dict) state returned by fetch, fetched when None
+        :return: Plan with the result or error of each operation
+        :raises: GlusterApiError or GlusterApiInvalidInputs if the plan
+                 cannot be computed
+        """
+        plan = self.plan(desired, current)
+        if dry_run:
+            return plan
+        for stage in plan.stages:
+            groups = dict(enumerate(stage))
+            fan_out(lambda index: self._run(groups[index]), list(groups),
+                    self.max_workers or self.client.max_workers)
+        return plan
+
+    def _run(self, ops):
+        for op in ops:
+            try:
+                op.result = op.run(self.client)
+            except Exception as err:
+                # Any failure, e.g. GlusterApiInvalidInputs, stops the group
+                op.error = err
+                return
+            op.done = True
@@ -0,0 +1,196 @@
+"""This module contains the retry policy and circuit breaker of a client."""
+import calendar
+import random
+import threading
+import time
+
+from glusterapi.compat import httplib
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# glusterd2 did not process the request, safe to retry any method
+UNPROCESSED_STATUSES = (httplib.SERVICE_UNAVAILABLE, 429)
+
+# The request may have been processed, retry idempotent methods only
+RETRY_STATUSES = (httplib.BAD_GATEWAY, httplib.SERVICE_UNAVAILABLE,
+                  httplib.GATEWAY_TIMEOUT, 429)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed request is sent again.
+
+    GET requests are retried on transport errors and on 502, 503, 504 and
+    429 responses. Mutations such as volume_create or peer_add are only
+    retried when glusterd2 cannot have acted on them: when the connection
+    could not be established, or on 503 and 429 responses. Delays grow
+    exponentially with full jitter and honour Retry-After.
+    """
+
+    def __init__(self, max_attempts=3, backoff_base=0.2, backoff_max=10.0,
+                 jitter=True, retry_statuses=RETRY_STATUSES,
+                 retry_mutations=False, max_retry_after=30.0):
+        """
+        :param max_attempts: (int) attempts per call, including the first
+        :param backoff_base: (float) delay in seconds before the 2nd attempt
+        :param backoff_max: (float) upper bound of the computed delay
+        :param jitter: (bool) pick a random delay up to the computed one
+        :param retry_statuses: (tuple) status codes worth retrying
+        :param retry_mutations: (bool) retry non idempotent requests on any
+                                retryable failure
+        :param max_retry_after: (float) longest Retry-After delay honoured,
+                                longer ones stop the retries
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_mutations = retry_mutations
+        self.max_retry_after = max_retry_after
+        self._random = random.Random()
+
+    def is_retryable(self, method, status_code=None, connect_error=False):
+        """
+        Check whether a failure may be retried.
+
+        :param method: (string) HTTP method
+        :param status_code: (int) response status, None on transport error
+        :param connect_error: (bool) the connection was never established
+        """
+        idempotent = self.retry_mutations or method in IDEMPOTENT_METHODS
+        if status_code is None:
+            return idempotent or connect_error
+        if status_code not in self.retry_statuses:
+            return False
+        return idempotent or status_code in UNPROCESSED_STATUSES
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Seconds to wait before the next attempt.
+
+        :param attempt: (int) number of the attempt that just failed
+        :param retry_after: (string) Retry-After header of the response
+        :return: (float) delay, or None if Retry-After asks for too long
+        """
+        if retry_after:
+            wait = parse_retry_after(retry_after)
+            if wait is not None:
+                if wait > self.max_retry_after:
+                    return None
+                return wait
+
+        wait = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        if self.jitter:
+            wait = self._random.uniform(0, wait)
+        return wait
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header, in seconds or as an HTTP date.
+
+    :return: (float) seconds to wait, None if unparsable
+    """
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import mktime_tz, parsedate_tz
+
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    if parsed[9] is None:
+        when = calendar.timegm(parsed[:9])
+    else:
+        when = mktime_tz(parsed)
+    return max(0.0, when - time.time())
+
+
+class CircuitBreaker(object):
+    """
+    Per-endpoint circuit breaker.
+
+    After ``failure_threshold`` consecutive failures of an endpoint its
+    circuit opens and calls fail fast for ``reset_timeout`` seconds. Then
+    a single trial call is let through: success closes the circuit,
+    failure opens it again. A trial call without an outcome after another
+    ``reset_timeout`` seconds, e.g. cancelled, lets a new trial through.
+
+    Clients key the circuits by (glusterd2 url, method, route template),
+    so a failing glusterd2 does not open the circuits of the others.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        :param failure_threshold: (int) consecutive failures to open
+        :param reset_timeout: (float) seconds before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def allow(self, endpoint):
+        """
+        Check whether a call to endpoint may be sent now.
+
+        :param endpoint: endpoint key, e.g. a route template
+        :return: (bool)
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is None or circuit['state'] == self.CLOSED:
+                return True
+            now = time.time()
+            if circuit['state'] == self.OPEN:
+                if now - circuit['opened'] < self.reset_timeout:
+                    return False
+            elif now - circuit['trial'] < self.reset_timeout:
+                # Half open, a trial call is already in flight
+                return False
+            circuit['state'] = self.HALF_OPEN
+            circuit['trial'] = now
+            return True
+
+    def record_success(self, endpoint):
+        with self._lock:
+            self._circuits.pop(endpoint, None)
+
+    def record_failure(self, endpoint):
+        with self._lock:
+            circuit = self._circuits.setdefault(
+                endpoint, {'state': self.CLOSED, 'failures': 0, 'opened': 0,
+                           'trial': 0})
+            circuit['failures'] += 1
+            tripped = circuit['failures'] >= self.failure_threshold
+            if tripped or circuit['state'] == self.HALF_OPEN:
+                circuit['state'] = self.OPEN
+                circuit['opened'] = time.time()
+
+    def release(self, endpoint):
+        """
+        Forget a call that ended without an outcome, e.g. cancelled.
+
+        An open circuit lets the next trial call through at once.
+        """
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            if circuit is not None and circuit['state'] == self.HALF_OPEN:
+                circuit['state'] = self.OPEN
+
+    def state(self, endpoint):
+        """Return the circuit state of an endpoint."""
+        with self._lock:
+            circuit = self._circuits.get(endpoint)
+            return self.CLOSED if circuit is None else circuit['state']
+
+    def states(self):
+        """Return the state of every endpoint with recorded failures."""
+        with self._lock:
+            return dict((endpoint, circuit['state'])
+                        for endpoint, circuit in self._circuits.items())
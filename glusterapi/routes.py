@@ -0,0 +1,96 @@
+"""This module maps glusterd2 request paths to their endpoint templates."""
+import re
+import threading
+
+TEMPLATES = (
+    '/version',
+    '/v1/volumes',
+    '/v1/volumes/{volname}',
+    '/v1/volumes/{volname}/start',
+    '/v1/volumes/{volname}/stop',
+    '/v1/volumes/{volname}/options',
+    '/v1/volumes/{volname}/options/{optname}',
+    '/v1/volumes/{volname}/profile/{option}',
+    '/v1/volumes/{volname}/bricks',
+    '/v1/volumes/{volname}/status',
+    '/v1/volumes/{volname}/bitrot/enable',
+    '/v1/volumes/{volname}/bitrot/disable',
+    '/v1/volumes/{volname}/bitrot/scrubondemand',
+    '/v1/volumes/{volname}/bitrot/scrubstatus',
+    '/v1/peers',
+    '/v1/peers/{peerid}',
+    '/v1/devices/{peerid}',
+    '/devices',
+    '/v1/events/webhook',
+    '/v1/snapshot',
+    '/v1/snapshot/{snapname}',
+    '/v1/snapshot/{snapname}/activate',
+    '/v1/snapshot/{snapname}/deactivate',
+    '/v1/geo-replication',
+    '/v1/geo-replication/{mastervolid}/{remotevolid}',
+    '/v1/geo-replication/{mastervolid}/{remotevolid}/start',
+    '/v1/geo-replication/{mastervolid}/{remotevolid}/stop',
+    '/v1/geo-replication/{mastervolid}/{remotevolid}/pause',
+    '/v1/geo-replication/{mastervolid}/{remotevolid}/resume',
+    '/v1/geo-replication/{mastervolid}/{remotevolid}/config',
+)
+
+_PARAM = re.compile(r'\{(\w+)\}')
+_MAX_MEMO = 4096
+
+
+def _compile(template):
+    return re.compile('^%s$' % _PARAM.sub(r'(?P<\1>[^/]+)', template))
+
+
+_ROUTES = [(tmpl, _compile(tmpl)) for tmpl in TEMPLATES]
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def match(path):
+    """
+    Find the endpoint template of a request path.
+
+    :param path: (string) request path, e.g. /v1/volumes/vol1/status
+    :return: (tuple) template and dict of its parameters, e.g.
+             ('/v1/volumes/{volname}/status', {'volname': 'vol1'}).
+             Unknown paths are returned unchanged with no parameters.
+    """
+    found = _memo.get(path)
+    if found is not None:
+        return found
+
+    found = (path, {})
+    for tmpl, regex in _ROUTES:
+        m = regex.match(path)
+        if m is not None:
+            found = (tmpl, m.groupdict())
+            break
+
+    with _memo_lock:
+        if len(_memo) >= _MAX_MEMO:
+            _memo.clear()
+        _memo[path] = found
+    return found
+
+
+def template(path):
+    """Return the endpoint template of a request path."""
+    return match(path)[0]
+
+
+def resource(path):
+    """
+    Split a request path into its collection and item paths.
+
+    :param path: (string) request path
+    :return: (tuple) collection path (e.g. /v1/volumes) and item path
+             (e.g. /v1/volumes/vol1), item is None for collection paths
+    """
+    parts = path.split('/')
+    # Paths outside /v1, like /devices, are their own collection
+    size = 3 if len(parts) > 2 and parts[1] == 'v1' else 2
+    collection = '/'.join(parts[:size])
+    item = '/'.join(parts[:size + 1]) if len(parts) > size else None
+    return collection, item
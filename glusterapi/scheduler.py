@@ -0,0 +1,359 @@
+"""
+This module contains the snapshot scheduler.
+
+A SnapshotPolicy takes snapshots of a volume on a cron schedule and keeps
+only the newest ones. The SnapshotScheduler runs many policies without
+letting them all fire at once: each volume is shifted by a stable offset
+within the ``stagger`` window, and at most ``max_concurrent`` snapshots
+are taken at the same time, so a schedule like ``0 * * * *`` on hundreds
+of volumes does not spike the brick I/O at the top of every hour.
+
+Schedules are in UTC, so that no scheduled minute is skipped or taken
+twice when the local clock changes for daylight saving time.
+"""
+import datetime
+import logging
+import threading
+import time
+import zlib
+
+from glusterapi.concurrency import fan_out
+from glusterapi.exceptions import GlusterApiError, GlusterApiInvalidInputs
+
+LOG = logging.getLogger(__name__)
+
+_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+# Name, lowest and highest value of the cron fields
+_FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day of month', 1, 31),
+           ('month', 1, 12), ('day of week', 0, 7))
+
+# Bound of the search for the next matching minute
+_MAX_YEARS = 5
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _parse_field(text, low, high):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = [int(v) for v in part.split('-', 1)]
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError("out of range")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule(object):
+    """
+    Five field cron expression: minute, hour, day of month, month and day
+    of week, e.g. ``30 */4 * * 1-5``. Fields take ``*``, numbers, ranges,
+    lists and ``/`` steps. As in cron, a day matches when either the day
+    of month or the day of week matches if both are restricted. The
+    @hourly, @daily, @weekly, @monthly and @yearly aliases are accepted.
+
+    :param expr: (string) cron expression
+    :raises: GlusterApiInvalidInputs if expr is invalid
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+        fields = _ALIASES.get(expr.strip(), expr).split()
+        if len(fields) != len(_FIELDS):
+            raise GlusterApiInvalidInputs("Cron expression %r needs %d "
+                                          "fields" % (expr, len(_FIELDS)))
+        parsed = []
+        for text, (name, low, high) in zip(fields, _FIELDS):
+            try:
+                parsed.append(_parse_field(text, low, high))
+            except ValueError:
+                raise GlusterApiInvalidInputs("Invalid %s %r in cron "
+                                              "expression %r" %
+                                              (name, text, expr))
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # Sunday is both 0 and 7
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, when):
+        in_month = when.day in self.days
+        in_week = (when.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def matches(self, when):
+        """Return True if the datetime when falls in a scheduled minute."""
+        if when.minute not in self.minutes or when.hour not in self.hours:
+            return False
+        return when.month in self.months and self._day_matches(when)
+
+    def next_after(self, when):
+        """
+        Return the first scheduled minute after the datetime when.
+
+        :raises: GlusterApiInvalidInputs if the expression never matches
+        """
+        when = when.replace(second=0, microsecond=0)
+        when += datetime.timedelta(minutes=1)
+        limit = when.replace(year=when.year + _MAX_YEARS, day=1)
+        while when < limit:
+            if when.month not in self.months:
+                year, month = divmod(when.month, 12)
+                when = when.replace(year=when.year + year, month=month + 1,
+                                    day=1, hour=0, minute=0)
+            elif not self._day_matches(when):
+                when = when.replace(hour=0, minute=0)
+                when += datetime.timedelta(days=1)
+            elif when.hour not in self.hours:
+                when = when.replace(minute=0)
+                when += datetime.timedelta(hours=1)
+            elif when.minute not in self.minutes:
+                when += datetime.timedelta(minutes=1)
+            else:
+                return when
+        raise GlusterApiInvalidInputs("Cron expression %r never matches" %
+                                      self.expr)
+
+    def __repr__(self):
+        return '<CronSchedule %s>' % self.expr
+
+
+class SnapshotPolicy(object):
+    """
+    Scheduled snapshots of a volume.
+
+    Snapshots are named ``<prefix>_<volume>_<YYYYmmdd-HHMM>`` after the
+    scheduled minute, so a slot is never taken twice, and only the ones
+    with this prefix are pruned.
+
+    :param volume: (string) volume name
+    :param schedule: (string) cron expression, see CronSchedule
+    :param retention: (int) number of snapshots to keep, None keeps all
+    :param prefix: (string) snapshot name prefix
+    :param description: (string) snapshot description
+    :param activate: (bool) activate the snapshots once taken
+    :raises: GlusterApiInvalidInputs on invalid schedule or retention
+    """
+
+    def __init__(self, volume, schedule, retention=None, prefix='sched',
+                 description='', activate=False):
+        if retention is not None and retention < 1:
+            raise GlusterApiInvalidInputs("Retention must keep at least "
+                                          "one snapshot")
+        self.volume = volume
+        self.schedule = CronSchedule(schedule)
+        self.retention = retention
+        self.prefix = prefix
+        self.description = description
+        self.activate = activate
+
+    @property
+    def name_prefix(self):
+        return '%s_%s_' % (self.prefix, self.volume)
+
+    def snapshot_name(self, slot):
+        """Return the snapshot name of a scheduled minute."""
+        return self.name_prefix + slot.strftime('%Y%m%d-%H%M')
+
+    def __repr__(self):
+        return '<SnapshotPolicy %s %s>' % (self.volume, self.schedule.expr)
+
+
+class SnapshotScheduler(object):
+    """
+    Take the snapshots of several policies on time.
+
+    Call run_pending() periodically, or start() to run it on a background
+    thread.
+
+    :param client: glusterapi.Client
+    :param policies: (list) SnapshotPolicy objects
+    :param max_concurrent: (int) max number of snapshots taken at once
+    :param stagger: (float) seconds over which the volumes scheduled at
+                    the same minute are spread
+    :param clock: callable returning the current time in seconds since
+                  the epoch
+    """
+
+    def __init__(self, client, policies=(), max_concurrent=2, stagger=300.0,
+                 clock=time.time):
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self.stagger = stagger
+        self.clock = clock
+        self._policies = []
+        self._due = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        for policy in policies:
+            self.add(policy)
+
+    def _now(self):
+        # Naive UTC datetime, free of daylight saving time gaps and folds
+        return _EPOCH + datetime.timedelta(seconds=self.clock())
+
+    def offset(self, policy):
+        """Seconds the snapshots of policy are delayed within stagger."""
+        if not self.stagger:
+            return 0.0
+        digest = zlib.crc32(policy.volume.encode('utf-8')) & 0xffffffff
+        return digest % 1000 / 1000.0 * self.stagger
+
+    def add(self, policy, now=None):
+        """
+        Add a policy, first due at its next scheduled minute.
+
+        :param policy: SnapshotPolicy
+        :param now: (datetime) current naive UTC time, defaults to the
+                    clock
+        """
+        now = self._now() if now is None else now
+        with self._lock:
+            self._policies.append(policy)
+            self._due[policy] = policy.schedule.next_after(now)
+
+    def remove(self, policy):
+        with self._lock:
+            self._policies.remove(policy)
+            del self._due[policy]
+
+    @property
+    def policies(self):
+        return list(self._policies)
+
+    def next_run(self):
+        """
+        Return when the next snapshot is due.
+
+        :return: (datetime) scheduled minute plus the stagger offset, in
+                 naive UTC, or None without policies
+        """
+        with self._lock:
+            times = [self._due[p] + datetime.timedelta(seconds=self.offset(p))
+                     for p in self._policies]
+        return min(times) if times else None
+
+    def run_pending(self, now=None):
+        """
+        Take the due snapshots and prune the old ones.
+
+        A policy due at several missed minutes takes a single snapshot,
+        for the latest of them.
+
+        :param now: (datetime) current naive UTC time, defaults to the
+                    clock
+        :return: (dict) policy -> name of the snapshot taken, or the
+                 exception raised for that policy
+        """
+        now = self._now() if now is None else now
+        due = {}
+        with self._lock:
+            for policy in self._policies:
+                slot = self._due[policy]
+                if slot + datetime.timedelta(
+                        seconds=self.offset(policy)) > now:
+                    continue
+                while True:
+                    following = policy.schedule.next_after(slot)
+                    if following > now:
+                        break
+                    slot = following
+                due[policy] = slot
+                self._due[policy] = following
+
+        return fan_out(lambda p: self._take(p, due[p]),
+                       sorted(due, key=self.offset),
+                       self.max_concurrent or self.client.max_workers)
+
+    def _take(self, policy, slot):
+        name = policy.snapshot_name(slot)
+        try:
+            self.client.snapshot_create(policy.volume, name,
+                                        description=policy.description)
+        except GlusterApiError as err:
+            # Taken already, e.g. by another scheduler
+            if err.status_code != 409:
+                LOG.warning("Snapshot %s of %s failed: %s", name,
+                            policy.volume, err)
+                raise
+        else:
+            if policy.activate:
+                self.client.snapshot_activate(name)
+        self.prune(policy)
+        return name
+
+    def prune(self, policy):
+        """
+        Delete the oldest snapshots of policy beyond its retention.
+
+        :return: (list) names of the deleted snapshots
+        :raises: GlusterApiError on failure
+        """
+        if policy.retention is None:
+            return []
+        _, lists = self.client.snapshot_list(policy.volume)
+        snaps = [snap for entry in lists or [] for snap in entry['snaps']
+                 if snap['volinfo']['name'].startswith(policy.name_prefix)]
+        snaps.sort(key=lambda snap: snap['volinfo']['name'])
+        deleted = []
+        for snap in snaps[:-policy.retention]:
+            name = snap['volinfo']['name']
+            if snap['volinfo'].get('state') == 'Started':
+                self.client.snapshot_deactivate(name)
+            self.client.snapshot_delete(name)
+            deleted.append(name)
+        return deleted
+
+    def start(self, interval=30.0):
+        """
+        Run run_pending on a background thread.
+
+        :param interval: (float) max seconds between two checks
+        """
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.run_pending()
+                except Exception:
+                    LOG.exception("Snapshot scheduler run failed")
+                wait = interval
+                upcoming = self.next_run()
+                if upcoming is not None:
+                    delta = upcoming - self._now()
+                    wait = min(interval, max(0.0, delta.total_seconds()))
+                self._stop.wait(wait)
+
+        self._thread = threading.Thread(target=run,
+                                        name='glusterapi-snapshots')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the background thread."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
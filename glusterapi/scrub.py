@@ -0,0 +1,301 @@
+"""
+This module contains the cluster-wide bitrot scrub orchestrator.
+
+A scrub reads every file of the bricks of a volume, so scrubbing many
+volumes at once saturates the disks of the peers they share. The
+ScrubOrchestrator queues on-demand scrubs and starts a volume only when
+each of its peers runs fewer than ``max_per_peer`` scrubs. Running scrubs
+are polled with bitrot_scrub_status, first after ``poll_min`` seconds, or
+half the usual duration of the volume, then backing off up to
+``poll_max``. A scrub still not seen running after ``start_polls`` polls
+fails with GlusterApiTimeout. Finished scrubs are kept as ScrubRecord
+history, with their duration and throughput, to find low-load windows for
+the next ones.
+"""
+import collections
+import time
+
+from glusterapi.concurrency import fan_out
+from glusterapi.exceptions import GlusterApiError, GlusterApiInvalidInputs
+from glusterapi.exceptions import GlusterApiTimeout
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class ScrubRecord(object):
+    """A finished, or failed, scrub of a volume."""
+
+    __slots__ = ('volume', 'started', 'finished', 'files', 'skipped',
+                 'errors', 'error')
+
+    def __init__(self, volume, started):
+        self.volume = volume
+        self.started = started
+        self.finished = None
+        self.files = 0
+        self.skipped = 0
+        self.errors = 0
+        self.error = None
+
+    @property
+    def duration(self):
+        """(float) seconds from start to completion, None if unfinished."""
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def throughput(self):
+        """(float) files scrubbed per second, None if unknown."""
+        duration = self.duration
+        if not duration or self.error is not None:
+            return None
+        return self.files / duration
+
+    def __repr__(self):
+        return '<ScrubRecord %s duration=%s files=%d%s>' % (
+            self.volume, self.duration, self.files,
+            ' error' if self.error is not None else '')
+
+
+class _Scrub(object):
+
+    __slots__ = ('volume', 'peers', 'record', 'baseline', 'seen_running',
+                 'polls', 'interval', 'next_poll')
+
+    def __init__(self, volume, peers):
+        self.volume = volume
+        self.peers = peers
+        self.record = None
+        self.baseline = {}
+        self.seen_running = False
+        self.polls = 0
+        self.interval = None
+        self.next_poll = None
+
+
+def _last_scrubs(status):
+    return dict((node.get('node'), node.get('last-scrub-time'))
+                for node in status.get('nodes') or [])
+
+
+class ScrubOrchestrator(object):
+    """
+    Run bitrot scrubs across volumes without overloading peers.
+
+    :param client: glusterapi.Client
+    :param max_per_peer: (int) max number of scrubs running on a peer
+    :param poll_min: (float) seconds before the first status poll
+    :param poll_max: (float) max seconds between two status polls
+    :param start_polls: (int) status polls after which a scrub not seen
+                        running yet fails
+    :param history_size: (int) number of ScrubRecord kept
+    :param max_workers: (int) max number of requests in flight, defaults
+                        to the max_workers of the client
+    :param clock: callable returning the current time in seconds
+    :param sleep: callable sleeping for the given seconds
+    """
+
+    def __init__(self, client, max_per_peer=1, poll_min=5.0, poll_max=60.0,
+                 start_polls=10, history_size=1000, max_workers=None,
+                 clock=time.time, sleep=time.sleep):
+        if max_per_peer < 1:
+            raise GlusterApiInvalidInputs("max_per_peer must be positive")
+        self.client = client
+        self.max_per_peer = max_per_peer
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.start_polls = start_polls
+        self.max_workers = max_workers
+        self.clock = clock
+        self.sleep = sleep
+        self.queue = collections.deque()
+        self.running = {}
+        self._history = collections.deque(maxlen=history_size)
+
+    def submit(self, volumes):
+        """
+        Queue scrubs of volumes, the ones queued or running are skipped.
+
+        :param volumes: (list) volume names
+        :raises: GlusterApiError if the volume list cannot be fetched
+        """
+        queued = set(scrub.volume for scrub in self.queue)
+        volumes = [v for v in volumes
+                   if v not in queued and v not in self.running]
+        if not volumes:
+            return
+        _, infos = self.client.volume_list()
+        peers = {}
+        for info in infos:
+            peers[info['name']] = frozenset(
+                brick['peer-id'] for subvol in info.get('subvols') or []
+                for brick in subvol.get('bricks') or [])
+        for volume in volumes:
+            if volume in peers:
+                self.queue.append(_Scrub(volume, peers[volume]))
+                continue
+            record = ScrubRecord(volume, self.clock())
+            record.error = GlusterApiError("volume %s not found" % volume,
+                                           status_code=404)
+            self._history.append(record)
+
+    def _peer_load(self):
+        load = collections.Counter()
+        for scrub in self.running.values():
+            load.update(scrub.peers)
+        return load
+
+    def _startable(self):
+        """Pop the queued scrubs whose peers all have a free slot."""
+        load = self._peer_load()
+        selected = []
+        for scrub in list(self.queue):
+            if all(load[peer] < self.max_per_peer for peer in scrub.peers):
+                load.update(scrub.peers)
+                self.queue.remove(scrub)
+                selected.append(scrub)
+        return selected
+
+    def expected_duration(self, volume):
+        """Return the mean duration of past scrubs of volume, or None."""
+        durations = [r.duration for r in self._history
+                     if r.volume == volume and r.error is None]
+        if not durations:
+            return None
+        return sum(durations) / len(durations)
+
+    def _start(self, scrub):
+        _, status = self.client.bitrot_scrub_status(scrub.volume)
+        scrub.baseline = _last_scrubs(status)
+        self.client.bitrot_scrub(scrub.volume)
+        return self.clock()
+
+    def _finish(self, scrub, now, error=None):
+        scrub.record.finished = now
+        scrub.record.error = error
+        del self.running[scrub.volume]
+        self._history.append(scrub.record)
+        return scrub.record
+
+    def step(self):
+        """
+        Start the scrubs that fit and poll the running ones due.
+
+        :return: (list) ScrubRecord of the scrubs finished in this step
+        """
+        finished = []
+        starting = self._startable()
+        for scrub in starting:
+            self.running[scrub.volume] = scrub
+        max_workers = self.max_workers or self.client.max_workers
+        results = fan_out(self._start, starting, max_workers)
+        for scrub, result in results.items():
+            scrub.record = ScrubRecord(scrub.volume, self.clock())
+            if isinstance(result, Exception):
+                finished.append(self._finish(scrub, self.clock(), result))
+                continue
+            scrub.record.started = result
+            expected = self.expected_duration(scrub.volume)
+            scrub.interval = self.poll_min
+            if expected is not None:
+                scrub.interval = min(self.poll_max,
+                                     max(self.poll_min, expected / 2.0))
+            scrub.next_poll = result + scrub.interval
+
+        now = self.clock()
+        due = [scrub for scrub in self.running.values()
+               if scrub.next_poll <= now]
+        results = fan_out(
+            lambda scrub: self.client.bitrot_scrub_status(scrub.volume),
+            due, max_workers)
+        now = self.clock()
+        for scrub, result in results.items():
+            if isinstance(result, Exception):
+                finished.append(self._finish(scrub, now, result))
+            elif self._update(scrub, result[1], now):
+                finished.append(self._finish(scrub, now))
+            elif not scrub.seen_running and scrub.polls >= self.start_polls:
+                error = GlusterApiTimeout(
+                    "scrub of volume %s not started after %d polls" %
+                    (scrub.volume, scrub.polls))
+                finished.append(self._finish(scrub, now, error))
+        return finished
+
+    def _update(self, scrub, status, now):
+        """Account a status poll, return True if the scrub is over."""
+        scrub.polls += 1
+        nodes = status.get('nodes') or []
+        if any(node.get('scrub-running') == 'Yes' for node in nodes):
+            scrub.seen_running = True
+        elif scrub.seen_running or _last_scrubs(status) != scrub.baseline:
+            record = scrub.record
+            record.files = sum(_int(n.get('num-scrubbed-files'))
+                               for n in nodes)
+            record.skipped = sum(_int(n.get('num-skipped-files'))
+                                 for n in nodes)
+            record.errors = sum(_int(n.get('error-count')) for n in nodes)
+            return True
+        scrub.interval = min(self.poll_max, scrub.interval * 2)
+        scrub.next_poll = now + scrub.interval
+        return False
+
+    def next_poll(self):
+        """Return the time of the next due status poll, or None."""
+        times = [scrub.next_poll for scrub in self.running.values()]
+        return min(times) if times else None
+
+    def run(self, volumes=(), timeout=None):
+        """
+        Scrub volumes, and the queued ones, until all are finished.
+
+        :param volumes: (list) volume names to queue first
+        :param timeout: (float) seconds after which to stop waiting, the
+                        running scrubs go on
+        :return: (list) ScrubRecord of the finished scrubs
+        """
+        self.submit(volumes)
+        deadline = None if timeout is None else self.clock() + timeout
+        finished = []
+        while self.queue or self.running:
+            finished.extend(self.step())
+            upcoming = self.next_poll()
+            if upcoming is None:
+                continue
+            now = self.clock()
+            if deadline is not None and now >= deadline:
+                break
+            wait = upcoming - now
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            if wait > 0:
+                self.sleep(wait)
+        return finished
+
+    def history(self, volume=None):
+        """Return the ScrubRecord history, oldest first."""
+        return [r for r in self._history
+                if volume is None or r.volume == volume]
+
+    def throughput_by_hour(self):
+        """
+        Average scrub throughput per UTC hour of day the scrubs started.
+
+        Hours with the highest throughput are the ones where the disks
+        were the least loaded. They are UTC hours, like the schedules of
+        SnapshotScheduler, whatever the timezone of the host.
+
+        :return: (dict) UTC hour -> files scrubbed per second
+        """
+        samples = collections.defaultdict(list)
+        for record in self._history:
+            if record.throughput is not None:
+                hour = time.gmtime(record.started).tm_hour
+                samples[hour].append(record.throughput)
+        return dict((hour, sum(values) / len(values))
+                    for hour, values in samples.items())
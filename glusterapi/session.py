@@ -0,0 +1,162 @@
+"""
+This module contains the pooled HTTP sessions used to talk to glusterd2.
+
+A session manager is the transport of a client. The default one sends
+HTTP/1.1 requests with requests, glusterapi.http2 has an HTTP/2 one
+multiplexing concurrent requests over a single connection per endpoint.
+"""
+import threading
+
+from glusterapi.compat import string_types
+from glusterapi.exceptions import GlusterApiInvalidInputs
+
+
+class SessionManager(object):
+    """
+    Thread-safe owner of the ``requests.Session`` shared by a client.
+
+    The session is created lazily on first use and keeps connections to
+    glusterd2 alive, so repeated calls reuse an established TCP (and TLS)
+    connection instead of opening a new one per request.
+
+    requests is imported on first use, it is the slowest import of the
+    library and not needed until a call is made.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, keep_alive=True, connect_timeout=None,
+                 read_timeout=None):
+        """
+        :param pool_connections: (int) number of per-host pools to cache
+        :param pool_maxsize: (int) max connections kept open per host
+        :param pool_block: (bool) wait for a free connection instead of
+                           opening more than pool_maxsize per host
+        :param keep_alive: (bool) reuse connections between requests
+        :param connect_timeout: (float) seconds to wait for a connection
+        :param read_timeout: (float) seconds to wait for a response
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def errors(self):
+        """Exceptions raised by request() when no response was received."""
+        import requests
+        return (requests.RequestException,)
+
+    @property
+    def timeout(self):
+        if self.connect_timeout is None and self.read_timeout is None:
+            return None
+        return self.connect_timeout, self.read_timeout
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        # unix:// endpoints, see glusterapi.unix
+        from glusterapi.unix import SCHEME, UnixAdapter
+        session.mount(SCHEME + '://',
+                      UnixAdapter(pool_maxsize=self.pool_maxsize,
+                                  pool_block=self.pool_block))
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def session(self):
+        """Return the shared session, creating it on first use."""
+        session = self._session
+        if session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+                session = self._session
+        return session
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the pooled session.
+
+        :param method: (string) HTTP method
+        :param url: (string) absolute url
+        :return: requests.Response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session().request(method, url, **kwargs)
+
+    @staticmethod
+    def is_connect_error(err):
+        """
+        Check whether a request failed before reaching glusterd2.
+
+        :param err: exception raised by request()
+        :return: (bool) True if no connection could be established
+        """
+        import requests
+        from urllib3.exceptions import NewConnectionError
+
+        if isinstance(err, requests.exceptions.ConnectTimeout):
+            return True
+        if not isinstance(err, requests.exceptions.ConnectionError):
+            return False
+        reason = err.args[0] if err.args else None
+        reason = getattr(reason, 'reason', reason)
+        return isinstance(reason, NewConnectionError)
+
+    def close(self):
+        """Close all pooled connections. The session is recreated on reuse."""
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+HTTP1 = 'http1'
+HTTP2 = 'http2'
+H2C = 'h2c'
+TRANSPORTS = (HTTP1, HTTP2, H2C)
+
+
+def get_transport(transport=None, default=SessionManager):
+    """
+    Resolve a transport to its session manager class.
+
+    :param transport: None for default, 'http1', 'http2' for HTTP/2 over
+                      TLS falling back to HTTP/1.1, 'h2c' for HTTP/2 over
+                      plain TCP without upgrade, or a session manager
+                      class
+    :param default: session manager class returned for None
+    :return: session manager class
+    :raises: GlusterApiInvalidInputs if the transport is unknown or its
+             library is not installed
+    """
+    if transport is None:
+        return default
+    if not isinstance(transport, string_types):
+        return transport
+    if transport == HTTP1:
+        return SessionManager
+    if transport not in TRANSPORTS:
+        raise GlusterApiInvalidInputs("Unknown transport %s, use one of %s" %
+                                      (transport, ', '.join(TRANSPORTS)))
+    try:
+        from glusterapi import http2
+    except ImportError:
+        raise GlusterApiInvalidInputs("The %s transport needs httpx and h2, "
+                                      "install glusterapi-python[http2]" %
+                                      transport)
+    if transport == H2C:
+        return http2.H2cSessionManager
+    return http2.Http2SessionManager
@@ -1,8 +1,7 @@
-import httplib
-import json
-
 from glusterapi.common import BaseAPI, validate_volume_name
+from glusterapi.compat import httplib
 from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.models import Snapshot
 
 
 def validate_snap_name(snap_name):
@@ -35,7 +34,7 @@ class SnapshotsApis(BaseAPI):
             "force": force
         }
         return self._handle_request(self._post, httplib.CREATED,
-                                    "/v1/snapshot", json.dumps(req))
+                                    "/v1/snapshot", self.codec.dumps(req))
 
     def snapshot_activate(self, snap_name, force=False):
         """
@@ -52,7 +51,7 @@ class SnapshotsApis(BaseAPI):
         }
         return self._handle_request(self._post, httplib.OK,
                                     "/v1/snapshot/%s/activate" % snap_name,
-                                    json.dumps(
+                                    self.codec.dumps(
                                         req))
 
     def snapshot_deactivate(self, snap_name):
@@ -68,25 +67,45 @@ class SnapshotsApis(BaseAPI):
                                     "/v1/snapshot/%s/deactivate" % snap_name,
                                     None)
 
-    def snapshot_list(self, vol_name):
+    def snapshot_list(self, vol_name=None):
         """
         Gluster list snapshot.
 
-        :param vol_name: (string) volume  name
+        :param vol_name: (string) volume  name, every volume when None
+        :return: (list) one dict per volume with its name in parent-name
+                 and its snapshot infos in snaps
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        param = None
+        if vol_name is not None:
+            validate_volume_name(vol_name)
+            param = {"volume": vol_name}
+        return self._handle_request(self._get, httplib.OK, "/v1/snapshot",
+                                    param)
+
+    def snapshot_delete(self, snap_name):
+        """
+        Gluster delete snapshot.
+
+        :param snap_name: (string) snapshot name
         :raises: GlusterApiError or GlusterApiInvalidInputs on failure
         """
-        validate_volume_name(vol_name)
-        # TODO need to be implemented
-        pass
+        validate_snap_name(snap_name)
+
+        return self._handle_request(self._delete, httplib.NO_CONTENT,
+                                    "/v1/snapshot/%s" % snap_name, None)
 
-    def snapshot_info(self, snap_name):
+    def snapshot_info(self, snap_name, typed=False):
         """
         Gluster snapshot info.
 
         :param snap_name: (string) snapshot  name
+        :param typed: (bool) return glusterapi.models objects instead of
+                      dicts
         :raises: GlusterApiError or GlusterApiInvalidInputs on failure
         """
         validate_snap_name(snap_name)
 
         return self._handle_request(self._get, httplib.OK,
-                                    "/v1/snapshot/%s" % snap_name)
+                                    "/v1/snapshot/%s" % snap_name,
+                                    model=Snapshot if typed else None)
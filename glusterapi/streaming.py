@@ -0,0 +1,156 @@
+"""This module contains the incremental decoder for JSON list responses."""
+import re
+
+from glusterapi.codec import JsonCodec
+
+_STRUCTURE = re.compile(br'[\[\]{}",]')
+_STRING_END = re.compile(br'["\\]')
+_WHITESPACE = b' \t\r\n'
+
+CHUNK_SIZE = 64 * 1024
+
+
+class JsonArrayDecoder(object):
+    """
+    Incremental decoder for a top level JSON array.
+
+    Bytes are fed as they arrive from the network and every element is
+    decoded as soon as it is complete, so only the element being read is
+    ever held in memory, not the whole response body.
+    """
+
+    def __init__(self, loads=None):
+        """
+        :param loads: callable decoding a single element from bytes,
+                      defaults to the standard library
+        """
+        self._loads = JsonCodec.loads if loads is None else loads
+        # Appended to in place, so that an element arriving in many
+        # chunks is not copied again on every chunk
+        self._buf = bytearray()
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._after_comma = False
+        self.done = False
+
+    def _element(self, buf, end):
+        return bytes(buf[self._start:end]).strip(_WHITESPACE)
+
+    def _decode(self, data):
+        return self._loads(data)
+
+    def feed(self, data):
+        """
+        Add bytes and decode the elements they complete.
+
+        :param data: (bytes) next chunk of the response body
+        :return: (list) elements completed by this chunk
+        """
+        if self.done:
+            if data.strip(_WHITESPACE):
+                raise ValueError("Extra data after JSON array")
+            return []
+
+        buf = self._buf
+        buf += data
+        pos = self._pos
+        items = []
+        while pos < len(buf):
+            if self._in_string:
+                m = _STRING_END.search(buf, pos)
+                if m is None:
+                    pos = len(buf)
+                    break
+                pos = m.start()
+                if buf[pos:pos + 1] == b'\\':
+                    if pos + 1 >= len(buf):
+                        # Escape split across chunks, wait for more data
+                        break
+                    pos += 2
+                    continue
+                self._in_string = False
+                pos += 1
+                continue
+
+            if self._depth == 0:
+                stripped = buf[pos:].lstrip(_WHITESPACE)
+                if not stripped:
+                    pos = len(buf)
+                    break
+                if stripped[:1] != b'[':
+                    raise ValueError("Response is not a JSON array")
+                pos = len(buf) - len(stripped) + 1
+                self._depth = 1
+                self._start = pos
+                continue
+
+            m = _STRUCTURE.search(buf, pos)
+            if m is None:
+                pos = len(buf)
+                break
+            pos = m.end()
+            char = m.group()
+            if char == b'"':
+                self._in_string = True
+            elif char in (b'[', b'{'):
+                self._depth += 1
+            elif self._depth > 1:
+                if char in (b']', b'}'):
+                    self._depth -= 1
+            elif char == b',':
+                element = self._element(buf, pos - 1)
+                if not element:
+                    raise ValueError("Empty element in JSON array")
+                items.append(self._decode(element))
+                self._start = pos
+                self._after_comma = True
+            elif char == b']':
+                element = self._element(buf, pos - 1)
+                if element:
+                    items.append(self._decode(element))
+                elif self._after_comma:
+                    raise ValueError("Empty element in JSON array")
+                self._depth = 0
+                self.done = True
+                if buf[pos:].strip(_WHITESPACE):
+                    raise ValueError("Extra data after JSON array")
+                del buf[:]
+                pos = 0
+                self._start = None
+                break
+
+        # Drop everything before the element being read
+        if self._start is not None and self._start > 0:
+            del buf[:self._start]
+            pos -= self._start
+            self._start = 0
+        elif self._start is None:
+            del buf[:pos]
+            pos = 0
+        self._pos = pos
+        return items
+
+    def close(self):
+        """
+        Check that the whole array was received.
+
+        :raises: ValueError if the body ended in the middle of the array
+        """
+        if not self.done:
+            raise ValueError("Truncated JSON array")
+
+
+def iter_json_array(chunks, loads=None):
+    """
+    Yield the elements of a JSON array read from an iterable of chunks.
+
+    :param chunks: iterable of bytes, e.g. Response.iter_content()
+    :param loads: callable decoding a single element from bytes
+    """
+    decoder = JsonArrayDecoder(loads)
+    for chunk in chunks:
+        for item in decoder.feed(chunk):
+            yield item
+    decoder.close()
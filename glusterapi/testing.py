@@ -0,0 +1,1230 @@
+"""
+This module contains an in-process glusterd2 stand-in.
+
+``FakeGlusterd2`` serves the REST routes used by the client from an
+in-memory cluster, so the client can be tested and benchmarked without a
+real glusterd2. Latency and errors can be injected to exercise retries
+and timeouts.
+
+Example::
+
+    with FakeGlusterd2(peers=3, volumes=10) as gd2:
+        client = Client(gd2.endpoint)
+        client.volume_list()
+"""
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+import jwt
+import requests
+
+from glusterapi import routes
+from glusterapi.compat import (BaseHTTPRequestHandler, HTTPServer,
+                               ThreadingMixIn, UnixStreamServer, httplib,
+                               parse_qs, queue, urlparse)
+
+
+class FakeGlusterd2Error(Exception):
+    def __init__(self, status_code, message):
+        super(FakeGlusterd2Error, self).__init__(message)
+        self.status_code = status_code
+
+
+class FakeCluster(object):
+    """In-memory peers, devices, volumes, snapshots and webhooks."""
+
+    def __init__(self, peers=3, volumes=0, bricks_per_volume=3,
+                 devices_per_peer=1, seed=None):
+        self.random = random.Random(seed)
+        self.peers = OrderedDict()
+        self.devices = OrderedDict()
+        self.volumes = OrderedDict()
+        self.snapshots = OrderedDict()
+        self.webhooks = OrderedDict()
+        self.bitrot = {}
+        # On-demand scrub start times, and how long a scrub takes and
+        # how many files it scrubs per peer
+        self.scrubs = {}
+        self.scrub_time = 0.0
+        self.scrub_files = 1000
+        self.georep = OrderedDict()
+        # Seconds behind of the sessions per master volume, and the
+        # brick paths whose georep worker is faulty
+        self.georep_lag = {}
+        self.georep_faulty = set()
+        # Running volume profiles, and the load factor of the FOPs of a
+        # (volume name, brick path), 1 by default
+        self.profiles = {}
+        self.profile_load = {}
+        # Shared by the stand-ins serving this cluster
+        self.lock = threading.Lock()
+
+        for i in range(peers):
+            peer = self.add_peer('peer%d' % i, zone='zone%d' % (i % 3))
+            for j in range(devices_per_peer):
+                self.add_device(peer['id'], '/dev/sd%s' % chr(ord('b') + j))
+
+        peer_ids = list(self.peers)
+        for i in range(volumes):
+            bricks = []
+            for j in range(bricks_per_volume):
+                peer_id = peer_ids[(i + j) % len(peer_ids)]
+                bricks.append({'peerid': peer_id,
+                               'path': '/bricks/vol%d/brick%d' % (i, j)})
+            replica = bricks_per_volume if bricks_per_volume > 1 else 0
+            subvol = {
+                'type': 'replicate' if replica else 'distribute',
+                'bricks': bricks,
+                'replica': replica,
+            }
+            volume = self.create_volume({'name': 'vol%d' % i,
+                                         'subvols': [subvol]})
+            volume['state'] = 'Started'
+
+    def uuid(self):
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def add_peer(self, host, metadata=None, zone=''):
+        peer_id = self.uuid()
+        name = host.split(':')[0]
+        peer = {
+            'id': peer_id,
+            'name': name,
+            'peer-addresses': ['%s:24008' % name],
+            'client-addresses': ['%s:24007' % name],
+            'online': True,
+            'pid': self.random.randint(1000, 65535),
+            'metadata': metadata or {},
+            'zone': zone,
+        }
+        self.peers[peer_id] = peer
+        self.devices[peer_id] = []
+        return peer
+
+    def add_device(self, peer_id, device):
+        if peer_id not in self.peers:
+            raise FakeGlusterd2Error(httplib.NOT_FOUND, "peer not found")
+        info = {
+            'device': device,
+            'state': 'enabled',
+            'peer-id': peer_id,
+            'avail-size': 1 << 40,
+            'extent-size': 4 << 20,
+            'used': False,
+        }
+        self.devices[peer_id].append(info)
+        return info
+
+    def _brick(self, volume_id, volume_name, brick):
+        peer = self.peers.get(brick['peerid'])
+        if peer is None:
+            raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                     "peer %s not found" % brick['peerid'])
+        return {
+            'id': self.uuid(),
+            'path': brick['path'],
+            'peer-id': peer['id'],
+            'hostname': peer['name'],
+            'volume-id': volume_id,
+            'volume-name': volume_name,
+            'type': brick.get('type', 'Brick'),
+        }
+
+    def create_volume(self, req):
+        name = req.get('name')
+        if not name:
+            raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                     "volume name not specified")
+        if name in self.volumes:
+            raise FakeGlusterd2Error(httplib.CONFLICT,
+                                     "volume already exists")
+        volume_id = self.uuid()
+        subvols = []
+        for i, subvol in enumerate(req.get('subvols') or []):
+            bricks = [self._brick(volume_id, name, brick)
+                      for brick in subvol.get('bricks') or []]
+            subvols.append({
+                'name': '%s-%s-%d' % (name, subvol.get('type'), i),
+                'type': subvol.get('type'),
+                'bricks': bricks,
+                'replica-count': subvol.get('replica', 0),
+                'arbiter-count': subvol.get('arbiter', 0),
+                'disperse-count': subvol.get('disperse-count', 0),
+            })
+        volume = {
+            'id': volume_id,
+            'name': name,
+            'type': subvols[0]['type'] if subvols else 'distribute',
+            'transport': req.get('transport', 'tcp'),
+            'distribute-count': len(subvols),
+            'options': dict(req.get('options') or {}),
+            'subvols': subvols,
+            'state': 'Created',
+            'metadata': dict(req.get('metadata') or {}),
+            'version': 1,
+        }
+        self.volumes[name] = volume
+        return volume
+
+    def volume(self, name):
+        volume = self.volumes.get(name)
+        if volume is None:
+            raise FakeGlusterd2Error(httplib.NOT_FOUND, "volume not found")
+        return volume
+
+    def bricks(self, volume):
+        for subvol in volume['subvols']:
+            for brick in subvol['bricks']:
+                yield brick
+
+    def snapshot(self, name):
+        snap = self.snapshots.get(name)
+        if snap is None:
+            raise FakeGlusterd2Error(httplib.NOT_FOUND, "snapshot not found")
+        return snap
+
+
+class FakeGlusterd2(object):
+    """
+    glusterd2 REST API stand-in served over HTTP on a local port.
+
+    Requests are routed by endpoint template (see glusterapi.routes) to
+    handlers working on a FakeCluster. When ``secret`` is set every
+    request must carry a valid JWT whose qsh matches its method and path.
+    """
+
+    def __init__(self, peers=3, volumes=0, bricks_per_volume=3,
+                 devices_per_peer=1, user=None, secret=None, latency=0,
+                 error_rate=0, error_status=httplib.SERVICE_UNAVAILABLE,
+                 seed=None, host='127.0.0.1', port=0, cluster=None,
+                 http2=False, unix_socket=None):
+        """
+        :param peers: (int) number of peers in the cluster
+        :param volumes: (int) number of started volumes to create
+        :param bricks_per_volume: (int) replica count of those volumes
+        :param devices_per_peer: (int) devices added to each peer
+        :param user: (string) expected JWT issuer
+        :param secret: (string) JWT secret, None disables authentication
+        :param latency: (float) seconds added to every response
+        :param error_rate: (float) share of requests failed on purpose
+        :param error_status: (int) status code of injected errors
+        :param seed: seed for ids and error injection
+        :param host: (string) address to listen on
+        :param port: (int) port to listen on, 0 picks a free one
+        :param cluster: FakeCluster to serve, shared with other stand-ins
+                        acting as its peers. The sizing arguments are
+                        ignored when given.
+        :param http2: (bool) serve HTTP/2 over plain TCP (h2c with prior
+                      knowledge) instead of HTTP/1.1, needs h2
+        :param unix_socket: (string) path of a Unix domain socket to
+                            listen on instead of host and port
+        """
+        if cluster is None:
+            cluster = FakeCluster(peers=peers, volumes=volumes,
+                                  bricks_per_volume=bricks_per_volume,
+                                  devices_per_peer=devices_per_peer,
+                                  seed=seed)
+        self.cluster = cluster
+        self.user = user
+        self.secret = secret
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.host = host
+        self.port = port
+        self.http2 = http2
+        self.unix_socket = unix_socket
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = cluster.lock
+        self._server = None
+        self._thread = None
+        self._events = queue.Queue()
+        self._delivery = None
+
+    @property
+    def endpoint(self):
+        if self.unix_socket is not None:
+            return 'unix://' + self.unix_socket
+        return 'http://%s:%d' % (self.host, self.port)
+
+    @property
+    def accepted(self):
+        """(int) number of client connections accepted."""
+        return self._server.accepted if self._server is not None else 0
+
+    def start(self):
+        if self.unix_socket is not None:
+            if os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+            self._server = _ThreadingUnixHTTPServer(
+                self.unix_socket, _make_handler(self, tcp=False))
+        elif self.http2:
+            self._server = _H2Server((self.host, self.port), self)
+        else:
+            self._server = _ThreadingHTTPServer((self.host, self.port),
+                                                _make_handler(self))
+        if self.unix_socket is None:
+            self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        self._delivery = threading.Thread(target=self._deliver_events)
+        self._delivery.daemon = True
+        self._delivery.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server.close_connections()
+            self._events.put(None)
+            self._delivery.join()
+            self._thread.join()
+            self._server = None
+            if self.unix_socket is not None:
+                os.unlink(self.unix_socket)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _authenticate(self, method, path, headers):
+        if self.secret is None:
+            return
+        auth = headers.get('Authorization') or ''
+        if not auth.lower().startswith('bearer '):
+            raise FakeGlusterd2Error(httplib.UNAUTHORIZED,
+                                     "missing bearer token")
+        try:
+            claims = jwt.decode(auth[7:], self.secret, algorithms=['HS256'])
+        except jwt.InvalidTokenError as err:
+            raise FakeGlusterd2Error(httplib.UNAUTHORIZED, str(err))
+        if self.user is not None and claims.get('iss') != self.user:
+            raise FakeGlusterd2Error(httplib.UNAUTHORIZED, "invalid issuer")
+        val = b'%s&%s' % (method.encode('utf8'), path.encode('utf8'))
+        if claims.get('qsh') != hashlib.sha256(val).hexdigest():
+            raise FakeGlusterd2Error(httplib.UNAUTHORIZED, "invalid qsh")
+
+    def _emit(self, name, params, req):
+        """Queue an event for delivery to the registered webhooks."""
+        if not self.cluster.webhooks:
+            return
+        params = dict(params)
+        if req.get('name'):
+            params.setdefault('volname', req['name'])
+        for key in ('volname', 'snapname'):
+            if req.get(key):
+                params.setdefault(key, req[key])
+        data = dict((_EVENT_KEYS[key], value)
+                    for key, value in params.items())
+        event = {
+            'id': str(uuid.UUID(int=self.cluster.random.getrandbits(128))),
+            'name': name,
+            'origin': next(iter(self.cluster.peers), None),
+            'data': data,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        }
+        for hook in self.cluster.webhooks.values():
+            self._events.put((hook, event))
+
+    def _deliver_events(self):
+        session = requests.Session()
+        try:
+            while True:
+                item = self._events.get()
+                if item is None:
+                    return
+                hook, event = item
+                if hook.get('secret'):
+                    now = int(time.time())
+                    bearer = jwt.encode({'iss': 'gd2', 'iat': now,
+                                         'exp': now + 30},
+                                        hook['secret'], algorithm='HS256')
+                    if isinstance(bearer, bytes):
+                        bearer = bearer.decode('ascii')
+                else:
+                    bearer = hook.get('token') or ''
+                try:
+                    session.post(hook['url'], data=json.dumps(event),
+                                 headers={'Authorization': 'bearer ' + bearer},
+                                 timeout=5)
+                except requests.RequestException:
+                    pass
+        finally:
+            session.close()
+
+    def handle(self, method, path, query=None, headers=None, body=b''):
+        """
+        Serve one request.
+
+        :param method: (string) HTTP method
+        :param path: (string) request path without query string
+        :param query: (dict) query parameters, name -> list of values
+        :param headers: mapping of request headers
+        :param body: (bytes) request body
+        :return: (tuple) status code and JSON encoded body, empty for 204
+        """
+        template, params = routes.match(path)
+        with self._lock:
+            self.calls[(method, template)] += 1
+            inject_error = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            self._authenticate(method, path, headers or {})
+            if inject_error:
+                raise FakeGlusterd2Error(self.error_status, "injected error")
+            handler = _HANDLERS.get((method, template))
+            if handler is None:
+                if any(t == template for _, t in _HANDLERS):
+                    raise FakeGlusterd2Error(httplib.METHOD_NOT_ALLOWED,
+                                             "method not allowed")
+                raise FakeGlusterd2Error(httplib.NOT_FOUND, "not found")
+            req = json.loads(body.decode('utf-8')) if body else {}
+            query = dict((k, v[-1]) for k, v in (query or {}).items())
+            with self._lock:
+                status, resp = handler(self.cluster, req, query, **params)
+                if (method, template) in _EVENTS:
+                    self._emit(_EVENTS[(method, template)], params, req)
+                # Encode while locked, resp may be live cluster state
+                if resp is None:
+                    return status, b''
+                return status, json.dumps(resp).encode('utf-8')
+        except FakeGlusterd2Error as err:
+            return err.status_code, _error(err.status_code, str(err))
+        except ValueError as err:
+            return httplib.BAD_REQUEST, _error(1, str(err))
+
+
+def _error(code, message):
+    return json.dumps({'errors': [{'code': code, 'message': message}]}
+                      ).encode('utf-8')
+
+
+def _version(cluster, req, query):
+    return httplib.OK, {'glusterd-version': 'fake', 'api-version': 1}
+
+
+def _peer_add(cluster, req, query):
+    addresses = req.get('addresses') or []
+    if not addresses or not addresses[0]:
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "no address given")
+    return httplib.CREATED, cluster.add_peer(addresses[0],
+                                             req.get('metadata'),
+                                             req.get('zone', ''))
+
+
+def _peer_list(cluster, req, query):
+    return httplib.OK, list(cluster.peers.values())
+
+
+def _peer_remove(cluster, req, query, peerid):
+    if cluster.peers.pop(peerid, None) is None:
+        raise FakeGlusterd2Error(httplib.NOT_FOUND, "peer not found")
+    cluster.devices.pop(peerid, None)
+    return httplib.NO_CONTENT, None
+
+
+def _device_add(cluster, req, query, peerid):
+    return httplib.CREATED, cluster.add_device(peerid, req.get('device'))
+
+
+def _device_list(cluster, req, query, peerid):
+    if peerid not in cluster.devices:
+        raise FakeGlusterd2Error(httplib.NOT_FOUND, "peer not found")
+    return httplib.OK, cluster.devices[peerid]
+
+
+def _device_list_all(cluster, req, query):
+    return httplib.OK, [dev for devs in cluster.devices.values()
+                        for dev in devs]
+
+
+def _volume_create(cluster, req, query):
+    return httplib.CREATED, cluster.create_volume(req)
+
+
+def _volume_list(cluster, req, query):
+    volumes = list(cluster.volumes.values())
+    key = query.get('key')
+    value = query.get('value')
+    if key is not None:
+        volumes = [v for v in volumes if key in v['metadata']]
+    if value is not None:
+        volumes = [v for v in volumes if value in v['metadata'].values()]
+    return httplib.OK, volumes
+
+
+def _volume_info(cluster, req, query, volname):
+    return httplib.OK, cluster.volume(volname)
+
+
+def _volume_delete(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    if volume['state'] == 'Started':
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "volume is started")
+    del cluster.volumes[volname]
+    return httplib.NO_CONTENT, None
+
+
+def _volume_start(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    if volume['state'] == 'Started':
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                 "volume already started")
+    volume['state'] = 'Started'
+    return httplib.OK, volume
+
+
+def _volume_stop(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    if volume['state'] != 'Started':
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                 "volume not started")
+    volume['state'] = 'Stopped'
+    return httplib.OK, volume
+
+
+def _volume_set(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    volume['options'].update(req.get('options') or {})
+    volume['version'] += 1
+    return httplib.OK, volume
+
+
+def _volume_reset(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    if req.get('all'):
+        volume['options'].clear()
+    else:
+        for name in req.get('options') or []:
+            volume['options'].pop(name, None)
+    volume['version'] += 1
+    return httplib.OK, volume
+
+
+def _option(name, value):
+    return {'opt-name': name, 'value': value or '', 'default-value': '',
+            'modified': value is not None}
+
+
+def _volume_options(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    return httplib.OK, [_option(name, value) for name, value in
+                        sorted(volume['options'].items())]
+
+
+def _volume_option(cluster, req, query, volname, optname):
+    volume = cluster.volume(volname)
+    return httplib.OK, _option(optname, volume['options'].get(optname))
+
+
+def _brick_status(cluster, volume, brick):
+    online = volume['state'] == 'Started'
+    return {
+        'info': brick,
+        'online': online,
+        'pid': 1000 + len(brick['path']) if online else 0,
+        'port': 49152 if online else 0,
+        'fs-type': 'xfs',
+        'mount-opts': 'rw,noatime',
+        'device': '/dev/sdb',
+        'size': {'capacity': 1 << 40, 'used': 1 << 30,
+                 'free': (1 << 40) - (1 << 30)},
+    }
+
+
+def _volume_bricks(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    return httplib.OK, [_brick_status(cluster, volume, brick)
+                        for brick in cluster.bricks(volume)]
+
+
+def _volume_status(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    bricks = list(cluster.bricks(volume))
+    return httplib.OK, {
+        'info': volume,
+        'online': volume['state'] == 'Started',
+        'size': {'capacity': len(bricks) << 40, 'used': len(bricks) << 30,
+                 'free': len(bricks) * ((1 << 40) - (1 << 30))},
+    }
+
+
+def _bitrot_enable(cluster, req, query, volname):
+    cluster.volume(volname)
+    cluster.bitrot[volname] = True
+    return httplib.OK, {}
+
+
+def _bitrot_disable(cluster, req, query, volname):
+    cluster.volume(volname)
+    cluster.bitrot[volname] = False
+    return httplib.OK, {}
+
+
+def _bitrot_scrub(cluster, req, query, volname):
+    cluster.volume(volname)
+    if not cluster.bitrot.get(volname):
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "bitrot not enabled")
+    started = cluster.scrubs.get(volname)
+    if started is not None and time.time() < started + cluster.scrub_time:
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                 "scrub already running")
+    cluster.scrubs[volname] = time.time()
+    return httplib.OK, {}
+
+
+def _bitrot_scrub_status(cluster, req, query, volname):
+    volume = cluster.volume(volname)
+    started = cluster.scrubs.get(volname)
+    running = started is not None and \
+        time.time() < started + cluster.scrub_time
+    done = started is not None and not running
+    last = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(
+        started + cluster.scrub_time)) if done else ''
+    state = 'Inactive'
+    if cluster.bitrot.get(volname):
+        state = 'Active (In Progress)' if running else 'Active (Idle)'
+    return httplib.OK, {
+        'volume': volname,
+        'state': state,
+        'frequency': 'biweekly',
+        'throttle': 'lazy',
+        'nodes': [{'node': peer_id,
+                   'scrub-running': 'Yes' if running else 'No',
+                   'num-scrubbed-files':
+                       str(cluster.scrub_files if done else 0),
+                   'num-skipped-files': '0',
+                   'last-scrub-time': last,
+                   'last-scrub-duration':
+                       str(int(cluster.scrub_time)) if done else '0',
+                   'error-count': '0'}
+                  for peer_id in sorted(set(b['peer-id']
+                                            for b in cluster.bricks(volume)))],
+    }
+
+
+def _webhook_add(cluster, req, query):
+    if not req.get('url'):
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "no url given")
+    cluster.webhooks[req['url']] = req
+    return httplib.OK, req
+
+
+def _webhook_delete(cluster, req, query):
+    if cluster.webhooks.pop(req.get('url'), None) is None:
+        raise FakeGlusterd2Error(httplib.NOT_FOUND, "webhook not found")
+    return httplib.NO_CONTENT, None
+
+
+def _webhook_list(cluster, req, query):
+    return httplib.OK, list(cluster.webhooks)
+
+
+def _snapshot_create(cluster, req, query):
+    volume = cluster.volume(req.get('volname'))
+    name = req.get('snapname')
+    if not name:
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "no snapshot name")
+    if req.get('timestamp'):
+        name = '%s_GMT-%s' % (name, time.strftime('%Y.%m.%d-%H.%M.%S',
+                                                  time.gmtime()))
+    if name in cluster.snapshots:
+        raise FakeGlusterd2Error(httplib.CONFLICT, "snapshot exists")
+    volinfo = dict(volume, name=name, id=cluster.uuid(), state='Stopped')
+    snap = {
+        'volinfo': volinfo,
+        'parent-volume': volume['name'],
+        'description': req.get('description', ''),
+        'created-at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    cluster.snapshots[name] = snap
+    return httplib.CREATED, snap
+
+
+def _snapshot_list(cluster, req, query):
+    volname = query.get('volume')
+    if volname is not None:
+        cluster.volume(volname)
+    by_volume = OrderedDict()
+    for snap in cluster.snapshots.values():
+        parent = snap['parent-volume']
+        if volname is None or parent == volname:
+            by_volume.setdefault(parent, []).append(snap)
+    if volname is not None and not by_volume:
+        by_volume[volname] = []
+    return httplib.OK, [{'parent-name': name, 'snaps': snaps}
+                        for name, snaps in by_volume.items()]
+
+
+def _snapshot_delete(cluster, req, query, snapname):
+    cluster.snapshot(snapname)
+    del cluster.snapshots[snapname]
+    return httplib.NO_CONTENT, None
+
+
+def _snapshot_info(cluster, req, query, snapname):
+    return httplib.OK, cluster.snapshot(snapname)
+
+
+def _snapshot_activate(cluster, req, query, snapname):
+    snap = cluster.snapshot(snapname)
+    snap['volinfo']['state'] = 'Started'
+    return httplib.OK, snap
+
+
+def _snapshot_deactivate(cluster, req, query, snapname):
+    snap = cluster.snapshot(snapname)
+    snap['volinfo']['state'] = 'Stopped'
+    return httplib.OK, snap
+
+
+def _georep_session(cluster, mastervolid, remotevolid):
+    session = cluster.georep.get((mastervolid, remotevolid))
+    if session is None:
+        raise FakeGlusterd2Error(httplib.NOT_FOUND,
+                                 "geo-replication session not found")
+    return session
+
+
+def _georep_list(cluster, req, query):
+    return httplib.OK, [dict(session, workers=[])
+                        for session in cluster.georep.values()]
+
+
+def _georep_create(cluster, req, query, mastervolid, remotevolid):
+    volume = cluster.volume(req.get('mastervol'))
+    if volume['id'] != mastervolid:
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                 "master volume id mismatch")
+    if (mastervolid, remotevolid) in cluster.georep:
+        raise FakeGlusterd2Error(httplib.CONFLICT, "session exists")
+    session = {
+        'master-volid': mastervolid,
+        'remote-volid': remotevolid,
+        'master-volume': volume['name'],
+        'remote-volume': req.get('remotevol'),
+        'remote-hosts': req.get('remotehosts') or [],
+        'remote-user': req.get('remoteuser', 'root'),
+        'monitor-status': 'Created',
+        'options': {},
+        'checkpoint': None,
+    }
+    cluster.georep[(mastervolid, remotevolid)] = session
+    return httplib.CREATED, dict(session, workers=[])
+
+
+def _georep_workers(cluster, session):
+    now = int(time.time())
+    volume = cluster.volume(session['master-volume'])
+    state = session['monitor-status']
+    lag = cluster.georep_lag.get(volume['name'], 0)
+    workers = []
+    for subvol in volume['subvols']:
+        for i, brick in enumerate(subvol['bricks']):
+            status = {'Started': 'Active' if i == 0 else 'Passive',
+                      'Paused': 'Paused'}.get(state, 'Stopped')
+            if (volume['name'], brick['path']) in cluster.georep_faulty:
+                status = 'Faulty'
+            synced = now - lag if status == 'Active' else None
+            checkpoint = session['checkpoint']
+            workers.append({
+                'master-peerid': brick['peer-id'],
+                'master-brick-path': brick['path'],
+                'status': status,
+                'crawl-status': 'Changelog Crawl' if synced else 'N/A',
+                'last-synced': synced or 'N/A',
+                'checkpoint-time': checkpoint or 'N/A',
+                'checkpoint-completed':
+                    'Yes' if checkpoint and synced and synced >= checkpoint
+                    else 'No',
+            })
+    return workers
+
+
+def _georep_status(cluster, req, query, mastervolid, remotevolid):
+    session = _georep_session(cluster, mastervolid, remotevolid)
+    return httplib.OK, dict(session,
+                            workers=_georep_workers(cluster, session))
+
+
+def _georep_delete(cluster, req, query, mastervolid, remotevolid):
+    session = _georep_session(cluster, mastervolid, remotevolid)
+    if session['monitor-status'] in ('Started', 'Paused'):
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "session is running")
+    del cluster.georep[(mastervolid, remotevolid)]
+    return httplib.NO_CONTENT, None
+
+
+def _georep_transition(allowed, state):
+    def handler(cluster, req, query, mastervolid, remotevolid):
+        session = _georep_session(cluster, mastervolid, remotevolid)
+        if session['monitor-status'] not in allowed and not req.get('force'):
+            raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                     "session is %s" %
+                                     session['monitor-status'])
+        session['monitor-status'] = state
+        return httplib.OK, dict(session, workers=[])
+    return handler
+
+
+def _georep_config_get(cluster, req, query, mastervolid, remotevolid):
+    session = _georep_session(cluster, mastervolid, remotevolid)
+    return httplib.OK, [{'name': name, 'value': value, 'modified': True}
+                        for name, value in sorted(session['options'].items())]
+
+
+def _georep_config_set(cluster, req, query, mastervolid, remotevolid):
+    session = _georep_session(cluster, mastervolid, remotevolid)
+    for name, value in (req or {}).items():
+        if name == 'checkpoint':
+            session['checkpoint'] = int(time.time()) if value == 'now' \
+                else int(value)
+        else:
+            session['options'][name] = value
+    return httplib.OK, session['options']
+
+
+def _georep_config_reset(cluster, req, query, mastervolid, remotevolid):
+    session = _georep_session(cluster, mastervolid, remotevolid)
+    for name in req or []:
+        if name == 'checkpoint':
+            session['checkpoint'] = None
+        session['options'].pop(name, None)
+    return httplib.OK, session['options']
+
+
+# FOPs reported by profile info and their base latency in microseconds
+_PROFILE_FOPS = (('LOOKUP', 80.0), ('STAT', 40.0), ('OPEN', 60.0),
+                 ('READ', 150.0), ('WRITE', 250.0), ('FLUSH', 30.0),
+                 ('FSYNC', 900.0), ('CREATE', 400.0), ('READDIRP', 300.0),
+                 ('STATFS', 20.0))
+
+
+def _profile_stats():
+    return {'duration': 0, 'data-read': 0, 'data-written': 0, 'fops': {}}
+
+
+def _profile_step(cluster, volume, profile):
+    """Add the FOPs served by every brick since the previous call."""
+    now = time.time()
+    seconds = max(1, int(now - profile['time']))
+    profile['time'] = now
+    rand = cluster.random
+    for brick in cluster.bricks(volume):
+        load = cluster.profile_load.get((volume['name'], brick['path']), 1)
+        both = profile['bricks'][brick['path']]
+        for stats in both:
+            stats['duration'] += seconds
+        for fop, latency in _PROFILE_FOPS:
+            hits = int(rand.randint(50, 150) * load)
+            avg = latency * load * rand.uniform(0.8, 1.2)
+            low = avg * rand.uniform(0.2, 0.5)
+            high = avg * rand.uniform(2, 8)
+            for stats in both:
+                fop_stats = stats['fops'].get(fop)
+                if fop_stats is None:
+                    fop_stats = stats['fops'][fop] = [0, 0.0, low, high]
+                total = fop_stats[0] + hits
+                if total:
+                    work = fop_stats[1] * fop_stats[0] + avg * hits
+                    fop_stats[1] = work / total
+                fop_stats[0] = total
+                fop_stats[2] = min(fop_stats[2], low)
+                fop_stats[3] = max(fop_stats[3], high)
+                if fop == 'READ':
+                    stats['data-read'] += hits * 131072
+                elif fop == 'WRITE':
+                    stats['data-written'] += hits * 131072
+
+
+def _profile_body(stats):
+    # glusterd2 reports the profile values as strings
+    return {
+        'duration': str(stats['duration']),
+        'data-read': str(stats['data-read']),
+        'data-written': str(stats['data-written']),
+        'stats-info': dict(
+            (fop, {'hits': str(hits), 'avglatency': '%.2f' % avg,
+                   'minlatency': '%.2f' % low, 'maxlatency': '%.2f' % high})
+            for fop, (hits, avg, low, high) in stats['fops'].items()),
+    }
+
+
+def _volume_profile(cluster, req, query, volname, option):
+    volume = cluster.volume(volname)
+    profile = cluster.profiles.get(volname)
+    if option == 'start':
+        if volume['state'] != 'Started':
+            raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                     "volume not started")
+        if profile is not None:
+            raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                     "profile already started")
+        cluster.profiles[volname] = {
+            'time': time.time(),
+            # Cumulative and interval stats per brick path
+            'bricks': dict((brick['path'],
+                            (_profile_stats(), _profile_stats()))
+                           for brick in cluster.bricks(volume)),
+        }
+        return httplib.OK, {}
+    if option == 'stop':
+        if profile is None:
+            raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                     "profile not started")
+        del cluster.profiles[volname]
+        return httplib.OK, {}
+    raise FakeGlusterd2Error(httplib.NOT_FOUND,
+                             "unknown profile operation %s" % option)
+
+
+def _volume_profile_info(cluster, req, query, volname, option):
+    volume = cluster.volume(volname)
+    profile = cluster.profiles.get(volname)
+    if option not in ('info', 'info-peek', 'info-incremental',
+                      'info-incremental-peek', 'info-cumulative',
+                      'info-clear'):
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST,
+                                 "invalid profile option %s" % option)
+    if profile is None:
+        raise FakeGlusterd2Error(httplib.BAD_REQUEST, "profile not started")
+    _profile_step(cluster, volume, profile)
+    result = []
+    for brick in cluster.bricks(volume):
+        stats = profile['bricks'][brick['path']]
+        info = {'brick-name': '%s:%s' % (brick['hostname'], brick['path'])}
+        if not option.startswith('info-incremental'):
+            info['cumulative-stats'] = _profile_body(stats[0])
+        if option != 'info-cumulative':
+            info['interval-stats'] = _profile_body(stats[1])
+        result.append(info)
+        # Reading the interval stats starts the next interval
+        if option in ('info', 'info-incremental'):
+            stats[1].update(_profile_stats())
+        elif option == 'info-clear':
+            stats[0].update(_profile_stats())
+    return httplib.OK, result
+
+
+_GEOREP = '/v1/geo-replication/{mastervolid}/{remotevolid}'
+
+_HANDLERS = {
+    ('GET', '/version'): _version,
+    ('POST', '/v1/peers'): _peer_add,
+    ('GET', '/v1/peers'): _peer_list,
+    ('DELETE', '/v1/peers/{peerid}'): _peer_remove,
+    ('POST', '/v1/devices/{peerid}'): _device_add,
+    ('GET', '/v1/devices/{peerid}'): _device_list,
+    ('GET', '/devices'): _device_list_all,
+    ('POST', '/v1/volumes'): _volume_create,
+    ('GET', '/v1/volumes'): _volume_list,
+    ('GET', '/v1/volumes/{volname}'): _volume_info,
+    ('DELETE', '/v1/volumes/{volname}'): _volume_delete,
+    ('POST', '/v1/volumes/{volname}/start'): _volume_start,
+    ('POST', '/v1/volumes/{volname}/stop'): _volume_stop,
+    ('POST', '/v1/volumes/{volname}/options'): _volume_set,
+    ('DELETE', '/v1/volumes/{volname}/options'): _volume_reset,
+    ('GET', '/v1/volumes/{volname}/options'): _volume_options,
+    ('GET', '/v1/volumes/{volname}/options/{optname}'): _volume_option,
+    ('GET', '/v1/volumes/{volname}/bricks'): _volume_bricks,
+    ('GET', '/v1/volumes/{volname}/status'): _volume_status,
+    ('POST', '/v1/volumes/{volname}/profile/{option}'): _volume_profile,
+    ('GET', '/v1/volumes/{volname}/profile/{option}'): _volume_profile_info,
+    ('POST', '/v1/volumes/{volname}/bitrot/enable'): _bitrot_enable,
+    ('POST', '/v1/volumes/{volname}/bitrot/disable'): _bitrot_disable,
+    ('POST', '/v1/volumes/{volname}/bitrot/scrubondemand'): _bitrot_scrub,
+    ('POST', '/v1/volumes/{volname}/bitrot/scrubstatus'):
+        _bitrot_scrub_status,
+    ('POST', '/v1/events/webhook'): _webhook_add,
+    ('DELETE', '/v1/events/webhook'): _webhook_delete,
+    ('GET', '/v1/events/webhook'): _webhook_list,
+    ('POST', '/v1/snapshot'): _snapshot_create,
+    ('GET', '/v1/snapshot'): _snapshot_list,
+    ('GET', '/v1/snapshot/{snapname}'): _snapshot_info,
+    ('DELETE', '/v1/snapshot/{snapname}'): _snapshot_delete,
+    ('POST', '/v1/snapshot/{snapname}/activate'): _snapshot_activate,
+    ('POST', '/v1/snapshot/{snapname}/deactivate'): _snapshot_deactivate,
+    ('GET', '/v1/geo-replication'): _georep_list,
+    ('POST', _GEOREP): _georep_create,
+    ('GET', _GEOREP): _georep_status,
+    ('DELETE', _GEOREP): _georep_delete,
+    ('POST', _GEOREP + '/start'):
+        _georep_transition(('Created', 'Stopped'), 'Started'),
+    ('POST', _GEOREP + '/stop'):
+        _georep_transition(('Started', 'Paused'), 'Stopped'),
+    ('POST', _GEOREP + '/pause'): _georep_transition(('Started',), 'Paused'),
+    ('POST', _GEOREP + '/resume'): _georep_transition(('Paused',), 'Started'),
+    ('GET', _GEOREP + '/config'): _georep_config_get,
+    ('POST', _GEOREP + '/config'): _georep_config_set,
+    ('DELETE', _GEOREP + '/config'): _georep_config_reset,
+}
+
+
+# Events emitted to webhooks after successful requests
+_EVENTS = {
+    ('POST', '/v1/peers'): 'peer.add',
+    ('DELETE', '/v1/peers/{peerid}'): 'peer.remove',
+    ('POST', '/v1/volumes'): 'volume.create',
+    ('DELETE', '/v1/volumes/{volname}'): 'volume.delete',
+    ('POST', '/v1/volumes/{volname}/start'): 'volume.start',
+    ('POST', '/v1/volumes/{volname}/stop'): 'volume.stop',
+    ('POST', '/v1/volumes/{volname}/options'): 'volume.set',
+    ('DELETE', '/v1/volumes/{volname}/options'): 'volume.reset',
+    ('POST', '/v1/snapshot'): 'snapshot.create',
+    ('POST', '/v1/snapshot/{snapname}/activate'): 'snapshot.activate',
+    ('POST', '/v1/snapshot/{snapname}/deactivate'): 'snapshot.deactivate',
+    ('DELETE', '/v1/snapshot/{snapname}'): 'snapshot.delete',
+}
+
+_EVENT_KEYS = {
+    'volname': 'volume.name',
+    'snapname': 'snapshot.name',
+    'peerid': 'peer.id',
+}
+
+
+class _ConnectionsMixIn(ThreadingMixIn):
+    """Keep track of the open connections of a threading server."""
+
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        self.connections.add(request)
+        self.accepted += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            ThreadingMixIn.process_request_thread(self, request,
+                                                  client_address)
+        finally:
+            self.connections.discard(request)
+
+    def close_connections(self):
+        """Drop the kept-alive connections, as a stopped glusterd2 would."""
+        for request in list(self.connections):
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class _ThreadingHTTPServer(_ConnectionsMixIn, HTTPServer):
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+        self.accepted = 0
+
+
+class _ThreadingUnixHTTPServer(_ConnectionsMixIn, UnixStreamServer):
+
+    def __init__(self, *args, **kwargs):
+        UnixStreamServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+        self.accepted = 0
+
+
+def _make_handler(gd2, tcp=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are written separately, avoid delayed ACKs
+        disable_nagle_algorithm = tcp
+
+        def _serve(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            status, data = gd2.handle(self.command, url.path,
+                                      parse_qs(url.query), self.headers,
+                                      body)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            if self.close_connection:
+                # Or the client may send its next request on this one
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class _H2Server(object):
+    """
+    h2c server dispatching to FakeGlusterd2.handle.
+
+    Every connection has a reader thread, and every request is served on
+    its own thread so that the streams of a connection are concurrent.
+    """
+
+    def __init__(self, address, gd2):
+        self.gd2 = gd2
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(address)
+        self.socket.listen(128)
+        self.server_address = self.socket.getsockname()
+        self.connections = set()
+        self.accepted = 0
+        self._shutdown = threading.Event()
+        self._stopped = threading.Event()
+
+    def serve_forever(self, poll_interval=0.5):
+        self.socket.settimeout(poll_interval)
+        try:
+            while not self._shutdown.is_set():
+                try:
+                    sock, _ = self.socket.accept()
+                except socket.timeout:
+                    continue
+                except socket.error:
+                    return
+                sock.settimeout(None)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.connections.add(sock)
+                self.accepted += 1
+                thread = threading.Thread(target=_H2Connection(self,
+                                                               sock).run)
+                thread.daemon = True
+                thread.start()
+        finally:
+            self._stopped.set()
+
+    def shutdown(self):
+        self._shutdown.set()
+        self._stopped.wait()
+
+    def server_close(self):
+        self.socket.close()
+
+    def close_connections(self):
+        for sock in list(self.connections):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class _H2Connection(object):
+
+    def __init__(self, server, sock):
+        import h2.config
+        import h2.connection
+
+        self.server = server
+        self.sock = sock
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(
+            client_side=False, header_encoding='utf-8'))
+        self.lock = threading.Lock()
+        # stream id -> (headers, body chunks) of requests being received
+        self.requests = {}
+        # stream id -> response bytes waiting for flow control window
+        self.pending = OrderedDict()
+
+    def run(self):
+        import h2.events
+        import h2.exceptions
+
+        try:
+            with self.lock:
+                self.conn.initiate_connection()
+                self._flush()
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    return
+                with self.lock:
+                    for event in self.conn.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            headers = dict((name.title(), value)
+                                           for name, value in event.headers)
+                            self.requests[event.stream_id] = (headers, [])
+                        elif isinstance(event, h2.events.DataReceived):
+                            self.requests[event.stream_id][1].append(
+                                event.data)
+                            self.conn.acknowledge_received_data(
+                                event.flow_controlled_length, event.stream_id)
+                        elif isinstance(event, h2.events.StreamEnded):
+                            headers, body = self.requests.pop(
+                                event.stream_id)
+                            thread = threading.Thread(
+                                target=self._respond,
+                                args=(event.stream_id, headers, body))
+                            thread.daemon = True
+                            thread.start()
+                        elif isinstance(event, h2.events.StreamReset):
+                            self.pending.pop(event.stream_id, None)
+                        elif isinstance(event,
+                                        h2.events.ConnectionTerminated):
+                            return
+                    self._send_pending()
+                    self._flush()
+        except (socket.error, h2.exceptions.ProtocolError):
+            pass
+        finally:
+            self.server.connections.discard(self.sock)
+            self.sock.close()
+
+    def _respond(self, stream_id, headers, body):
+        import h2.exceptions
+
+        url = urlparse(headers[':Path'])
+        status, data = self.server.gd2.handle(
+            headers[':Method'], url.path, parse_qs(url.query), headers,
+            b''.join(body))
+        with self.lock:
+            try:
+                self.conn.send_headers(stream_id, [
+                    (':status', str(status)),
+                    ('content-type', 'application/json'),
+                    ('content-length', str(len(data)))], end_stream=not data)
+                if data:
+                    self.pending[stream_id] = data
+                    self._send_pending()
+                self._flush()
+            except (socket.error, h2.exceptions.ProtocolError):
+                # Stream reset or connection closed by the client
+                pass
+
+    def _send_pending(self):
+        """Send the pending response bytes the flow control windows allow."""
+        for stream_id in list(self.pending):
+            data = self.pending[stream_id]
+            window = min(self.conn.local_flow_control_window(stream_id),
+                         self.conn.max_outbound_frame_size)
+            while data and window > 0:
+                chunk, data = data[:window], data[window:]
+                self.conn.send_data(stream_id, chunk, end_stream=not data)
+                window = min(self.conn.local_flow_control_window(stream_id),
+                             self.conn.max_outbound_frame_size)
+            if data:
+                self.pending[stream_id] = data
+            else:
+                del self.pending[stream_id]
+
+    def _flush(self):
+        data = self.conn.data_to_send()
+        if data:
+            self.sock.sendall(data)
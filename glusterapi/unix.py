@@ -0,0 +1,99 @@
+"""
+This module contains the Unix domain socket adapter of SessionManager.
+
+An agent on a glusterd2 node can reach it through its local socket,
+``Client('unix:///var/run/glusterd2.sock')``, skipping the TCP loopback
+stack. EndpointPool turns such endpoints into ``http+unix://`` urls
+whose host is the quoted socket path, e.g.
+``http+unix://%2Fvar%2Frun%2Fglusterd2.sock/v1/peers``, and
+SessionManager sends those through UnixAdapter. The requests are the
+same HTTP/1.1 requests, on pooled and kept alive connections.
+"""
+import socket
+import threading
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from glusterapi.compat import unquote, urlparse
+
+SCHEME = 'http+unix'
+
+
+def socket_path(url):
+    """Return the socket path of an http+unix url."""
+    return unquote(urlparse(url).netloc)
+
+
+class UnixConnection(HTTPConnection):
+    """urllib3 connection to a Unix domain socket."""
+
+    def __init__(self, *args, **kwargs):
+        self.socket_path = kwargs.pop('socket_path')
+        HTTPConnection.__init__(self, *args, **kwargs)
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except socket.timeout:
+            sock.close()
+            raise ConnectTimeoutError(
+                self, "Connection to %s timed out" % self.socket_path)
+        except socket.error as err:
+            sock.close()
+            # Raised as for TCP so that failover treats it the same
+            raise NewConnectionError(
+                self, "Failed to establish a new connection: %s" % err)
+        return sock
+
+
+class UnixConnectionPool(HTTPConnectionPool):
+    ConnectionCls = UnixConnection
+
+    def __init__(self, path, **kwargs):
+        HTTPConnectionPool.__init__(self, 'localhost', socket_path=path,
+                                    **kwargs)
+
+
+class UnixAdapter(HTTPAdapter):
+    """
+    requests adapter for http+unix urls.
+
+    Keeps a pool of up to ``pool_maxsize`` connections per socket path.
+    """
+
+    def __init__(self, pool_maxsize=10, pool_block=False):
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        HTTPAdapter.__init__(self, pool_maxsize=pool_maxsize,
+                             pool_block=pool_block)
+
+    def get_connection(self, url, proxies=None):
+        path = socket_path(url)
+        with self._pools_lock:
+            pool = self._pools.get(path)
+            if pool is None:
+                pool = self._pools[path] = UnixConnectionPool(
+                    path, maxsize=self._pool_maxsize,
+                    block=self._pool_block)
+        return pool
+
+    # requests >= 2.32 calls this one instead
+    def get_connection_with_tls_context(self, request, verify, proxies=None,
+                                        cert=None):
+        return self.get_connection(request.url, proxies)
+
+    def request_url(self, request, proxies):
+        return request.path_url
+
+    def close(self):
+        HTTPAdapter.close(self)
+        with self._pools_lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
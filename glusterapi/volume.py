@@ -1,9 +1,15 @@
 """This module contains the python  glusterd2 volume api's implementation."""
-import httplib
-import json
 
 from glusterapi.common import BaseAPI, validate_uuid, validate_volume_name
+from glusterapi.compat import httplib
 from glusterapi.exceptions import GlusterApiInvalidInputs
+from glusterapi.models import BrickStatus, Volume, VolumeStatus
+from glusterapi.planner import plan_volume
+
+
+PROFILE_INFO_OPTIONS = ('info', 'info-peek', 'info-incremental',
+                        'info-incremental-peek', 'info-cumulative',
+                        'info-clear')
 
 
 class TransportType(object):
@@ -82,12 +88,12 @@ class VolumeApis(BaseAPI):
                 raise GlusterApiInvalidInputs(
                     "Invalid number of bricks specified")
 
-            num_subvol = num_bricks / replica
+            num_subvol = num_bricks // replica
             for i in range(0, num_subvol):
                 idx = i * replica
                 # If Arbiter is set, set it as Brick Type for last brick
                 if arbiter > 0:
-                    req_bricks[idx * replica - 1]['type'] = 'arbiter'
+                    req_bricks[idx + replica - 1]['type'] = 'arbiter'
                 subvol_req = dict()
                 subvol_req['type'] = 'replicate'
                 subvol_req['bricks'] = req_bricks[idx:idx + replica]
@@ -100,7 +106,7 @@ class VolumeApis(BaseAPI):
                 raise GlusterApiInvalidInputs(
                     "Invalid number of bricks specified")
 
-            num_subvols = num_bricks / subvol_size
+            num_subvols = num_bricks // subvol_size
             for i in range(0, num_subvols):
                 idx = i * subvol_size
                 subvol_req = dict()
@@ -130,7 +136,38 @@ class VolumeApis(BaseAPI):
         }
 
         return self._handle_request(self._post, httplib.CREATED,
-                                    "/v1/volumes", data=json.dumps(data))
+                                    "/v1/volumes", data=self.codec.dumps(data))
+
+    def volume_plan(self, volume_name, replica=0, arbiter=0, disperse=0,
+                    disperse_redundancy=0, distribute=1, brick_size=None,
+                    brick_root='/bricks', usage=None):
+        """
+        Plan the bricks of a new volume from the peers and devices.
+
+        Pass ``plan.create_args()`` to volume_create to create it. See
+        glusterapi.planner.plan_volume for the placement rules.
+
+        :param volume_name: (string) Volume Name
+        :param replica: (int) replica count, including the arbiter brick
+        :param arbiter: (int) 1 for an arbiter volume
+        :param disperse: (int) disperse count
+        :param disperse_redundancy: (int) disperse redundancy count
+        :param distribute: (int) number of replica or disperse sets
+        :param brick_size: (int) bytes needed per brick
+        :param brick_root: (string) directory the brick paths start with
+        :param usage: (Counter) bricks already on each (peer id, device),
+                      e.g. load()[1] of plans not created yet
+        :return: glusterapi.planner.VolumePlan
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        validate_volume_name(volume_name)
+        _, peers = self._handle_request(self._get, httplib.OK, "/v1/peers")
+        _, devices = self._handle_request(self._get, httplib.OK, "/devices")
+        return plan_volume(peers, devices, volume_name, replica=replica,
+                           arbiter=arbiter, disperse=disperse,
+                           disperse_redundancy=disperse_redundancy,
+                           distribute=distribute, brick_size=brick_size,
+                           brick_root=brick_root, usage=usage)
 
     def volume_start(self, vol_name, force=False):
         """
@@ -147,7 +184,7 @@ class VolumeApis(BaseAPI):
         }
         return self._handle_request(self._post, httplib.OK,
                                     "/v1/volumes/%s/start" % vol_name,
-                                    data=json.dumps(data))
+                                    data=self.codec.dumps(data))
 
     def volume_stop(self, vol_name):
         """
@@ -215,63 +252,173 @@ class VolumeApis(BaseAPI):
         req['deprecated'] = deprecated
         return self._handle_request(self._post, httplib.OK,
                                     "/v1/volumes/%s/options" % vol_name,
-                                    json.dumps(req))
+                                    self.codec.dumps(req))
 
-    def volume_reset(self, vol_name, options=None):
+    def volume_reset(self, vol_name, options=None, force=False,
+                     all_options=False):
         """
-        Start Gluster Volume.
+        Reset Gluster Volume Options to their defaults.
 
         :param vol_name: (string) Volume Name
-        :param options: (dict) options to set on volume
-        :raises: GlusterAPIError or failure
+        :param options: (list) names of the options to reset
+        :param force: (bool) force flag to reset options
+        :param all_options: (bool) reset every option set on the volume
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
         """
         validate_volume_name(vol_name)
 
-        # TODO need to be implemented
+        if not options and not all_options:
+            raise GlusterApiInvalidInputs("cannot reset empty options")
 
-    def volume_info(self, vol_name):
+        req = {
+            "options": list(options or []),
+            "force": force,
+            "all": all_options,
+        }
+        return self._handle_request(self._delete, httplib.OK,
+                                    "/v1/volumes/%s/options" % vol_name,
+                                    self.codec.dumps(req))
+
+    def volume_info(self, vol_name, typed=False):
         """
         Gluster Volume Info.
 
         :param vol_name: (string) Volume Name
+        :param typed: (bool) return glusterapi.models.BrickStatus objects
+                      instead of dicts
         :raises: GlusterAPIError on failure
         """
         validate_volume_name(vol_name)
 
         return self._handle_request(self._get, httplib.OK,
-                                    '/v1/volumes/%s/bricks' % vol_name)
+                                    '/v1/volumes/%s/bricks' % vol_name,
+                                    model=BrickStatus if typed else None)
 
-    def volume_status(self, vol_name):
+    def volume_status(self, vol_name, typed=False):
         """
         Gluster Volume Status.
 
         :param vol_name: (string) Volume Name
+        :param typed: (bool) return a glusterapi.models.VolumeStatus
+                      instead of a dict
         :raises: GlusterAPIError on failure
         """
         validate_volume_name(vol_name)
 
         return self._handle_request(self._get, httplib.OK,
-                                    '/v1/volumes/%s/status' % vol_name)
+                                    '/v1/volumes/%s/status' % vol_name,
+                                    model=VolumeStatus if typed else None)
+
+    def volume_status_many(self, vol_names, max_workers=None):
+        """
+        Gluster Volume Status for many volumes concurrently.
+
+        :param vol_names: (list) Volume Names
+        :param max_workers: (int) max number of requests in flight
+        :return: (dict) volume name -> volume_status result, or the
+                 exception raised for that volume
+        """
+        return self._fan_out(self.volume_status, vol_names, max_workers)
+
+    def volume_info_many(self, vol_names, max_workers=None):
+        """
+        Gluster Volume Info for many volumes concurrently.
+
+        :param vol_names: (list) Volume Names
+        :param max_workers: (int) max number of requests in flight
+        :return: (dict) volume name -> volume_info result, or the
+                 exception raised for that volume
+        """
+        return self._fan_out(self.volume_info, vol_names, max_workers)
+
+    def volume_status_all(self, max_workers=None):
+        """
+        Gluster Volume Status for every volume in the cluster.
+
+        :param max_workers: (int) max number of requests in flight
+        :return: (dict) volume name -> volume_status result, or the
+                 exception raised for that volume
+        :raises: GlusterAPIError if the volume list cannot be fetched
+        """
+        _, volumes = self.volume_list()
+        return self.volume_status_many([vol['name'] for vol in volumes],
+                                       max_workers)
 
     def volume_get(self, vol_name, options=None):
         """
         Get Gluster Volume Options.
 
         :param vol_name: (string) Volume Name
-        :param options: (dict) get volumes based on options
+        :param options: (string) name of a single option to get, every
+                        option of the volume when None
         :raises: GlusterAPIError on failure
         """
         validate_volume_name(vol_name)
 
-        # TODO need to be implemented
+        url = "/v1/volumes/%s/options" % vol_name
+        if options is not None:
+            url += "/" + options
+        return self._handle_request(self._get, httplib.OK, url)
+
+    def volume_profile_start(self, vol_name):
+        """
+        Start profiling the FOPs of a Gluster Volume on its bricks.
+
+        :param vol_name: (string) Volume Name
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        validate_volume_name(vol_name)
+
+        return self._handle_request(self._post, httplib.OK,
+                                    "/v1/volumes/%s/profile/start" % vol_name,
+                                    None)
+
+    def volume_profile_stop(self, vol_name):
+        """
+        Stop profiling a Gluster Volume.
+
+        :param vol_name: (string) Volume Name
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        validate_volume_name(vol_name)
+
+        return self._handle_request(self._post, httplib.OK,
+                                    "/v1/volumes/%s/profile/stop" % vol_name,
+                                    None)
 
-    def volume_list(self, vol_name=None, key=None, value=None):
+    def volume_profile_info(self, vol_name, option='info'):
+        """
+        Gluster Volume Profile Info.
+
+        Every brick reports cumulative stats, since profiling started, and
+        interval stats, since the previous info. The ``-peek`` options do
+        not start a new interval. See glusterapi.profile to analyse them.
+
+        :param vol_name: (string) Volume Name
+        :param option: (string) one of info, info-peek, info-incremental,
+                       info-incremental-peek, info-cumulative, info-clear
+        :return: (tuple) status code and list of per-brick stats dicts
+        :raises: GlusterApiError or GlusterApiInvalidInputs on failure
+        """
+        validate_volume_name(vol_name)
+        if option not in PROFILE_INFO_OPTIONS:
+            raise GlusterApiInvalidInputs(
+                "Invalid profile option %s, use one of %s" %
+                (option, ', '.join(PROFILE_INFO_OPTIONS)))
+
+        return self._handle_request(self._get, httplib.OK,
+                                    "/v1/volumes/%s/profile/%s" %
+                                    (vol_name, option))
+
+    def volume_list(self, vol_name=None, key=None, value=None, typed=False):
         """
         Get Volume list.
 
         :param vol_name: (string) volume name
         :param key: (string) key to filter volumes
         :param value: (string) value to filter volumes
+        :param typed: (bool) return glusterapi.models objects instead of
+                      dicts
         :raises: GlusterAPIError on failure
         """
         url = "/v1/volumes"
@@ -285,4 +432,39 @@ class VolumeApis(BaseAPI):
             validate_volume_name(vol_name)
             url = url + "/" + vol_name
 
-        return self._handle_request(self._get, httplib.OK, url, param=param)
+        return self._handle_request(self._get, httplib.OK, url, param=param,
+                                    model=Volume if typed else None)
+
+    def iter_volumes(self, key=None, value=None, typed=False):
+        """
+        Iterate over the volumes of the cluster.
+
+        The volume list is streamed and each volume is decoded only when
+        reached, keeping memory flat on clusters with many volumes.
+
+        :param key: (string) key to filter volumes
+        :param value: (string) value to filter volumes
+        :param typed: (bool) return glusterapi.models objects instead of
+                      dicts
+        :return: iterator of volume info dicts
+        :raises: GlusterAPIError on failure
+        """
+        param = {}
+        if key:
+            param['key'] = key
+        if value:
+            param['value'] = value
+        return self._iter_request("/v1/volumes", param=param,
+                                  model=Volume if typed else None)
+
+    def iter_bricks_status(self, vol_name):
+        """
+        Iterate over the brick status of a Gluster Volume.
+
+        :param vol_name: (string) Volume Name
+        :return: iterator of brick status dicts
+        :raises: GlusterAPIError on failure
+        """
+        validate_volume_name(vol_name)
+
+        return self._iter_request('/v1/volumes/%s/bricks' % vol_name)
@@ -0,0 +1,334 @@
+"""
+This module contains helpers waiting for volume, peer and snapshot state.
+
+A Condition names the request telling whether a state is reached and a
+predicate on its result, e.g. ``volume_online('vol1')``. A Poller runs
+that request for every waiter on a single background thread: waiters on
+the same request share each poll, the polls of a request are spaced
+exponentially from ``min_interval`` to ``max_interval``, and a waiter
+gives up with GlusterApiTimeout at its deadline.
+
+Given an EventReceiver registered as a glusterd2 webhook, the Poller
+polls again as soon as a related event arrives, and otherwise falls back
+to polls every ``max_interval``::
+
+    poller = Poller(client, receiver=receiver)
+    client.volume_start('vol1')
+    poller.wait_for(volume_online('vol1'), timeout=30)
+
+With a response cache on the client, polls only see changes made by
+other clients once the cached response expires.
+"""
+import threading
+import time
+
+from glusterapi.concurrency import fan_out
+from glusterapi.events import ALL_EVENTS
+from glusterapi.exceptions import (GlusterApiError, GlusterApiInvalidInputs,
+                                   GlusterApiTimeout)
+
+
+class Condition(object):
+    """
+    A state to wait for.
+
+    :param key: hashable identifying the request, waiters with the same
+                key share its polls
+    :param fetch: callable(client) sending the request, returning the
+                  (status, body) result of a client method
+    :param predicate: callable(body) returning True once the state is
+                      reached
+    :param events: (list) names of the glusterd2 events that may reach it
+    :param match: (dict) event data the events must carry, e.g.
+                  {'volume.name': 'vol1'}
+    :param description: (string) used in the timeout message
+    """
+
+    def __init__(self, key, fetch, predicate, events=(), match=None,
+                 description=None):
+        self.key = key
+        self.fetch = fetch
+        self.predicate = predicate
+        self.events = frozenset(events)
+        self.match = match or {}
+        self.description = description or repr(key)
+
+    def wakes(self, event):
+        """Return True if event may change the awaited state."""
+        if event.name not in self.events:
+            return False
+        data = event.data or {}
+        return all(data.get(k) == v for k, v in self.match.items())
+
+    def __repr__(self):
+        return '<Condition %s>' % self.description
+
+
+def volume_online(name):
+    """Volume name started with all its bricks online."""
+    return Condition(
+        ('volume_info', name), lambda client: client.volume_info(name),
+        lambda bricks: bool(bricks) and all(b.get('online') for b in bricks),
+        events=('volume.start', 'volume.stop'),
+        match={'volume.name': name},
+        description='volume %s online' % name)
+
+
+def volume_stopped(name):
+    """Volume name stopped."""
+    return Condition(
+        ('volume', name), lambda client: client.volume_list(vol_name=name),
+        lambda volume: volume.get('state') == 'Stopped',
+        events=('volume.start', 'volume.stop'),
+        match={'volume.name': name},
+        description='volume %s stopped' % name)
+
+
+def peer_connected(peer):
+    """Peer, given by id or name, part of the cluster and online."""
+    def connected(peers):
+        return any(p.get('online') for p in peers
+                   if peer in (p.get('id'), p.get('name')))
+    return Condition(('peers',), lambda client: client.peer_status(),
+                     connected, events=('peer.add', 'peer.remove'),
+                     description='peer %s connected' % peer)
+
+
+def snapshot_activated(name):
+    """Snapshot name activated."""
+    return Condition(
+        ('snapshot', name), lambda client: client.snapshot_info(name),
+        lambda snap: (snap.get('volinfo') or {}).get('state') == 'Started',
+        events=('snapshot.activate', 'snapshot.deactivate'),
+        match={'snapshot.name': name},
+        description='snapshot %s activated' % name)
+
+
+class _Waiter(object):
+
+    __slots__ = ('condition', 'done', 'result', 'error')
+
+    def __init__(self, condition):
+        self.condition = condition
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _Watch(object):
+    """A polled request and the waiters on its result."""
+
+    __slots__ = ('fetch', 'waiters', 'interval', 'next_poll', 'polls',
+                 'last_error')
+
+    def __init__(self, fetch, now):
+        self.fetch = fetch
+        self.waiters = []
+        self.interval = None
+        self.next_poll = now
+        self.polls = 0
+        self.last_error = None
+
+
+class Poller(object):
+    """
+    Wait for conditions, sharing the polls of concurrent waiters.
+
+    :param client: glusterapi.Client
+    :param min_interval: (float) seconds before the second poll
+    :param max_interval: (float) max seconds between two polls
+    :param receiver: glusterapi.events.EventReceiver delivering the
+                     glusterd2 events, to poll when a related one arrives
+    :param max_workers: (int) max number of requests in flight, defaults
+                        to the max_workers of the client
+    :param clock: callable returning the current time in seconds
+    """
+
+    def __init__(self, client, min_interval=0.2, max_interval=5.0,
+                 receiver=None, max_workers=None, clock=time.time):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise GlusterApiInvalidInputs("Invalid poll intervals")
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_workers = max_workers
+        self.clock = clock
+        self.receiver = None
+        self.polls = 0
+        self._watches = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        if receiver is not None:
+            self.attach(receiver)
+
+    def attach(self, receiver):
+        """Poll on the related events delivered by receiver."""
+        if self.receiver is not None:
+            self.receiver.off(ALL_EVENTS, self._on_event)
+        self.receiver = receiver
+        receiver.on(ALL_EVENTS, self._on_event)
+
+    def wait_for(self, condition, timeout=60.0):
+        """
+        Wait until condition is reached.
+
+        :param condition: Condition
+        :param timeout: (float) seconds to wait
+        :return: body of the result that satisfied the predicate
+        :raises: GlusterApiTimeout when the deadline passes
+        """
+        waiter = _Waiter(condition)
+        with self._cond:
+            if self._closed:
+                raise GlusterApiInvalidInputs("Poller is closed")
+            watch = self._watches.get(condition.key)
+            if watch is None:
+                watch = _Watch(condition.fetch, self.clock())
+                self._watches[condition.key] = watch
+            else:
+                # Poll now, this waiter may already be satisfied
+                watch.next_poll = self.clock()
+            watch.waiters.append(waiter)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='glusterapi-wait')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+        if waiter.done.wait(timeout):
+            return waiter.outcome()
+        with self._cond:
+            if waiter.done.is_set():
+                return waiter.outcome()
+            watch = self._watches.get(condition.key)
+            if watch is not None and waiter in watch.waiters:
+                watch.waiters.remove(waiter)
+                if not watch.waiters:
+                    del self._watches[condition.key]
+            last_error = None if watch is None else watch.last_error
+        message = "Timed out after %.1fs waiting for %s" % (
+            timeout, condition.description)
+        if last_error is not None:
+            message += ", last error: %s" % last_error
+        raise GlusterApiTimeout(message, error=last_error)
+
+    def _on_event(self, event):
+        with self._cond:
+            now = self.clock()
+            woken = False
+            for watch in self._watches.values():
+                if any(w.condition.wakes(event) for w in watch.waiters):
+                    watch.next_poll = now
+                    watch.interval = None
+                    woken = True
+            if woken:
+                self._cond.notify()
+
+    def _event_driven(self, watch):
+        return self.receiver is not None and \
+            all(w.condition.events for w in watch.waiters)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed or not self._watches:
+                        self._thread = None
+                        return
+                    now = self.clock()
+                    due = [w for w in self._watches.values()
+                           if w.next_poll <= now]
+                    if due:
+                        break
+                    upcoming = min(w.next_poll
+                                   for w in self._watches.values())
+                    self._cond.wait(upcoming - now)
+
+            results = fan_out(lambda w: w.fetch(self.client), due,
+                              self.max_workers or self.client.max_workers)
+
+            with self._cond:
+                self.polls += len(results)
+                now = self.clock()
+                for watch, result in results.items():
+                    self._update(watch, result, now)
+                for key in [k for k, w in self._watches.items()
+                            if not w.waiters]:
+                    del self._watches[key]
+
+    def _update(self, watch, result, now):
+        watch.polls += 1
+        # No response counts as a failed poll too, e.g. while glusterd2
+        # restarts
+        failed = (GlusterApiError,) + tuple(self.client._session.errors)
+        if isinstance(result, failed):
+            watch.last_error = result
+        elif isinstance(result, Exception):
+            # A bug in a fetch, not a state to wait for
+            for waiter in watch.waiters:
+                waiter.finish(error=result)
+            watch.waiters = []
+            return
+        else:
+            watch.last_error = None
+            for waiter in list(watch.waiters):
+                try:
+                    reached = waiter.condition.predicate(result[1])
+                except Exception as err:
+                    reached = True
+                    waiter.error = err
+                if reached:
+                    watch.waiters.remove(waiter)
+                    waiter.finish(result[1], waiter.error)
+        if self._event_driven(watch):
+            watch.interval = self.max_interval
+        elif watch.interval is None:
+            watch.interval = self.min_interval
+        else:
+            watch.interval = min(self.max_interval, watch.interval * 2)
+        watch.next_poll = now + watch.interval
+
+    def close(self):
+        """Stop polling, waiters left time out."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self.receiver is not None:
+            self.receiver.off(ALL_EVENTS, self._on_event)
+
+
+_pollers_lock = threading.Lock()
+
+
+def wait_for(client, condition, timeout=60.0, receiver=None):
+    """
+    Wait for condition with the Poller shared by all waiters on client.
+
+    The Poller is closed with the client.
+
+    :param client: glusterapi.Client
+    :param condition: Condition, e.g. volume_online('vol1')
+    :param timeout: (float) seconds to wait
+    :param receiver: EventReceiver to attach to the shared Poller
+    :return: body of the result that satisfied the predicate
+    :raises: GlusterApiTimeout when the deadline passes
+    """
+    with _pollers_lock:
+        poller = client._poller
+        if poller is None:
+            poller = client._poller = Poller(client)
+        if receiver is not None and poller.receiver is not receiver:
+            poller.attach(receiver)
+    return poller.wait_for(condition, timeout)
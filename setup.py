@@ -10,5 +10,16 @@ setup(
     author_email='gluster-devel@gluster.org',
     url='https://github.com/gluster/glusterapi-python',
     packages=find_packages(exclude=['test', 'bin']),
-    install_requires=['pyjwt', 'requests', 'pytest'],
+    install_requires=['pyjwt', 'requests', 'pytest',
+                      'futures; python_version < "3"'],
+    extras_require={
+        'async': ['aiohttp'],
+        'http2': ['httpx[http2]; python_version >= "3.8"'],
+        'profile': ['numpy'],
+        'fast-json': ['orjson; python_version >= "3.6"',
+                      'ujson; python_version < "3.6"'],
+    },
+    entry_points={
+        'console_scripts': ['glusterapi = glusterapi.cli:main'],
+    },
 )
@@ -3,11 +3,11 @@ Test module.
 
 The module tests for peer functionalities.
 """
-from urlparse import urlparse
 import json
 import pytest
 
 from glusterapi import Client
+from glusterapi.compat import urlparse
 
 
 class GlusterdConfig(object):
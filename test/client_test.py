@@ -0,0 +1,1150 @@
+"""
+Test module.
+
+The module tests the client against the in-process glusterd2 stand-in.
+"""
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from glusterapi import Client
+from glusterapi.admission import (HIGH, LOW, MUTATE, NORMAL, READ,
+                                  AdmissionController)
+from glusterapi.auth import TokenCache
+from glusterapi.cache import ResponseCache
+from glusterapi.cli import main as cli_main
+from glusterapi.cluster import ClusterState
+from glusterapi.codec import available_codecs, get_codec
+from glusterapi.compat import httplib
+from glusterapi.concurrency import fan_out
+from glusterapi.endpoints import EndpointPool
+from glusterapi.events import EventReceiver
+from glusterapi.exceptions import GlusterApiCircuitOpen
+from glusterapi.exceptions import GlusterApiError, GlusterApiInvalidInputs
+from glusterapi.exceptions import GlusterApiThrottled, GlusterApiTimeout
+from glusterapi.georep import GeorepMonitor
+from glusterapi.metrics import Metrics
+from glusterapi.models import Peer, Volume
+from glusterapi.planner import plan_volume
+from glusterapi.reconcile import Reconciler
+from glusterapi.retry import CircuitBreaker, RetryPolicy
+from glusterapi.scheduler import (CronSchedule, SnapshotPolicy,
+                                  SnapshotScheduler)
+from glusterapi.scrub import ScrubOrchestrator
+from glusterapi.streaming import JsonArrayDecoder, iter_json_array
+from glusterapi.testing import FakeGlusterd2
+from glusterapi.wait import (Poller, peer_connected, snapshot_activated,
+                             volume_online, volume_stopped, wait_for)
+
+USER = 'glustercli'
+SECRET = 'dc12b44485e806975985853b1af0a23165edc799023865801665f25bfe03e1e9'
+
+
+@pytest.fixture
+def gd2():
+    """Start a fresh stand-in with three peers and two volumes."""
+    with FakeGlusterd2(peers=3, volumes=2, user=USER, secret=SECRET,
+                       seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def client(gd2):
+    """Client authenticated against the stand-in."""
+    with Client(gd2.endpoint, user=USER, secret=SECRET) as gd2client:
+        yield gd2client
+
+
+def test_peer_lifecycle(client):
+    """Test for peer addition, status and removal."""
+    status, peer = client.peer_add(host='peer9', zone='zone1')
+    assert status == 201
+    _, peers = client.peer_status()
+    assert peer['id'] in [p['id'] for p in peers]
+    status, resp = client.peer_remove(peerid=peer['id'])
+    assert status == 204
+    assert not bool(resp)
+
+
+def test_invalid_secret_rejected(gd2):
+    """Test that requests signed with a wrong secret fail."""
+    with Client(gd2.endpoint, user=USER, secret='wrong') as gd2client:
+        with pytest.raises(GlusterApiError):
+            gd2client.peer_status()
+
+
+def test_connection_reused(gd2):
+    """Test that calls share a kept-alive connection until close."""
+    with Client(gd2.endpoint, user=USER, secret=SECRET) as gd2client:
+        for _ in range(5):
+            gd2client.peer_status()
+        assert gd2.accepted == 1
+        gd2client.close()
+        gd2client.peer_status()
+        assert gd2.accepted == 2
+    with Client(gd2.endpoint, user=USER, secret=SECRET,
+                keep_alive=False) as gd2client:
+        for _ in range(3):
+            gd2client.peer_status()
+    assert gd2.accepted == 5
+
+
+def test_token_reused(client):
+    """Test that repeated calls reuse the signed token."""
+    for _ in range(3):
+        client.peer_status()
+    stats = client.token_cache.stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 2
+
+
+def test_token_refresh(monkeypatch):
+    """Test that tokens are signed again near expiry and evicted LRU."""
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    cache = TokenCache(maxsize=2, lifetime=10, refresh_margin=2)
+    token = cache.get(USER, SECRET, 'GET', '/v1/peers')
+    now[0] += 7
+    assert cache.get(USER, SECRET, 'GET', '/v1/peers') == token
+    assert cache.get(USER, SECRET, 'GET', '/v1/volumes') != token
+    now[0] += 1
+    assert cache.get(USER, SECRET, 'GET', '/v1/peers') != token
+    cache.get(USER, SECRET, 'POST', '/v1/peers')
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'size': 2}
+    with pytest.raises(GlusterApiInvalidInputs):
+        TokenCache(lifetime=5, refresh_margin=5)
+
+
+def test_volume_lifecycle(client):
+    """Test for volume create, start, set, stop and delete."""
+    _, peers = client.peer_status()
+    bricks = ['%s:/bricks/test/b%d' % (p['id'], i)
+              for i, p in enumerate(peers)]
+    status, _ = client.volume_create(bricks, volume_name='test', replica=3)
+    assert status == 201
+    client.volume_start('test')
+    _, resp = client.volume_status('test')
+    assert resp['online']
+    _, resp = client.volume_set('test', {'performance.cache-size': '1GB'})
+    assert resp['options']['performance.cache-size'] == '1GB'
+    client.volume_stop('test')
+    status, _ = client.volume_delete('test')
+    assert status == 204
+    with pytest.raises(GlusterApiError):
+        client.volume_info('test')
+
+
+def test_response_cache_invalidation(gd2):
+    """Test that mutations drop the cached responses they make stale."""
+    with Client(gd2.endpoint, user=USER, secret=SECRET,
+                cache=ResponseCache()) as gd2client:
+        gd2client.volume_list('vol0')
+        gd2client.volume_list('vol0')
+        gd2client.volume_list('vol1')
+        assert gd2.calls[('GET', '/v1/volumes/{volname}')] == 2
+
+        gd2client.volume_set('vol0', {'a': 'b'})
+        _, resp = gd2client.volume_list('vol0')
+        gd2client.volume_list('vol1')
+        assert resp['options'] == {'a': 'b'}
+        assert gd2.calls[('GET', '/v1/volumes/{volname}')] == 3
+        assert gd2client.cache.stats()['hits'] == 2
+
+    # The change is applied after the client gave up waiting
+    with Client(gd2.endpoint, user=USER, secret=SECRET, read_timeout=0.1,
+                cache=ResponseCache()) as gd2client:
+        gd2client.volume_list('vol0')
+        gd2.latency = 0.3
+        with pytest.raises(GlusterApiError) as err:
+            gd2client.volume_set('vol0', {'a': 'c'})
+        assert isinstance(err.value.error, requests.exceptions.Timeout)
+        assert err.value.__cause__ is err.value.error
+        assert err.value.attempts == 1 and err.value.status_code is None
+        time.sleep(0.3)
+        gd2.latency = 0
+        _, resp = gd2client.volume_list('vol0')
+        assert resp['options'] == {'a': 'c'}
+
+
+def test_response_cache_expiry(monkeypatch):
+    """Test TTLs, LRU eviction and responses raced by a mutation."""
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    cache = ResponseCache(maxsize=2, default_ttl=5,
+                          ttls={'/v1/peers': 0})
+    key = cache.key('/v1/volumes/vol0')
+    cache.set(key, 200, b'{}')
+    now[0] += 4
+    assert cache.get(key) == (200, b'{}')
+    now[0] += 1
+    assert cache.get(key) is None
+
+    cache.set(cache.key('/v1/peers'), 200, b'[]')
+    assert cache.get(cache.key('/v1/peers')) is None
+    for name in ('vol0', 'vol1', 'vol2'):
+        cache.set(cache.key('/v1/volumes/' + name), 200, b'{}')
+    assert cache.get(key) is None
+    assert cache.stats()['evictions'] == 1
+
+    generation = cache.generation
+    cache.invalidate('/v1/volumes/vol1/start')
+    cache.set(cache.key('/v1/volumes/vol1'), 200, b'{}', generation)
+    assert cache.get(cache.key('/v1/volumes/vol1')) is None
+    assert cache.get(cache.key('/v1/volumes/vol2')) == (200, b'{}')
+
+
+def test_metrics(gd2):
+    """Test per-endpoint metrics and their Prometheus rendering."""
+    records = []
+    metrics = Metrics()
+    metrics.add_hook(records.append)
+    with Client(gd2.endpoint, user=USER, secret=SECRET,
+                metrics=metrics) as gd2client:
+        gd2client.volume_status('vol0')
+        gd2client.volume_status('vol1')
+        with pytest.raises(GlusterApiError):
+            gd2client.volume_status('missing')
+        list(gd2client.iter_volumes())
+
+    key = ('GET', '/v1/volumes/{volname}/status')
+    data = metrics.snapshot()[key]
+    assert data['count'] == 3
+    assert data['statuses'] == {'200': 2, '404': 1}
+    assert data['in_flight'] == 0
+    assert data['response_bytes'] > 0
+    assert metrics.snapshot()[('GET', '/v1/volumes')]['count'] == 1
+    assert [r.path for r in records][:2] == ['/v1/volumes/vol0/status',
+                                             '/v1/volumes/vol1/status']
+
+    text = metrics.render_prometheus()
+    assert ('glusterapi_requests_total{method="GET",'
+            'endpoint="/v1/volumes/{volname}/status",status="404"} 1') in text
+    assert ('glusterapi_request_duration_seconds_count{method="GET",'
+            'endpoint="/v1/volumes/{volname}/status"} 3') in text
+
+
+def test_fan_out_collects_errors(client):
+    """Test that a failing volume does not abort the batch."""
+    results = client.volume_status_many(['vol0', 'vol1', 'missing', ' '])
+    assert results['vol0'][1]['online']
+    assert results['vol1'][1]['online']
+    assert isinstance(results['missing'], GlusterApiError)
+    assert isinstance(results[' '], GlusterApiInvalidInputs)
+
+    devices = client.device_status_all_peers(max_workers=2)
+    assert len(devices) == 3
+    assert all(resp[1][0]['device'] == '/dev/sdb'
+               for resp in devices.values())
+
+
+def test_fan_out_bounded():
+    """Test that fan_out keeps max_workers calls in flight at most."""
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def call(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        if item == 3:
+            raise ValueError(item)
+        return item * 2
+
+    results = fan_out(call, [1, 2, 3, 4, 5, 6, 1], 2)
+    assert running[1] == 2
+    assert sorted(results) == [1, 2, 3, 4, 5, 6]
+    assert isinstance(results.pop(3), ValueError)
+    assert all(results[item] == item * 2 for item in results)
+    assert fan_out(call, [], 2) == {}
+
+
+def test_retry_and_circuit_breaker(gd2):
+    """Test retries of GETs, error details and the circuit breaker."""
+    breaker = CircuitBreaker(failure_threshold=4, reset_timeout=60)
+    with Client(gd2.endpoint, user=USER, secret=SECRET,
+                retry=RetryPolicy(max_attempts=3, backoff_base=0.001),
+                circuit_breaker=breaker) as gd2client:
+        gd2.error_rate = 1
+        with pytest.raises(GlusterApiError) as exc:
+            gd2client.volume_info('vol0')
+        assert exc.value.status_code == 503
+        assert exc.value.attempts == 3
+        assert exc.value.body['errors'][0]['message'] == 'injected error'
+        assert gd2.calls[('GET', '/v1/volumes/{volname}/bricks')] == 3
+
+        # Mutations are retried on 503, glusterd2 did not act on them
+        with pytest.raises(GlusterApiError) as exc:
+            gd2client.volume_start('vol0')
+        assert exc.value.attempts == 3
+
+        with pytest.raises(GlusterApiCircuitOpen) as exc:
+            gd2client.volume_info('vol0')
+        assert exc.value.attempts == 1
+        with pytest.raises(GlusterApiCircuitOpen):
+            gd2client.volume_info('vol1')
+        assert gd2.calls[('GET', '/v1/volumes/{volname}/bricks')] == 4
+
+        # Streamed lists go through the same retries and circuit
+        with pytest.raises(GlusterApiError) as exc:
+            list(gd2client.iter_volumes())
+        assert exc.value.status_code == 503 and exc.value.attempts == 3
+        with pytest.raises(GlusterApiCircuitOpen) as exc:
+            list(gd2client.iter_volumes())
+        assert exc.value.attempts == 1
+        with pytest.raises(GlusterApiCircuitOpen):
+            list(gd2client.iter_volumes())
+        assert gd2.calls[('GET', '/v1/volumes')] == 4
+
+        gd2.error_rate = 0
+        status, _ = gd2client.volume_status('vol0')
+        assert status == 200
+        with pytest.raises(GlusterApiError) as exc:
+            gd2client.volume_status('missing')
+        assert exc.value.status_code == 404 and exc.value.attempts == 1
+
+
+def test_circuit_per_endpoint(gd2, monkeypatch):
+    """Test that circuits are per glusterd2 and stuck trials expire."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    key = ('GET', '/v1/volumes/{volname}/status')
+    with FakeGlusterd2(user=USER, secret=SECRET,
+                       cluster=gd2.cluster) as peer:
+        with Client([gd2.endpoint, peer.endpoint], user=USER,
+                    secret=SECRET, circuit_breaker=breaker) as gd2client:
+            gd2.error_rate = 1
+            for _ in range(4):
+                try:
+                    gd2client.volume_status('vol0')
+                except GlusterApiError:
+                    pass
+            assert breaker.state((gd2.endpoint,) + key) == breaker.OPEN
+            assert breaker.state((peer.endpoint,) + key) == breaker.CLOSED
+            assert peer.calls[key] == 2
+
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    breaker.record_failure('trial')
+    now[0] += 60
+    assert breaker.allow('trial')
+    assert not breaker.allow('trial')
+    # The trial never reported back
+    now[0] += 60
+    assert breaker.allow('trial')
+    breaker.release('trial')
+    assert breaker.allow('trial')
+    breaker.record_success('trial')
+    assert breaker.state('trial') == breaker.CLOSED
+
+
+def test_endpoint_failover(gd2):
+    """Test read balancing, pinned mutations and failover across peers."""
+    with FakeGlusterd2(user=USER, secret=SECRET,
+                       cluster=gd2.cluster) as peer:
+        pool = EndpointPool([gd2.endpoint, peer.endpoint])
+        with Client(pool, user=USER, secret=SECRET) as gd2client:
+            for _ in range(4):
+                gd2client.volume_status('vol0')
+            gd2client.volume_set('vol0', {'a': 'b'})
+            gd2client.volume_set('vol0', {'a': 'c'})
+            key = ('GET', '/v1/volumes/{volname}/status')
+            assert gd2.calls[key] == peer.calls[key] == 2
+            assert gd2.calls[('POST', '/v1/volumes/{volname}/options')] == 2
+
+            gd2.stop()
+            for _ in range(3):
+                _, resp = gd2client.volume_list('vol0')
+            assert resp['options'] == {'a': 'c'}
+            gd2client.volume_stop('vol0')
+            assert pool.primary() == peer.endpoint
+            assert [s['healthy'] for s in pool.states()] == [False, True]
+
+
+def test_event_receiver(client):
+    """Test that webhook events reach the handlers of their name."""
+    received = []
+    with EventReceiver(host='127.0.0.1', secret='hook-secret',
+                       workers=2) as receiver:
+        receiver.on('volume.stop', received.append)
+        client.webhook_add(receiver.url, 'token', 'hook-secret')
+        client.webhook_add(receiver.url + 'other', 'token', 'wrong')
+        client.volume_stop('vol0')
+        client.volume_start('vol0')
+        client.webhook_delete(receiver.url)
+        client.webhook_delete(receiver.url + 'other')
+        for _ in range(100):
+            if receiver.stats()['received'] == 4:
+                break
+            time.sleep(0.01)
+        receiver.join()
+        stats = receiver.stats()
+
+    assert [(e.name, e.data) for e in received] == [
+        ('volume.stop', {'volume.name': 'vol0'})]
+    assert stats['received'] == 4
+    assert stats['rejected'] == 2
+    assert stats['processed'] == 2
+    assert stats['events'] == {'volume.stop': 1, 'volume.start': 1}
+    assert received[0].event_id
+
+
+def test_event_receiver_rejects(gd2):
+    """Test bad request lengths and unauthenticated public receivers."""
+    with pytest.raises(GlusterApiInvalidInputs):
+        EventReceiver(host='0.0.0.0')
+    with EventReceiver(max_body=10) as receiver:
+        for length, status in ((None, 411), ('abc', 400), ('-1', 400),
+                               ('11', 413)):
+            conn = httplib.HTTPConnection('127.0.0.1', receiver.port,
+                                          timeout=5)
+            conn.putrequest('POST', '/')
+            if length is not None:
+                conn.putheader('Content-Length', length)
+            conn.endheaders()
+            assert conn.getresponse().status == status
+            conn.close()
+
+
+def test_codecs(gd2):
+    """Test every installed JSON codec against the stand-in."""
+    for codec in available_codecs():
+        with Client(gd2.endpoint, user=USER, secret=SECRET,
+                    codec=codec.name) as gd2client:
+            _, resp = gd2client.volume_set('vol0', {'codec': codec.name})
+            assert resp['options']['codec'] == codec.name
+            assert len(list(gd2client.iter_bricks_status('vol0'))) == 3
+    assert isinstance(get_codec('json').dumps({'a': 1}), bytes)
+    with pytest.raises(GlusterApiInvalidInputs):
+        get_codec('yaml')
+
+
+def test_typed_results(client):
+    """Test that typed results match the dict responses."""
+    _, volumes = client.volume_list()
+    _, typed = client.volume_list(typed=True)
+    assert all(isinstance(v, Volume) for v in typed)
+    assert [v.to_dict() for v in typed] == volumes
+    assert list(client.iter_volumes(typed=True)) == typed
+
+    volume = typed[0]
+    assert volume.name == 'vol0' and volume.state == 'Started'
+    bricks = list(volume.bricks())
+    assert [b.path for b in bricks] == [
+        b['path'] for b in volumes[0]['subvols'][0]['bricks']]
+
+    _, status = client.volume_status('vol0')
+    _, typed_status = client.volume_status('vol0', typed=True)
+    assert typed_status.online and typed_status.info == volume
+    assert typed_status.to_dict() == status
+    _, brick_status = client.volume_info('vol0', typed=True)
+    assert [b.info for b in brick_status] == bricks
+    assert brick_status[0].online and brick_status[0].port == 49152
+
+    _, peers = client.peer_status(typed=True)
+    assert isinstance(peers[0], Peer)
+    assert bricks[0].peer_id in [p.id for p in peers]
+    client.snapshot_create('vol0', 'snap0')
+    _, snap = client.snapshot_info('snap0', typed=True)
+    assert snap.name == 'snap0' and snap.parent_volume == 'vol0'
+
+
+def test_volume_plan():
+    """Test that planned sets span peers and zones and balance devices."""
+    with FakeGlusterd2(peers=6, devices_per_peer=2, seed=1) as gd2:
+        with Client(gd2.endpoint) as gd2client:
+            plan = gd2client.volume_plan('big', replica=3, arbiter=1,
+                                         distribute=4)
+            _, peers = gd2client.peer_status()
+            zones = dict((p['id'], p['zone']) for p in peers)
+            for brick_set in plan.sets:
+                assert len(set(p.peer_id for p in brick_set)) == 3
+                assert len(set(zones[p.peer_id] for p in brick_set)) == 3
+                assert [p.arbiter for p in brick_set] == [False, False, True]
+            peer_load, device_load = plan.load()
+            assert set(peer_load.values()) == {2}
+            assert set(device_load.values()) == {1}
+
+            _, volume = gd2client.volume_create(**plan.create_args())
+            types = [[b['type'] for b in subvol['bricks']]
+                     for subvol in volume['subvols']]
+            assert types == [['Brick', 'Brick', 'arbiter']] * 4
+
+            with pytest.raises(GlusterApiInvalidInputs):
+                gd2client.volume_plan('wide', disperse=8,
+                                      disperse_redundancy=2)
+
+
+def test_volume_plan_unequal_devices():
+    """Test that a peer with more devices does not get more bricks."""
+    peers = [{'id': peer_id, 'zone': ''} for peer_id in 'abc']
+    devices = [{'peer-id': 'a', 'device': '/dev/sd%s' % name}
+               for name in 'bcde']
+    devices += [{'peer-id': peer_id, 'device': '/dev/sdb'}
+                for peer_id in 'bc']
+    plan = plan_volume(peers, devices, 'vol', distribute=6)
+    peer_load, device_load = plan.load()
+    assert peer_load == {'a': 2, 'b': 2, 'c': 2}
+    assert max(device_load.values()) == 2
+
+
+def test_reconcile():
+    """Test that only the differences from the desired state are applied."""
+    with FakeGlusterd2(peers=3, volumes=2, bricks_per_volume=3) as gd2:
+        with Client(gd2.endpoint) as gd2client:
+            gd2client.volume_set('vol0', {'a': '1', 'b': '2'})
+            gd2client.volume_reset('vol0', ['b'])
+            _, options = gd2client.volume_get('vol0')
+            assert [o['opt-name'] for o in options] == ['a']
+            _, option = gd2client.volume_get('vol0', 'a')
+            assert option['value'] == '1'
+
+            desired = {
+                'volumes': {
+                    'vol0': {'options': {'a': '1', 'c': True},
+                             'state': 'Started', 'bitrot': True},
+                    'vol1': {'options': {'x': None}, 'state': 'Stopped'},
+                    'new': {'create': {'replica': 3}, 'state': 'Started',
+                            'options': {'a': '1'}},
+                },
+                'webhooks': ['http://127.0.0.1:1/hook'],
+            }
+            reconciler = Reconciler(gd2client, max_workers=2)
+            gd2.calls.clear()
+            plan = reconciler.apply(desired, dry_run=True)
+            assert plan.describe() == [
+                'webhook_add http://127.0.0.1:1/hook',
+                'volume_create new (3 bricks)',
+                'volume_start new',
+                'volume_set vol0 c=on',
+                'bitrot_enable vol0',
+                'volume_stop vol1',
+            ]
+            assert all(method == 'GET' or t.endswith('scrubstatus')
+                       for method, t in gd2.calls)
+
+            plan = reconciler.apply(desired)
+            assert not plan.failed and not plan.skipped
+            assert gd2.cluster.volumes['new']['options'] == {'a': '1'}
+            assert gd2.cluster.volumes['vol1']['state'] == 'Stopped'
+            assert len(reconciler.plan(desired)) == 0
+
+            gd2client.webhook_delete('http://127.0.0.1:1/hook')
+            desired['prune'] = True
+            del desired['volumes']['vol0']['options']['a']
+            desired['volumes']['new']['bitrot'] = True
+            gd2client.volume_stop('new')
+            current = reconciler.fetch(desired)
+            gd2client.volume_start('new')
+            plan = reconciler.apply(desired, current=current)
+            assert [op.describe() for op in plan.failed] == [
+                'volume_start new']
+            assert [op.describe() for op in plan.skipped] == [
+                'bitrot_enable new']
+            assert gd2.cluster.volumes['vol0']['options'] == {'c': 'on'}
+            assert 'http://127.0.0.1:1/hook' in gd2.cluster.webhooks
+
+            with pytest.raises(GlusterApiInvalidInputs):
+                reconciler.plan({'volumes': {'missing': {}}})
+
+
+def test_reconcile_usage_and_transport_errors():
+    """Test that new volumes share devices and transport errors fail."""
+    with FakeGlusterd2(peers=3, volumes=1, devices_per_peer=2) as gd2:
+        with Client(gd2.endpoint, read_timeout=0.1) as gd2client:
+            reconciler = Reconciler(gd2client)
+            desired = {'volumes': dict(
+                (name, {'create': {'replica': 3}}) for name in ('n1', 'n2'))}
+            plan = reconciler.plan(desired)
+            devices = [set(brick.split('/')[2]
+                           for brick in ops[0].kwargs['bricks'])
+                       for ops in plan.stages[0]]
+            assert len(devices) == 2 and not devices[0] & devices[1]
+
+            desired = {'volumes': {'vol0': {'options': {'a': '1'}}}}
+            current = reconciler.fetch(desired)
+            gd2.latency = 0.3
+            plan = reconciler.apply(desired, current=current)
+            assert [op.describe() for op in plan.failed] == [
+                'volume_set vol0 a=1']
+            assert isinstance(plan.failed[0].error.error,
+                              requests.exceptions.Timeout)
+
+
+def test_snapshot_scheduler():
+    """Test staggered scheduled snapshots and their retention."""
+    hour = datetime.timedelta(hours=1)
+    start = datetime.datetime(2026, 10, 16, 21, 30)
+    assert CronSchedule('30 */4 * * 1-5').next_after(start) == \
+        datetime.datetime(2026, 10, 19, 0, 30)
+    with pytest.raises(GlusterApiInvalidInputs):
+        CronSchedule('0 0 31 2 *').next_after(start)
+
+    with FakeGlusterd2(peers=3, volumes=3, bricks_per_volume=3) as gd2:
+        with Client(gd2.endpoint) as gd2client:
+            policies = [SnapshotPolicy('vol%d' % i, '@hourly', retention=2)
+                        for i in range(3)]
+            scheduler = SnapshotScheduler(gd2client, max_concurrent=2,
+                                          stagger=600)
+            for policy in policies:
+                scheduler.add(policy, now=start)
+            offsets = sorted(scheduler.offset(p) for p in policies)
+            assert len(set(offsets)) == 3 and offsets[-1] < 600
+            slot = datetime.datetime(2026, 10, 16, 22, 0)
+            assert scheduler.next_run() == \
+                slot + datetime.timedelta(seconds=offsets[0])
+
+            assert scheduler.run_pending(now=slot) == {}
+            taken = scheduler.run_pending(
+                now=slot + datetime.timedelta(seconds=offsets[1]))
+            assert len(taken) == 2
+            ten_minutes = datetime.timedelta(minutes=10)
+            assert scheduler.run_pending(now=slot + ten_minutes) == dict(
+                (p, 'sched_%s_20261016-2200' % p.volume)
+                for p in policies if p not in taken)
+            assert len(scheduler.run_pending(now=slot + hour + ten_minutes)) \
+                == 3
+
+            # Missed slots take a single snapshot of the latest one
+            taken = scheduler.run_pending(now=slot + 4 * hour)
+            assert len(taken) == 3
+            _, lists = gd2client.snapshot_list('vol0')
+            names = [snap['volinfo']['name'] for snap in lists[0]['snaps']]
+            assert names == ['sched_vol0_20261016-2300',
+                             'sched_vol0_20261017-0200']
+            gd2client.snapshot_delete(names[0])
+            _, lists = gd2client.snapshot_list()
+            assert sum(len(entry['snaps']) for entry in lists) == 5
+
+            # The clock is read as UTC, whatever the local time zone
+            scheduler = SnapshotScheduler(gd2client, stagger=0,
+                                          clock=lambda: 86400 * 365)
+            scheduler.add(policies[0])
+            assert scheduler.next_run() == datetime.datetime(1971, 1, 1, 1)
+
+
+def test_georep_monitor():
+    """Test geo-replication sessions and their adaptive status polling."""
+    with FakeGlusterd2(peers=3, volumes=2) as gd2, \
+            FakeGlusterd2(peers=3, volumes=2) as remote:
+        remotehost = remote.endpoint.split('://')[1]
+        metrics = Metrics()
+        with Client(gd2.endpoint, metrics=metrics) as gd2client:
+            for vol in ('vol0', 'vol1'):
+                gd2client.georep_create(vol, remotehost, vol)
+                gd2client.georep_start(vol, remotehost, vol)
+            gd2client.georep_set('vol0', remotehost, 'vol0', 'sync-jobs', '3')
+            _, option = gd2client.georep_get('vol0', remotehost, 'vol0',
+                                             optname='sync-jobs')
+            assert option['value'] == '3'
+            gd2client.georep_checkpoint('vol0', remotehost, 'vol0')
+            _, status = gd2client.georep_status('vol0', remotehost, 'vol0')
+            assert [w['status'] for w in status['workers']] == [
+                'Active', 'Passive', 'Passive']
+            with pytest.raises(GlusterApiError) as err:
+                gd2client.georep_stop('vol0', 'elsewhere', 'vol0')
+            assert err.value.status_code == 404
+            _, status = gd2client.georep_status('vol0')
+            assert status['master-volume'] == 'vol0'
+
+            # A remote cluster with its own credentials
+            with FakeGlusterd2(peers=1, volumes=1, user=USER,
+                               secret=SECRET[::-1]) as other:
+                otherhost = other.endpoint.split('://')[1]
+                with pytest.raises(GlusterApiError) as err:
+                    gd2client.georep_create('vol0', otherhost, 'vol0')
+                assert err.value.status_code == 401
+                # Sent through the client, metrics included
+                stats = metrics.snapshot()[('GET', '/v1/volumes/{volname}')]
+                assert stats['statuses']['401'] == 1
+                gd2client.georep_create('vol0', otherhost, 'vol0',
+                                        remote_api_user=USER,
+                                        remote_api_secret=SECRET[::-1])
+            with pytest.raises(GlusterApiInvalidInputs):
+                gd2client.georep_status('vol0')
+            _, status = gd2client.georep_status('vol0', otherhost)
+            assert status['remote-hosts'] == [otherhost]
+            gd2client.georep_delete('vol0', otherhost, 'vol0')
+
+            now = [time.time()]
+            gd2.cluster.georep_lag['vol1'] = 900
+            monitor = GeorepMonitor(gd2client, lag_threshold=300,
+                                    fast_interval=10, slow_interval=40,
+                                    clock=lambda: now[0])
+            result = monitor.poll()
+            assert len(result) == 2
+            lagging = monitor.lagging()
+            assert [s.master_volume for s in lagging] == ['vol1']
+            # last-synced has a resolution of a second
+            assert abs(lagging[0].lag - 900) <= 1
+            healthy = [s for s in result.values() if s not in lagging][0]
+            assert healthy.checkpoint_completed is True
+            assert healthy.worker_states() == {'Active': 1, 'Passive': 2}
+
+            gd2.calls.clear()
+            for step, calls, interval in ((10, 3, 20), (10, 5, 20),
+                                          (20, 8, 40)):
+                now[0] += step
+                monitor.poll()
+                assert sum(gd2.calls.values()) == calls
+                assert healthy.interval == interval
+                assert lagging[0].interval == 10
+
+            gd2client.georep_stop('vol1', remotehost, 'vol1')
+            gd2client.georep_delete('vol1', remotehost, 'vol1')
+            assert len(monitor.poll()) == 1
+
+
+def test_scrub_orchestrator():
+    """Test that scrubs sharing a peer never run at the same time."""
+    with FakeGlusterd2(peers=6, volumes=6, bricks_per_volume=3) as gd2:
+        gd2.cluster.scrub_time = 0.2
+        with Client(gd2.endpoint) as gd2client:
+            for i in range(5):
+                gd2client.bitrot_enable('vol%d' % i)
+            orchestrator = ScrubOrchestrator(gd2client, max_per_peer=1,
+                                             poll_min=0.05, poll_max=0.1)
+            names = ['vol%d' % i for i in range(6)]
+            records = orchestrator.run(names + ['missing'])
+            assert sorted(r.volume for r in records) == names
+            failed = [r for r in orchestrator.history() if r.error]
+            assert sorted(r.volume for r in failed) == ['missing', 'vol5']
+
+            _, volumes = gd2client.volume_list()
+            peers = dict((v['name'], set(b['peer-id'] for b in
+                                         v['subvols'][0]['bricks']))
+                         for v in volumes)
+            done = [r for r in records if r.error is None]
+            for a in done:
+                assert a.duration >= 0.2 and a.files == 3000
+                assert a.throughput > 0
+                for b in done:
+                    if a is not b and peers[a.volume] & peers[b.volume]:
+                        assert a.finished <= b.started or \
+                            b.finished <= a.started
+            assert orchestrator.expected_duration('vol0') >= 0.2
+            by_hour = orchestrator.throughput_by_hour()
+            assert sum(by_hour.values()) > 0
+            assert set(by_hour) == set(time.gmtime(r.started).tm_hour
+                                       for r in done)
+
+            # A scrub that never starts fails instead of polling for ever
+            gd2client.bitrot_scrub = lambda *args: (200, {})
+            orchestrator = ScrubOrchestrator(gd2client, poll_min=0.01,
+                                             poll_max=0.01, start_polls=3)
+            records = orchestrator.run(['vol0'])
+            assert isinstance(records[0].error, GlusterApiTimeout)
+
+
+def test_wait_for():
+    """Test shared polls, timeouts and event-driven wakeups of waiters."""
+    with FakeGlusterd2(peers=3, volumes=2) as gd2:
+        with Client(gd2.endpoint) as gd2client:
+            gd2client.volume_stop('vol0')
+            poller = Poller(gd2client, min_interval=0.05, max_interval=0.2)
+            results = []
+            waiters = [threading.Thread(target=lambda: results.append(
+                poller.wait_for(volume_online('vol0'), timeout=5)))
+                for _ in range(5)]
+            for waiter in waiters:
+                waiter.start()
+            time.sleep(0.3)
+            gd2client.volume_start('vol0')
+            for waiter in waiters:
+                waiter.join()
+            assert len(results) == 5
+            assert gd2.calls[('GET', '/v1/volumes/{volname}/bricks')] < 10
+
+            with pytest.raises(GlusterApiTimeout):
+                wait_for(gd2client, volume_stopped('vol1'), timeout=0.2)
+            shared = gd2client._poller
+
+            gd2client.snapshot_create('vol1', 'snap1')
+            with EventReceiver(host='127.0.0.1') as receiver:
+                gd2client.webhook_add(receiver.url, '', '')
+                poller = Poller(gd2client, min_interval=0.05,
+                                max_interval=30, receiver=receiver)
+                timer = threading.Timer(
+                    0.2, gd2client.snapshot_activate, ('snap1',))
+                timer.start()
+                start = time.time()
+                snap = poller.wait_for(snapshot_activated('snap1'),
+                                       timeout=10)
+                assert time.time() - start < 5
+                assert snap['volinfo']['state'] == 'Started'
+                assert poller.polls == 2
+                timer.join()
+                poller.close()
+
+        # Closed with the client
+        assert shared._closed and gd2client._poller is None
+
+    # Unreachable glusterd2, e.g. restarting, polled until the deadline
+    with Client('http://127.0.0.1:1') as gd2client:
+        start = time.time()
+        with pytest.raises(GlusterApiTimeout) as err:
+            wait_for(gd2client, peer_connected('x'), timeout=0.5)
+        assert time.time() - start >= 0.5
+        assert err.value.error.status_code is None
+
+
+class _Output(list):
+    write = list.append
+
+
+def test_cli(gd2):
+    """Test the command line output, exit statuses and lazy imports."""
+    out, err = _Output(), _Output()
+    argv = ['--endpoint', gd2.endpoint, '--user', USER, '--secret', SECRET]
+    assert cli_main(argv + ['volume-set', 'vol0', '--options',
+                            '{"nfs.disable": "on"}'], out, err) == 0
+    assert cli_main(argv + ['volume-list', '--vol-name', 'vol0'],
+                    out, err) == 0
+    assert json.loads(out[-2])['options'] == {'nfs.disable': 'on'}
+    assert cli_main(argv + ['iter-volumes'], out, err) == 0
+    assert [json.loads(line)['name'] for line in out[-4::2]] == \
+        ['vol0', 'vol1']
+    assert cli_main(argv + ['volume-stop', 'vol1'], out, err) == 0
+    assert cli_main(argv + ['volume-start', 'vol1', '--force'],
+                    out, err) == 0
+    assert cli_main(argv + ['volume-info', 'nope'], out, err) == 1
+    # Names are strings, even when they look like JSON
+    assert cli_main(argv + ['volume-status', '123'], out, err) == 1
+    assert cli_main(argv + ['volume-status', 'null'], out, err) == 1
+    assert cli_main(argv + ['volume-status-all', '--max-workers', '2'],
+                    out, err) == 0
+    assert cli_main(argv + ['no-such-command'], out, err) == 2
+
+    if sys.version_info >= (3, 7):
+        code = ('import sys, glusterapi, glusterapi.cli; '
+                'print([m for m in ("requests", "jwt") if m in sys.modules])')
+        root = os.path.dirname(os.path.dirname(
+            sys.modules['glusterapi'].__file__))
+        loaded = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        assert loaded.strip() == b'[]'
+
+
+def test_http2_transport():
+    """Test that concurrent calls share one HTTP/2 connection."""
+    pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    names = ['vol%d' % i for i in range(6)]
+    with FakeGlusterd2(volumes=6, user=USER, secret=SECRET, latency=0.01,
+                       http2=True) as gd2:
+        with Client(gd2.endpoint, user=USER, secret=SECRET,
+                    transport='h2c') as gd2client:
+            results = gd2client.volume_info_many(names, max_workers=6)
+            assert all(results[name][0] == 200 for name in names)
+            assert len(list(gd2client.iter_volumes())) == 6
+            with pytest.raises(GlusterApiError) as err:
+                gd2client.volume_info('nope')
+            assert err.value.status_code == 404
+            assert gd2.accepted == 1
+    with pytest.raises(GlusterApiInvalidInputs):
+        Client(transport='http3')
+
+
+@pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='needs AF_UNIX')
+def test_unix_socket_endpoint(tmpdir):
+    """Test requests to a unix:// endpoint over pooled connections."""
+    path = str(tmpdir.join('gd2.sock'))
+    names = ['vol%d' % i for i in range(4)]
+    with FakeGlusterd2(volumes=4, user=USER, secret=SECRET, latency=0.01,
+                       unix_socket=path) as gd2:
+        assert gd2.endpoint == 'unix://' + path
+        with Client(gd2.endpoint, user=USER, secret=SECRET,
+                    pool_maxsize=2, pool_block=True) as gd2client:
+            results = gd2client.volume_info_many(names, max_workers=4)
+            assert all(results[name][0] == 200 for name in names)
+            assert len(list(gd2client.iter_volumes())) == 4
+            with pytest.raises(GlusterApiError) as err:
+                gd2client.volume_info('nope')
+            assert err.value.status_code == 404
+            assert gd2.accepted <= 2
+    with Client('unix://' + path) as gd2client:
+        with pytest.raises(GlusterApiError) as err:
+            gd2client.peer_status()
+        assert gd2client._session.is_connect_error(err.value.error)
+
+
+def test_admission_control(gd2):
+    """Test the read and mutate budgets and the priority queue."""
+    admission = AdmissionController(mutate_rate=10, mutate_burst=2)
+    with Client(gd2.endpoint, user=USER, secret=SECRET,
+                admission=admission) as gd2client:
+        start = time.time()
+        for i in range(6):
+            gd2client.volume_set('vol0', {'opt%d' % i: 'on'})
+            gd2client.peer_status()
+        assert time.time() - start >= 0.35
+        # Streamed lists take a token too, with the same priorities
+        with admission.priority(LOW):
+            assert len(list(gd2client.iter_volumes())) == 2
+    stats = admission.snapshot()
+    assert stats[READ]['admitted'] == 7 and stats[READ]['delayed'] == 0
+    assert stats[MUTATE]['admitted'] == 6 and stats[MUTATE]['delayed'] == 4
+    assert 'glusterapi_admission_queue_depth{budget="mutate"} 0' in \
+        admission.render_prometheus()
+
+    admission = AdmissionController(read_rate=5, read_burst=1)
+    admission.acquire(('GET', '/v1/volumes'))
+    order = []
+
+    def call(priority):
+        admission.acquire(('GET', '/v1/volumes'), priority)
+        order.append(priority)
+
+    threads = []
+    for depth, priority in ((1, LOW), (2, HIGH)):
+        threads.append(threading.Thread(target=call, args=(priority,)))
+        threads[-1].start()
+        while admission.queue_depth(READ) < depth:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    assert order == [HIGH, LOW]
+
+    admission = AdmissionController(mutate_rate=0.5, max_wait=0.05)
+    with Client(gd2.endpoint, user=USER, secret=SECRET,
+                admission=admission) as gd2client:
+        gd2client.volume_stop('vol1')
+        with pytest.raises(GlusterApiThrottled):
+            gd2client.volume_start('vol1')
+    assert admission.snapshot()[MUTATE]['throttled'] == 1
+
+    # A throttled call does not take the half-open trial of its circuit
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    admission = AdmissionController(mutate_rate=0.5, max_wait=0.05)
+    key = (gd2.endpoint, 'POST', '/v1/volumes/{volname}/start')
+    with Client(gd2.endpoint, user=USER, secret=SECRET, admission=admission,
+                circuit_breaker=breaker) as gd2client:
+        gd2.error_rate = 1
+        with pytest.raises(GlusterApiError):
+            gd2client.volume_start('vol1')
+        gd2.error_rate = 0
+        time.sleep(0.02)
+        with pytest.raises(GlusterApiThrottled):
+            gd2client.volume_start('vol1')
+        assert breaker.state(key) == breaker.OPEN
+        assert breaker.allow(key)
+
+
+def test_admission_control_async(gd2):
+    """Test per-task priorities and admission on the event loop."""
+    pytest.importorskip('aiohttp')
+    contextvars = pytest.importorskip('contextvars')
+    import asyncio
+    from glusterapi.aio import AsyncClient
+
+    admission = AdmissionController(read_rate=5, read_burst=1)
+    gd2client = AsyncClient(gd2.endpoint, user=USER, secret=SECRET,
+                            admission=admission)
+    loop = asyncio.new_event_loop()
+    order = []
+    try:
+        admission.acquire(('GET', '/v1/volumes'))
+        tasks = []
+        for priority in (LOW, HIGH):
+            # Tasks run in a copy of the context they are created in
+            context = contextvars.copy_context()
+            block = admission.priority(priority)
+            context.run(block.__enter__)
+            task = context.run(loop.create_task, gd2client.volume_list())
+            task.add_done_callback(
+                lambda _, priority=priority: order.append(priority))
+            tasks.append((context, block, task))
+        loop.run_until_complete(asyncio.gather(*[t for _, _, t in tasks]))
+        for context, block, _ in tasks:
+            context.run(block.__exit__, None, None, None)
+    finally:
+        loop.run_until_complete(gd2client.close())
+        loop.close()
+    assert order == [HIGH, LOW]
+    assert admission.priority_of(('GET', '/v1/volumes')) == NORMAL
+    assert admission.snapshot()[READ]['delayed'] == 2
+    assert admission.queue_depth() == 0
+
+
+def test_cluster_state(gd2, client):
+    """Test the cluster indexes and their incremental refresh."""
+    state = ClusterState(client)
+    changes = state.refresh()
+    assert sorted(changes['added']) == ['vol0', 'vol1']
+    peer_id = client.peer_status()[1][1]['id']
+    assert state.volumes_on_peer(peer_id) == ['vol0', 'vol1']
+    brick = state.brick(peer_id, '/bricks/vol1/brick0')
+    assert brick['volume-name'] == 'vol1' and brick['online'] is True
+    assert state.device_of_brick(peer_id, brick['path']) == \
+        state.devices_of_peer(peer_id)[0]
+    assert len(state.bricks_on_device(peer_id, brick['device'])) == 2
+    assert state.volume_status('vol0')['online'] is True
+
+    gd2.calls.clear()
+    client.volume_set('vol1', {'nfs.disable': 'on'})
+    client.volume_stop('vol0')
+    client.volume_delete('vol0')
+    changes = state.refresh()
+    assert changes == {'added': [], 'changed': ['vol1'], 'removed': ['vol0'],
+                       'failed': []}
+    assert gd2.calls[('GET', '/v1/volumes/{volname}/status')] == 1
+    assert state.volume('vol0') is None
+    assert state.volumes_on_peer(peer_id) == ['vol1']
+    assert state.volume('vol1')['options'] == {'nfs.disable': 'on'}
+    assert state.refresh(full=True)['changed'] == ['vol1']
+
+
+def test_volume_profile():
+    """Test profile info and its analysis over interval deltas."""
+    np = pytest.importorskip('numpy')
+    from glusterapi.profile import ProfileSample, ProfileSampler, delta
+    with FakeGlusterd2(peers=3, volumes=1, bricks_per_volume=6, user=USER,
+                       secret=SECRET, seed=2) as gd2:
+        with Client(gd2.endpoint, user=USER, secret=SECRET) as gd2client:
+            with pytest.raises(GlusterApiError) as err:
+                gd2client.volume_profile_info('vol0')
+            assert err.value.status_code == 400
+            with pytest.raises(GlusterApiInvalidInputs):
+                gd2client.volume_profile_info('vol0', 'info-all')
+            gd2client.volume_profile_start('vol0')
+
+            sampler = ProfileSampler(gd2client, 'vol0')
+            first = sampler.sample()
+            assert first.hits.shape == (6, 10)
+            assert first.hot_bricks() == []
+            gd2.cluster.profile_load[('vol0', '/bricks/vol0/brick4')] = 5
+            interval = sampler.sample()
+            hot = interval.hot_bricks()
+            assert [(name.split(':')[1], fop) for name, fop, _ in hot] == [
+                ('/bricks/vol0/brick4', hot[0][1])]
+            assert interval.hot_bricks(metric='latency')[0][0] == hot[0][0]
+            # The interval only counts the hits of the second sample
+            assert (interval.hits == sampler.last.hits - first.hits).all()
+            pcts = interval.latency_percentiles((0, 50, 100))
+            assert pcts.shape == (10, 3)
+            assert (np.diff(pcts, axis=1) >= 0).all()
+            read = list(interval.fops).index('READ')
+            assert pcts[read, 2] == interval.avg_latency[:, read].max()
+
+            # Matches the interval stats glusterd2 computes
+            _, info = gd2client.volume_profile_info('vol0')
+            before = ProfileSample.from_info(info)
+            _, info = gd2client.volume_profile_info('vol0')
+            cumulative = ProfileSample.from_info(info)
+            reported = ProfileSample.from_info(info, 'interval')
+            computed = delta(before, cumulative)
+            assert (computed.hits == reported.hits).all()
+            assert np.allclose(computed.avg_latency, reported.avg_latency,
+                               atol=0.1)
+            # Cleared counters count from zero
+            gd2client.volume_profile_info('vol0', 'info-clear')
+            cleared = ProfileSample.from_info(
+                gd2client.volume_profile_info('vol0', 'info-peek')[1])
+            assert (delta(cumulative, cleared).hits == cleared.hits).all()
+            gd2client.volume_profile_stop('vol0')
+            with pytest.raises(GlusterApiError):
+                gd2client.volume_profile_stop('vol0')
+
+
+def test_iter_volumes(client):
+    """Test that streamed volumes match the volume list."""
+    _, volumes = client.volume_list()
+    assert list(client.iter_volumes()) == volumes
+    assert len(list(client.iter_bricks_status('vol0'))) == 3
+
+
+def test_iter_json_array_chunks():
+    """Test decoding of arrays split at every possible offset."""
+    data = b' [{"a": "x]\\"y", "b": [1, {}]}, null, 2, "s,"] '
+    expected = [{'a': 'x]"y', 'b': [1, {}]}, None, 2, 's,']
+    for i in range(len(data)):
+        assert list(iter_json_array([data[:i], data[i:]])) == expected
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[1, 2']))
+
+
+def test_json_array_decoder():
+    """Test that elements are decoded as soon as they are complete."""
+    decoder = JsonArrayDecoder(loads=lambda data: data)
+    assert decoder.feed(b'[{"a": 1}, {"b"') == [b'{"a": 1}']
+    assert decoder.feed(b': 2}') == []
+    assert decoder.feed(b', 3]') == [b'{"b": 2}', b'3']
+    decoder.close()
+    with pytest.raises(ValueError):
+        decoder.feed(b', 4')
+    assert list(iter_json_array([b'[', b']'])) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"a": 1}']))
+
+    # A large element split in small chunks, escapes split between them
+    element = {'name': 'x\\"y' * 20000, 'bricks': list(range(2000))}
+    body = json.dumps([element, element]).encode('ascii')
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    assert list(iter_json_array(chunks)) == [element, element]
+
+
+def test_async_client(gd2):
+    """Test the asyncio client against the stand-in."""
+    pytest.importorskip('aiohttp')
+    import asyncio
+    from glusterapi.aio import AsyncClient
+
+    gd2client = AsyncClient(gd2.endpoint, user=USER, secret=SECRET)
+    loop = asyncio.new_event_loop()
+    try:
+        status, resp = loop.run_until_complete(
+            gd2client.volume_status('vol0'))
+        assert status == 200 and resp['online']
+        results = loop.run_until_complete(
+            gd2client.volume_status_all(max_workers=2))
+        assert sorted(results) == ['vol0', 'vol1']
+    finally:
+        loop.run_until_complete(gd2client.close())
+        loop.close()
+
+
+def test_async_client_transports():
+    """Test the asyncio client rejects the blocking-only transports."""
+    pytest.importorskip('aiohttp')
+    from glusterapi.aio import AsyncClient
+
+    for transport in ('http2', 'h2c', object):
+        with pytest.raises(ValueError):
+            AsyncClient('http://127.0.0.1:24007', transport=transport)
+    for endpoint in ('unix:///tmp/gd2.sock',
+                     ['http://127.0.0.1:24007', 'unix:///tmp/gd2.sock']):
+        with pytest.raises(ValueError):
+            AsyncClient(endpoint)
+
+
+def test_async_client_errors(gd2):
+    """Test error statuses and invalid inputs of the asyncio client."""
+    pytest.importorskip('aiohttp')
+    import asyncio
+    from glusterapi.aio import AsyncClient
+
+    gd2client = AsyncClient(gd2.endpoint, user=USER, secret=SECRET)
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(GlusterApiError) as err:
+            loop.run_until_complete(gd2client.volume_status('missing'))
+        assert err.value.status_code == 404
+        with pytest.raises(GlusterApiInvalidInputs):
+            loop.run_until_complete(gd2client.volume_status(' '))
+        results = loop.run_until_complete(
+            gd2client.volume_status_many(['vol0', 'missing', ' ']))
+        assert results['vol0'][1]['online']
+        assert isinstance(results['missing'], GlusterApiError)
+        assert isinstance(results[' '], GlusterApiInvalidInputs)
+    finally:
+        loop.run_until_complete(gd2client.close())
+        loop.close()